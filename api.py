@@ -0,0 +1,406 @@
+# Import librairies and functions from other files
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+import numpy as np
+import pandas as pd
+from preprocessing.cleaning_data import (
+    encode_property,
+    input_fields,
+    optional_fields,
+    property_key,
+    validate_batch,
+)
+from predict.cache import prediction_cache
+from predict.batching import MicroBatcher, QueueFullError
+from predict.batch_scoring import score_chunk
+from predict.metrics import REGISTRY, summary
+from predict.prediction import (
+    artifacts,
+    predict_features,
+    predict_features_batch,
+)
+
+# Maximum size of a request body (a batch of about 50 000 properties)
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    """
+    Error returned to the client with an HTTP status
+    """
+
+    def __init__(self, status: HTTPStatus, message: str):
+        """
+        Initialize the error
+        :param status: HTTP status of the response
+        :param message: message returned in the "error" field
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class PredictionService:
+    """
+    Lightweight HTTP service returning price predictions in JSON, for machine clients.
+    The predictions run in a thread pool so the event loop keeps accepting requests.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int | None = None,
+        batching: dict | None = None,
+    ):
+        """
+        Initialize the service
+        :param host: address to listen on
+        :param port: port to listen on
+        :param workers: number of threads computing the predictions
+        :param batching: parameters of the MicroBatcher scoring the /predict requests together (window, max_batch, max_queue), None to score them one by one
+        """
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+        self.batcher = None
+        if batching is not None:
+            self.batcher = MicroBatcher(score_records, executor=self.executor, **batching)
+        self.ready = False
+        self.server = None
+
+    async def start(self):
+        """
+        Function that starts listening, then loads the artifacts: /readyz answers 200 once they are in memory
+        """
+        if self.batcher is not None:
+            await self.batcher.start()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, artifacts.get)
+        self.ready = True
+
+    async def serve_forever(self):
+        """
+        Function that starts the service and runs until it is cancelled
+        """
+        await self.start()
+        print(f"Listening on http://{self.host}:{self.port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def run_in_executor(self, function, *args):
+        """
+        Function that runs a CPU-bound function in the thread pool
+        :param function: the function to run
+        :param args: its arguments
+        :return: the result of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    # Endpoints
+    async def healthz(self, body: bytes) -> dict:
+        """
+        GET /healthz: the process is alive
+        """
+        return {"status": "ok"}
+
+    async def readyz(self, body: bytes) -> dict:
+        """
+        GET /readyz: the artifacts are loaded, the service can receive traffic
+        """
+        if not self.ready:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "The model is not loaded yet")
+        return {"status": "ready", "model_version": artifacts.version}
+
+    async def predict(self, body: bytes) -> dict:
+        """
+        POST /predict: price of one property, with the fields of the form of the app
+        """
+        record = parse_json(body)
+        if not isinstance(record, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+        if self.batcher is None:
+            price = await self.run_in_executor(predict_record, record)
+        else:
+            check_fields(record)
+            try:
+                price = await self.batcher.submit(record)
+            except QueueFullError as error:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, str(error))
+        return {"price": price}
+
+    async def predict_batch(self, body: bytes) -> dict:
+        """
+        POST /predict/batch: prices of a list of properties, in the same order
+        """
+        records = parse_json(body)
+        if isinstance(records, dict):
+            records = records.get("properties")
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise HTTPError(
+                HTTPStatus.BAD_REQUEST, "Expected a list of JSON objects or {\"properties\": [...]}"
+            )
+        prices, errors = await self.run_in_executor(predict_records, records)
+        return {"prices": prices, "errors": errors}
+
+    async def stats(self, body: bytes) -> dict:
+        """
+        GET /stats: batch sizes and waiting times of the micro-batching, calls, errors and latency
+        of every stage of the prediction, hit ratio of the caches
+        """
+        return {
+            "batching": self.batcher.stats() if self.batcher is not None else None,
+            "prediction_cache": prediction_cache.stats(),
+            **summary(),
+        }
+
+    async def metrics(self, body: bytes) -> str:
+        """
+        GET /metrics: the metrics of the process in the Prometheus text format
+        """
+        return REGISTRY.to_prometheus()
+
+    async def route(self, method: str, path: str, body: bytes) -> dict | str:
+        """
+        Function that calls the endpoint matching the request
+        :param method: HTTP method
+        :param path: path of the request, without query string
+        :param body: body of the request
+        :return: the JSON response (or the text of /metrics)
+        """
+        routes = {
+            "/healthz": ("GET", self.healthz),
+            "/readyz": ("GET", self.readyz),
+            "/stats": ("GET", self.stats),
+            "/metrics": ("GET", self.metrics),
+            "/predict": ("POST", self.predict),
+            "/predict/batch": ("POST", self.predict_batch),
+        }
+        if path not in routes:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown path: {path}")
+        expected_method, endpoint = routes[path]
+        if method != expected_method:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Use {expected_method} for {path}")
+        return await endpoint(body)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Function that answers the requests of one connection (HTTP/1.1 with keep-alive)
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "Bad request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    if version == "HTTP/1.1"
+                    else headers.get("connection", "").lower() == "keep-alive"
+                )
+                try:
+                    length = content_length(headers)
+                except HTTPError as error:
+                    # The body cannot be skipped without its length: the connection is closed
+                    await write_response(writer, error.status, {"error": error.message}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    response = await self.route(method, target.split("?", 1)[0], body)
+                    status = HTTPStatus.OK
+                except HTTPError as error:
+                    status, response = error.status, {"error": error.message}
+                except ValueError as error:
+                    status, response = HTTPStatus.BAD_REQUEST, {"error": str(error)}
+                except Exception as error:
+                    status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(error)}
+                await write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def content_length(headers: dict) -> int:
+    """
+    Function that reads the length of the body of a request
+    :param headers: the headers of the request, with lowercase names
+    :return: the length, 0 without Content-Length
+    """
+    value = headers.get("content-length", "").strip()
+    if not value:
+        return 0
+    if not value.isdigit():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid Content-Length: {value}")
+    if int(value) > MAX_BODY_SIZE:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+    return int(value)
+
+
+def parse_json(body: bytes):
+    """
+    Function that decodes the JSON body of a request
+    :param body: the body of the request
+    :return: the decoded content
+    """
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "The body is not valid JSON")
+
+
+def check_fields(record: dict):
+    """
+    Function that checks a property has all the required fields of the form
+    :param record: the fields of the property
+    """
+    missing_fields = [
+        field for field in input_fields if field not in record and field not in optional_fields
+    ]
+    if missing_fields:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing fields: {missing_fields}")
+
+
+def predict_record(record: dict) -> float:
+    """
+    Function that predicts the price of one property given as in the form of the app
+    :param record: the fields of the property
+    :return: the predicted price
+    """
+    check_fields(record)
+    fields = [record.get(field) for field in input_fields]
+    return prediction_cache.get_or_compute(
+        property_key(*fields), lambda: float(predict_features(encode_property(*fields)))
+    )
+
+
+def predict_records(records: list[dict]) -> tuple[list, list]:
+    """
+    Function that predicts the prices of several properties in one call to the model,
+    the invalid properties get an error instead of a price (see predict/batch_scoring.py)
+    :param records: the fields of each property
+    :return: the predicted prices (None if invalid) and the errors (None if valid), in the same order
+    """
+    if not records:
+        return [], []
+    prices, errors = score_chunk(pd.DataFrame(records, columns=input_fields, dtype=object))
+    for position, record in enumerate(records):
+        missing_fields = [field for field in input_fields if field not in record and field not in optional_fields]
+        if missing_fields:
+            prices[position], errors[position] = np.nan, f"Missing fields: {missing_fields}"
+    return (
+        [None if error else float(price) for price, error in zip(prices, errors)],
+        [error or None for error in errors],
+    )
+
+
+def score_records(records: list[dict]) -> list:
+    """
+    Function used by the micro-batching: checks the properties together, encodes the valid ones one by one,
+    then predicts all their prices with one matrix product
+    :param records: the fields of each property
+    :return: the predicted price of each property, or the error for the invalid ones
+    """
+    version = prediction_cache.current_version()
+    results, features, positions, keys = [], [], [], []
+    fields = [[record.get(field) for field in input_fields] for record in records]
+    for record_fields in fields:
+        key = property_key(*record_fields)
+        price = prediction_cache.get(key) if key is not None else None
+        results.append(price)
+        keys.append(key)
+    # The properties not in the cache are checked before being scored: an invalid one only fails its own request
+    missing = [position for position, price in enumerate(results) if price is None]
+    if not missing:
+        return results
+    errors = validate_batch(pd.DataFrame([fields[position] for position in missing], columns=input_fields))
+    for position, error in zip(missing, errors):
+        if error:
+            results[position] = ValueError(error)
+            continue
+        try:
+            features.append(encode_property(*fields[position]))
+            positions.append(position)
+        except (TypeError, ValueError) as error:
+            results[position] = ValueError(str(error))
+    if features:
+        for position, price in zip(positions, predict_features_batch(features).tolist()):
+            results[position] = price
+            key = keys[position]
+            if key is not None:
+                prediction_cache.put(key, price, version)
+    return results
+
+
+async def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, content: dict | str, keep_alive: bool):
+    """
+    Function that writes a JSON response, or a text response if the content is a string
+    :param writer: the stream of the connection
+    :param status: HTTP status of the response
+    :param content: content of the response
+    :param keep_alive: False to ask the client to close the connection
+    """
+    if isinstance(content, str):
+        body, content_type = content.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = json.dumps(content).encode("utf-8"), "application/json"
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def main():
+    """
+    Main script to launch the prediction API
+    """
+    parser = argparse.ArgumentParser(description="HTTP API for real estate price predictions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="threads computing the predictions")
+    parser.add_argument(
+        "--batch-window-ms", type=float, default=2.0, help="time to gather /predict requests into one batch"
+    )
+    parser.add_argument("--max-batch", type=int, default=64, help="maximum number of properties per batch")
+    parser.add_argument("--max-queue", type=int, default=1024, help="maximum number of waiting requests")
+    parser.add_argument("--no-batching", action="store_true", help="score every /predict request alone")
+    args = parser.parse_args()
+    batching = None
+    if not args.no_batching:
+        batching = {
+            "window": args.batch_window_ms / 1000,
+            "max_batch": args.max_batch,
+            "max_queue": args.max_queue,
+        }
+    service = PredictionService(args.host, args.port, args.workers, batching)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
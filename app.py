@@ -1,21 +1,135 @@
 # Import librairies and functions from other files
+import logging
+from time import perf_counter
 import pandas as pd
 import numpy as np
 import streamlit as st
-from preprocessing.cleaning_data import dataframe_zip_code, preprocess
-from predict.prediction import predict
+from model.src.market_cube import previous_year
+from model.src.price_map import PROPERTY_TYPES
+from model.src.profiling import profiled
+from preprocessing.cleaning_data import encode_property, property_key
+from predict.cache import prediction_cache
+from predict.prediction import (
+    DEFAULT_ENGINE,
+    ArtifactStore,
+    artifacts,
+    market_artifacts,
+    predict_features,
+    price_map_artifacts,
+)
 
+logger = logging.getLogger(__name__)
+# Model behind each prediction engine, as described in the sidebar
+ENGINE_NAMES = {"linear": "a linear regression", "gbm": "a gradient boosting model"}
+
+# Above this time (in seconds), a prediction is logged as slow
+SLOW_PREDICTION = 0.5
+
+
+@st.cache_resource
+def load_style() -> str:
+    """
+    Function that reads the CSS style once per server process
+    :return: the CSS style
+    """
+    with open("style.css") as style_file:
+        return style_file.read()
+
+
+@st.cache_resource
+def load_artifacts() -> ArtifactStore:
+    """
+    Function that loads the model, the encoder and the zip code table once per server process.
+    The store keeps them in memory and reloads them itself after a new training.
+    :return: the artifact store
+    """
+    artifacts.get()
+    return artifacts
+
+
+def price_map_view():
+    """
+    Function that ranks the zip codes by the predicted price of a reference property,
+    read from the price map computed by model/main.py
+    """
+    price_map = price_map_artifacts.get()["price_map.npz"]
+    reference = price_map.reference
+    st.title("Prices per zip code")
+    st.write(
+        f"Predicted price of a property of {reference['living_area']} m² with a plot of {reference['surface_plot']} m², "
+        f"in '{reference['building_condition']}' condition, "
+        f"{'with' if reference['swimming_pool'] == 'Yes' else 'without'} swimming pool."
+    )
+    col1, col2 = st.columns(2)
+    property_type = col1.selectbox("Property type", options=price_map.property_types)
+    order = col2.radio("Order", options=["Most expensive first", "Cheapest first"], horizontal=True)
+    provinces = st.multiselect("Provinces (all if empty)", options=sorted(set(price_map.provinces)))
+    col1, col2 = st.columns(2)
+    min_price = col1.number_input("Minimum price (€)", value=None, min_value=0, step=10000)
+    max_price = col2.number_input("Maximum price (€)", value=None, min_value=0, step=10000)
+    zip_codes, zip_provinces, prices = price_map.ranking(
+        property_type,
+        provinces or None,
+        min_price,
+        max_price,
+        ascending=order == "Cheapest first",
+    )
+    st.write(f"{len(zip_codes)} zip codes")
+    st.dataframe(
+        pd.DataFrame({"Zip code": zip_codes, "Province": zip_provinces, "Predicted price (€)": prices.round()}),
+        hide_index=True,
+        use_container_width=True,
+    )
+
+
+def format_price(value: float) -> str:
+    return "-" if np.isnan(value) else f"{value:,.0f} €"
+
+
+def market_view(zip_code: int, property: str):
+    """
+    Function that shows the sales of the district of a zip code, read from the market cube computed by model/main.py
+    :param zip_code: the zip code
+    :param property: "House" or "Apartment"
+    """
+    current = market_artifacts.get()
+    cube = current["market_cube.npz"]
+    district = current["zip_codes.npz"].lookup(zip_code)[0]
+    if district not in cube:
+        return
+    period = cube.reference
+    statistics = cube.lookup(district, period).loc[property]
+    before = cube.lookup(district, previous_year(period)).loc[property]
+    st.subheader(f"Local market: {cube.name(district).title()}")
+    st.write(f"Sales of {property.lower()}s in the district in {period}, the period of the median prices used by the model.")
+    col1, col2, col3 = st.columns(3)
+    change = statistics["median-price"] / before["median-price"] - 1
+    col1.metric(
+        "Median price",
+        format_price(statistics["median-price"]),
+        None if np.isnan(change) else f"{change:+.1%} in a year",
+    )
+    col2.metric(
+        "First - third quartile",
+        f"{format_price(statistics['first-quartile'])} - {format_price(statistics['third-quartile'])}",
+    )
+    col3.metric("Transactions", "-" if np.isnan(statistics["transactions"]) else f"{statistics['transactions']:,.0f}")
+    history = cube.history(district, property)
+    st.line_chart(history[["first-quartile", "median-price", "third-quartile"]].dropna(how="all"))
+
+
+@profiled("app")
 def main():
     """
     Main script to launch the app and get input data from users
     for predicting real estate prices.
     """
     # Loading CSS style
-    st.markdown(
-        "<style>" + open("style.css").read() + "</style>", unsafe_allow_html=True
-    )
+    st.markdown("<style>" + load_style() + "</style>", unsafe_allow_html=True)
+    store = load_artifacts()
     # Sidebar
     with st.sidebar:
+        view = st.sidebar.radio("View", options=["Price prediction", "Zip code ranking"])
         st.sidebar.header("How to use the app")
         st.sidebar.write(
             """
@@ -26,7 +140,8 @@ def main():
         )
         st.sidebar.header("The features")
         st.sidebar.write(
-            "This app is based on a linear regression. Here are the features used to predict the price:"
+            f"This app is based on {ENGINE_NAMES.get(DEFAULT_ENGINE, DEFAULT_ENGINE)}. "
+            "Here are the features used to predict the price:"
         )
         st.sidebar.write(
             """
@@ -40,6 +155,10 @@ def main():
 8. Swimming pool                         
 """
         )
+    if view == "Zip code ranking":
+        price_map_view()
+        return
+
     # Title and subheader
     st.title("Real estate price prediction")
     # Space
@@ -48,29 +167,10 @@ def main():
     )
 
     # Input data: property type
-    house_types = [
-        "House",
-        "Bungalow",
-        "Castle",
-        "Chalet",
-        "Country cottage",
-        "Exceptional property",
-        "Farmhouse",
-        "Manor house",
-        "Mansion",
-        "Town house",
-        "Villa",
-    ]
-    apartment_types = [
-        "Apartment",
-        "Loft",
-        "Penthouse",
-        "Triplex",
-        "Duplex",
-        "Studio",
-        "Kot",
-    ]
+    house_types = PROPERTY_TYPES["House"]
+    apartment_types = PROPERTY_TYPES["Apartment"]
 
+    # The type of property changes the options of the next question, it stays outside of the form
     with st.container():
         property = st.radio(
             "Is it a house or an apartment?",
@@ -78,6 +178,10 @@ def main():
             index=0,
             horizontal=True,
         )
+
+    # The other inputs are in a form: the app only reruns when the form is submitted
+    form = st.form("property_form", border=False)
+    with form.container():
         if property == "House":
             property_type = st.selectbox(
                 "What's the type of house?", options=house_types
@@ -88,20 +192,16 @@ def main():
             )
 
     # Input data: ZIP CODE
-    with st.container():
+    with form.container():
         zip_code = st.number_input(
             "Where is it located? Enter the zip code:",
             placeholder="1000",
             min_value=1000,
             max_value=9999,
         )
-        zip_code_df = dataframe_zip_code()
-        # Checking if the zip code exists
-        if zip_code not in zip_code_df["Postal code"].values:
-            st.warning("Enter a valid zip code")
 
     # Input data: surfaces
-    with st.container():
+    with form.container():
         col1, col2 = st.columns(2)
         # LIVING AREA
         living_area = col1.number_input(
@@ -109,17 +209,18 @@ def main():
         )
         if living_area < 5:
             col1.warning("Enter a valid answer")
-        # SURFACE OF THE PLOT
+        # SURFACE OF THE PLOT (optional: the median of the district is used if it is empty)
         surface_plot = col2.number_input(
             "What's the surface of the plot (in square meters)?",
-            placeholder=100,
+            value=None,
+            placeholder="Leave empty if unknown",
             min_value=5,
         )
-        if surface_plot < 5:
+        if surface_plot is not None and surface_plot < 5:
             col2.warning("Please enter a valid answer")
 
     # Input data: BUILDING CONDITION
-    with st.container():
+    with form.container():
         options_condition = [
             "As new",
             "Just renovated",
@@ -133,7 +234,7 @@ def main():
         )
 
     # Input data: SWIMMING POOL
-    with st.container():
+    with form.container():
         swimming_pool = st.radio(
             "Does the property have a swimming pool?",
             options=["Yes", "No"],
@@ -142,28 +243,50 @@ def main():
         )
 
     result = ""
+    submitted = form.form_submit_button("See the result")
 
-    # Calling the functions to clean the input data and get a price prediction once the user click oon the button
-    try:
-        if st.button("See the result"):
-            columns_data = preprocess(
-                property,
-                property_type,
-                zip_code,
-                living_area,
-                surface_plot,
-                building_condition,
-                swimming_pool,
-            )
-            result = predict(columns_data)
-            result = int(result)
-            # Display the price prediction stored in the variable "result"
-            st.markdown(
-                f"<div style='text-align:center; border-radius:15px;witdh: 100%; background-color: #27334e;color: #fff; font-size:30px;padding:20px;'>The predicted price is <br> <b>{(result)}</b> €</div>",
-                unsafe_allow_html=True,
+    # Calling the functions to clean the input data and get a price prediction once the user click on the button
+    if submitted:
+        # Checking if the zip code exists
+        if zip_code not in store.get()["zip_codes.npz"]:
+            st.warning("Enter a valid zip code")
+            return
+        start_time = perf_counter()
+        fields = (
+            property,
+            property_type,
+            zip_code,
+            living_area,
+            surface_plot,
+            building_condition,
+            swimming_pool,
+        )
+        try:
+            # The same property is often asked again: its price is cached until a new training
+            result = prediction_cache.get_or_compute(
+                property_key(*fields), lambda: predict_features(encode_property(*fields))
             )
-    except:
-        print("Please fill in the form with correct info")
+        except ValueError as error:
+            st.warning(f"Please fill in the form with correct info: {error}")
+            return
+        except Exception:
+            logger.exception("Prediction failed")
+            st.error("The prediction failed, please try again later.")
+            return
+        duration = perf_counter() - start_time
+        if duration > SLOW_PREDICTION:
+            logger.warning("Slow prediction: %.3f seconds", duration)
+        result = int(result)
+        # Display the price prediction stored in the variable "result"
+        st.markdown(
+            f"<div style='text-align:center; border-radius:15px;witdh: 100%; background-color: #27334e;color: #fff; font-size:30px;padding:20px;'>The predicted price is <br> <b>{(result)}</b> €</div>",
+            unsafe_allow_html=True,
+        )
+        try:
+            market_view(zip_code, property)
+        except Exception:
+            # The prediction is shown, the sales of the district are only additional information
+            logger.exception("Market view failed for zip code %s", zip_code)
 
 
 if __name__ == "__main__":
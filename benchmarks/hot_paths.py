@@ -0,0 +1,308 @@
+# Import necessary libraries
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from predict.prediction import ARTIFACT_DIR, ArtifactStore, artifacts, predict, predict_batch
+from preprocessing.cleaning_data import (
+    create_input_table,
+    dataframe_zip_code,
+    input_fields,
+    preprocess,
+    preprocess_batch,
+)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+RESULTS = os.path.join(BENCHMARK_DIR, "results.json")
+# Differences of p50 smaller than this are timer noise, never regressions
+MIN_DELTA_MS = 0.05
+
+# Property scored by the single-property benchmarks, as in the form of the app
+PROPERTY = ("House", "House", 1000, 150, 300, "Good", "No")
+BATCH_SIZES = [1, 100, 10000]
+
+
+def measure(function, repeat: int, rows: int = 1) -> dict:
+    """
+    Function that times several calls of a function, then measures its peak memory in one more call
+    (tracemalloc slows the allocations down, so it is not active while timing)
+    :param function: the function to measure
+    :param repeat: number of timed calls, after one warm-up call
+    :param rows: number of properties handled by one call, for the throughput
+    :return: p50/p95/mean in milliseconds, rows per second at the p50 and peak memory in kB
+    """
+    function()
+    times = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        function()
+        times.append(perf_counter() - start_time)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(times, rows, peak)
+
+
+def summarize(times: list[float], rows: int, peak: int) -> dict:
+    """
+    Function that turns the times of a benchmark into its results
+    :param times: time of every call, in seconds
+    :param rows: number of properties handled by one call
+    :param peak: peak memory allocated by one call, in bytes
+    :return: the results of the benchmark
+    """
+    p50 = float(np.percentile(times, 50))
+    return {
+        "repeat": len(times),
+        "rows": rows,
+        "p50_ms": p50 * 1000,
+        "p95_ms": float(np.percentile(times, 95)) * 1000,
+        "mean_ms": float(np.mean(times)) * 1000,
+        "throughput_rows_per_s": rows / p50 if p50 else float("inf"),
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def cold_predict(data: pd.DataFrame) -> float:
+    """
+    Function that predicts a price with an empty artifact store, as the first request of a process:
+    the artifacts are read from disk, checked against the manifest and deserialized first
+    :param data: preprocessed input data of the property
+    :return: the predicted price
+    """
+    store = ArtifactStore(ARTIFACT_DIR, artifacts.loaders)
+    return store.get()["model_bundle.npz"].predict(data)[0]
+
+
+def batch_records(size: int) -> list[dict]:
+    """
+    Function that draws properties for the batch benchmarks: the zip codes of the dataset and fixed random features
+    :param size: number of properties
+    :return: the properties, as in the form of the app
+    """
+    rng = np.random.default_rng(42)
+    zip_codes = dataframe_zip_code()["Postal code"].values
+    records = []
+    for _ in range(size):
+        is_house = rng.random() < 0.6
+        records.append(
+            dict(
+                zip(
+                    input_fields,
+                    (
+                        "House" if is_house else "Apartment",
+                        "House" if is_house else "Apartment",
+                        int(rng.choice(zip_codes)),
+                        int(rng.integers(40, 400)),
+                        int(rng.integers(100, 2000)) if is_house else None,
+                        str(rng.choice(["As new", "Good", "To renovate"])),
+                        "Yes" if rng.random() < 0.1 else "No",
+                    ),
+                )
+            )
+        )
+    return records
+
+
+def serving_benchmarks(repeat: int) -> dict:
+    """
+    Function that measures the functions used by the app and the API to predict prices
+    :param repeat: number of timed calls of each function
+    :return: benchmark name -> results
+    """
+    data = preprocess(*PROPERTY)
+    features = create_input_table("House", 150, 300, 2, 0, 15307.69, 1012500.0, 21000.0)
+    results = {
+        "dataframe_zip_code": measure(dataframe_zip_code, repeat),
+        "preprocess": measure(lambda: preprocess(*PROPERTY), repeat),
+        "create_input_table": measure(
+            lambda: create_input_table("House", 150, 300, 2, 0, 15307.69, 1012500.0, 21000.0), repeat
+        ),
+        "predict_cold": measure(lambda: cold_predict(data), repeat),
+        "predict_warm": measure(lambda: predict(features), repeat),
+    }
+    for size in BATCH_SIZES:
+        records = batch_records(size)
+        # Fewer calls for the large batches: a call is already an average over many properties
+        results[f"batch_scoring_{size}"] = measure(
+            lambda: predict_batch(preprocess_batch(records)), max(3, repeat * 100 // max(size, 100)), size
+        )
+    return results
+
+
+@contextlib.contextmanager
+def training_copy():
+    """
+    Context manager running the training in a temporary copy of model/ and of the artifacts,
+    so the benchmark does not change the files of the repository
+    :return: the directory of the copy of model/
+    """
+    root = os.path.dirname(BENCHMARK_DIR)
+    directory = tempfile.mkdtemp(prefix="immo-eliza-benchmark-")
+    current_dir, current_path = os.getcwd(), list(sys.path)
+    try:
+        shutil.copytree(
+            os.path.join(root, "model"),
+            os.path.join(directory, "model"),
+            ignore=shutil.ignore_patterns(".cache", "__pycache__"),
+        )
+        shutil.copytree(ARTIFACT_DIR, os.path.join(directory, "predict"), ignore=shutil.ignore_patterns("*.py", "__pycache__"))
+        os.chdir(os.path.join(directory, "model"))
+        sys.path.insert(0, os.getcwd())
+        yield os.getcwd()
+    finally:
+        os.chdir(current_dir)
+        sys.path[:] = current_path
+        for name in [name for name in sys.modules if name == "main" or name == "src" or name.startswith("src.")]:
+            del sys.modules[name]
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def training_benchmarks(repeat: int) -> dict:
+    """
+    Function that measures every stage of the training pipeline (model/main.py), without its cache
+    :param repeat: number of runs of the pipeline
+    :return: "training_<stage>" -> results
+    """
+    with training_copy(), contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        import main
+
+        rows = len(pd.read_csv(main.SOURCES["ingest-immoweb"]["path"], usecols=[0]))
+        main.create_pipeline(use_cache=False).run()
+        times = {}
+        for _ in range(repeat):
+            pipeline = main.create_pipeline(use_cache=False)
+            for name, line in pipeline.run().items():
+                times.setdefault(name, []).append(line["seconds"])
+        # One more run with tracemalloc, its peak reset before every stage
+        peaks = {}
+        pipeline = main.create_pipeline(use_cache=False)
+        for stage in pipeline.stages.values():
+            stage.function = traced(stage.name, stage.function, peaks)
+        tracemalloc.start()
+        pipeline.run()
+        tracemalloc.stop()
+    return {f"training_{name}": summarize(stage_times, rows, peaks[name]) for name, stage_times in times.items()}
+
+
+def traced(name: str, function, peaks: dict):
+    """
+    Function that wraps a stage to record the peak memory it allocates
+    :param name: name of the stage
+    :param function: function of the stage
+    :param peaks: dictionary where the peak of the stage is written, in bytes
+    :return: the wrapped function
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        result = function(*args, **kwargs)
+        peaks[name] = tracemalloc.get_traced_memory()[1] - start
+        return result
+
+    return wrapper
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Function that compares the results with the baseline
+    :param results: benchmark name -> results
+    :param baseline: benchmark name -> results of the baseline
+    :param tolerance: accepted slowdown or memory increase, e.g. 0.25 for 25%
+    :return: a description of every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        if (
+            result["p50_ms"] > reference["p50_ms"] * (1 + tolerance)
+            and result["p50_ms"] - reference["p50_ms"] > MIN_DELTA_MS
+        ):
+            regressions.append(f"{name}: p50 {result['p50_ms']:.3f} ms, baseline {reference['p50_ms']:.3f} ms")
+        if result["peak_memory_kb"] > reference["peak_memory_kb"] * (1 + tolerance) + 1:
+            regressions.append(
+                f"{name}: peak memory {result['peak_memory_kb']:.0f} kB, baseline {reference['peak_memory_kb']:.0f} kB"
+            )
+    return regressions
+
+
+def print_results(results: dict, baseline: dict):
+    """
+    Function that prints the results, with the p50 of the baseline
+    :param results: benchmark name -> results
+    :param baseline: benchmark name -> results of the baseline
+    """
+    print(f"{'Benchmark':<36} {'p50 ms':>10} {'p95 ms':>10} {'rows/s':>12} {'peak kB':>10} {'baseline':>10}")
+    for name, result in results.items():
+        reference = f"{baseline[name]['p50_ms']:.3f}" if name in baseline else "-"
+        print(
+            f"{name:<36} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} "
+            f"{result['throughput_rows_per_s']:>12.0f} {result['peak_memory_kb']:>10.0f} {reference:>10}"
+        )
+
+
+def main():
+    """
+    Benchmark suite of the serving functions and of the training stages, compared with a stored baseline
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the serving and training hot paths")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls of each serving function")
+    parser.add_argument("--training-repeat", type=int, default=3, help="runs of the training pipeline")
+    parser.add_argument("--skip-training", action="store_true", help="only measure the serving functions")
+    parser.add_argument("--output", default=RESULTS, help="JSON file where the results are written")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON file of the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="accepted slowdown or memory increase, e.g. 0.5 for 50%%")
+    parser.add_argument("--update-baseline", action="store_true", help="save the results as the new baseline")
+    args = parser.parse_args()
+
+    results = serving_benchmarks(args.repeat)
+    if not args.skip_training:
+        results.update(training_benchmarks(args.training_repeat))
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "benchmarks": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["benchmarks"]
+    print_results(results, baseline)
+    if args.update_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved in {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Import necessary libraries
+import argparse
+import glob
+import os
+from time import perf_counter
+import pandas as pd
+from model.src.columnar import columnar_path, is_in_sync, read_columnar
+
+DATA_DIR = "model/data"
+
+
+def best_time(function, repeat: int) -> float:
+    """
+    Function that returns the best time of several calls
+    :param function: the function to time
+    :param repeat: number of calls
+    :return: the best time, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        function()
+        times.append(perf_counter() - start_time)
+    return min(times)
+
+
+def main():
+    """
+    Benchmark comparing the load time of the datasets from CSV and from their columnar copy (run model/convert_data.py first)
+    """
+    parser = argparse.ArgumentParser(description="Load time of the datasets: CSV vs columnar")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'Dataset':<40} {'Rows':>7} {'CSV ms':>8} {'Columnar ms':>12} {'Speedup':>8}")
+    for csv_path in sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))):
+        if not is_in_sync(csv_path):
+            print(f"{os.path.basename(csv_path):<40} no columnar copy in sync, skipped")
+            continue
+        rows = len(pd.read_csv(csv_path))
+        csv_time = best_time(lambda: pd.read_csv(csv_path), args.repeat)
+        columnar_time = best_time(lambda: read_columnar(columnar_path(csv_path)), args.repeat)
+        print(
+            f"{os.path.basename(csv_path):<40} {rows:>7} {csv_time * 1000:>8.1f} "
+            f"{columnar_time * 1000:>12.1f} {csv_time / columnar_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import glob
+import os
+from src.cleaning_datasets import CleaningDatasets
+from src.columnar import columnar_path, write_columnar
+import pandas as pd
+
+
+def main():
+    """
+    Script that saves a columnar copy (.feather) of every CSV file of the data folder.
+    The pipeline and the app read these copies instead of parsing the CSV files, as long as the CSV files do not change.
+    """
+    cleaner = CleaningDatasets()
+    for csv_path in sorted(glob.glob(os.path.join(cleaner.datapath, "*.csv"))):
+        write_columnar(pd.read_csv(csv_path), csv_path)
+        print(
+            f"{os.path.basename(csv_path)}: {os.path.getsize(csv_path)} bytes -> "
+            f"{os.path.getsize(columnar_path(csv_path))} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,129 @@
+import argparse
+import os
 import pandas as pd
 from src.cleaning_datasets import CleaningDatasets
 from src.cleaning_feature_engineering import FeatureEngineering
-from src.linear_regression_model import LinearRegressionModel
-from time import perf_counter
+from src.linear_regression_model import PREDICT_DIR, LinearRegressionModel
+from src.gradient_boosting_model import MODEL_FILE, GradientBoostingModel
+from src.engine_report import compare_engines, print_engine_report
+from src.artifacts import atomic_write_bytes, write_manifest
+from src.zip_code_table import ZipCodeTable, zip_code_medians
+from src.imputation import ImputationTables
+from src.feature_encoder import FeatureEncoder
+from src.pipeline import Pipeline
+from src.price_map import PriceMap
+from src.market_cube import SALES_COLUMNS, MarketCube
+from src.profiling import Profiler
+from src.columnar import columnar_path, write_columnar
 
-def main():
+cleaner = CleaningDatasets()
+
+# Files written by the stages
+ARTIFACTS = [
+    "scaler.pkl",
+    "regression.pkl",
+    "model_bundle.npz",
+    "model_bundle.json",
+    "scorer.npz",
+    "encoder.json",
+    "zip_codes.npz",
+    "imputation.json",
+    "price_map.npz",
+    "market_cube.npz",
+]
+
+# Period of the sales whose median prices are given to the model: a year ("2023") or a quarter ("2023-Q4")
+REFERENCE_PERIOD = "2023"
+
+# CSV files read by the pipeline: only the columns (with their type) and the rows declared are loaded
+SOURCES = {
+    "ingest-immoweb": {"path": "./data/precleaned-dataset-immoweb.csv"},
+    "ingest-zip-codes": {
+        "path": "./data/code-nis-zip-code.csv",
+        "columns": ["Postal code", "Refnis code", "Nom commune"],
+        "dtypes": {"Postal code": "int64", "Refnis code": "int64", "Nom commune": "str"},
+    },
+    "ingest-income-median": {
+        "path": "./data/median-income-2022.csv",
+        "columns": ["CD_MUNTY_REFNIS", "MS_MEDIAN", "MS_ADMIN_AROP", "CD_DSTR_REFNIS"],
+        "dtypes": {
+            "CD_YEAR": "int64",
+            "CD_MUNTY_REFNIS": "int64",
+            "MS_MEDIAN": "float64",
+            "MS_ADMIN_AROP": "str",
+            "CD_DSTR_REFNIS": "int64",
+        },
+        "filters": {"CD_YEAR": 2022},
+    },
+    "ingest-income-mean": {
+        "path": "./data/mean-income-2022.csv",
+        "columns": ["Nom", "Revenu"],
+        "dtypes": {"Nom": "str", "Revenu": "float64"},
+    },
+    "ingest-sales": {
+        "path": "./data/sales-real-estates-belgium-district.csv",
+        "columns": ["refnis", "localité", "année", "période"] + SALES_COLUMNS["House"] + SALES_COLUMNS["Apartment"],
+        "dtypes": {
+            "refnis": "int64",
+            "localité": "str",
+            "année": "int64",
+            "période": "str",
+            **{column: "float64" for column in SALES_COLUMNS["House"] + SALES_COLUMNS["Apartment"]},
+        },
+    },
+}
+
+
+def ingest(
+    path: str,
+    columns: list[str] | None = None,
+    dtypes: dict[str, str] | None = None,
+    filters: dict | None = None,
+) -> pd.DataFrame:
     """
-    Main script to clean, preprocess, and train a linear regression model
-    for predicting real estate prices.
+    Stage that reads one of the CSV files
+    :param path: path of the CSV file
+    :param columns: columns to load, all of them if None
+    :param dtypes: type of the columns
+    :param filters: values to keep per column, the other rows are not loaded
+    :return: the dataframe
     """
-    start_time = perf_counter()
-    cleaner = CleaningDatasets()
+    if columns is None and dtypes is None and filters is None:
+        return cleaner.read_dataset(path)
+    return cleaner.read_source(path, columns, dtypes, filters)
 
-    # Import the necessary CSV files
-    df = pd.read_csv(f"./data/precleaned-dataset-immoweb.csv")
-    zip_code = pd.read_csv(f"./data/code-nis-zip-code.csv")
-    income_median = pd.read_csv(f"./data/median-income-2022.csv")
-    income_mean = pd.read_csv(f"./data/mean-income-2022.csv")
-    median_price = pd.read_csv(f"./data/sales-real-estates-belgium-district.csv")
-
-    # Cleaning of the median_price dataframe
-    median_price = cleaner.drop_rows(median_price, (median_price["année"] != 2023))
-    columns_drop_medianprice = [
-        "localité",
-        "année",
-        "période",
-        "prix premier quartile(€)-maison",
-        "prix troisième quartile(€)-maison",
-        "prix premier quartile(€)-appartement",
-        "prix troisième quartile(€)-appartement",
-        "Unnamed: 12",
-        "Unnamed: 13",
-        "nombre transactions-appartement",
-        "nombre transactions - maison",
-        "Unnamed: 14",
-        "0",
-    ]
-    median_price = cleaner.drop_columns(median_price, columns_drop_medianprice)
-    new_names_median_price = {
-        "prix médian(€)-maison": "house-median-price",
-        "prix médian(€)-appartement": "apartment-median-price",
-    }
-    median_price = cleaner.rename_columns(median_price, new_names_median_price)
-    median_price = cleaner.new_columns_mean(
-        median_price, "refnis", "house-median-price", "house-median-price"
-    )
-    median_price = cleaner.new_columns_mean(
-        median_price, "refnis", "apartment-median-price", "apartment-median-price"
-    )
-    median_price = median_price.drop_duplicates()
 
-    # Cleaning of the income_median CSV
-    income_median = cleaner.drop_rows(income_median, (income_median["CD_YEAR"] != 2022))
+def market_cube(sales: pd.DataFrame, reference_period: str = REFERENCE_PERIOD) -> MarketCube:
+    """
+    Stage that builds the statistics of the sales per district, year and quarter, and saves them for the app
+    :param sales: the sales per district and per quarter, of every year
+    :param reference_period: period of the median prices given to the model
+    :return: the cube
+    """
+    cube = MarketCube.from_sales(sales, reference_period)
+    atomic_write_bytes(os.path.join(PREDICT_DIR, "market_cube.npz"), cube.to_bytes())
+    return cube
 
+
+def clean_median_price(cube: MarketCube) -> pd.DataFrame:
+    """
+    Stage that reads the median prices of sales per district in the reference period
+    :param cube: the statistics of the sales
+    :return: one line per district with the median prices (the mean of the quarterly ones for a year)
+    """
+    return cube.median_prices()
+
+
+def merge_income(
+    zip_code: pd.DataFrame, income_median: pd.DataFrame, income_mean: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Stage that adds the median and mean incomes to the zip codes
+    :param zip_code: the zip codes and their refnis codes
+    :param income_median: the median income per municipality, of the reference year
+    :param income_mean: the mean income per municipality
+    :return: the zip codes with the incomes
+    """
     # Merging CSVs
     merged_df_income = cleaner.merging_dataset(
         zip_code, income_median, "Refnis code", "CD_MUNTY_REFNIS"
@@ -60,40 +131,22 @@ def main():
     merged_df_avgincome = cleaner.merging_dataset(
         merged_df_income, income_mean, "Nom commune", "Nom"
     )
+    return merged_df_avgincome
+
+
+def additional_data(merged_df_avgincome: pd.DataFrame, median_price: pd.DataFrame) -> tuple:
+    """
+    Stage that adds the median prices to the zip codes and saves the data per zip code (CSV and table for the app)
+    :param merged_df_avgincome: the zip codes with the incomes
+    :param median_price: the median prices per district
+    :return: the data per zip code and the medians filling its missing median prices
+    """
     merged_df_median_price = cleaner.merging_dataset(
         merged_df_avgincome, median_price, "CD_DSTR_REFNIS", "refnis"
     )
 
-    # Removing unuseful columns & rename some others
+    # Removing the merge keys & rename some columns (the other columns of the sources are not loaded)
     columns_to_drop = [
-        "CD_RGN_REFNIS",
-        "TX_RGN_DESCR_NL",
-        "TX_RGN_DESCR_FR",
-        "TX_RGN_DESCR_EN",
-        "TX_RGN_DESCR_DE",
-        "CD_PROV_REFNIS",
-        "TX_PROV_DESCR_NL",
-        "TX_PROV_DESCR_FR",
-        "TX_PROV_DESCR_EN",
-        "TX_PROV_DESCR_DE",
-        "TX_DSTR_DESCR_NL",
-        "TX_DSTR_DESCR_FR",
-        "TX_DSTR_DESCR_EN",
-        "TX_DSTR_DESCR_DE",
-        "TX_MUNTY_DESCR_EN",
-        "TX_MUNTY_DESCR_DE",
-        "MS_Q1",
-        "MS_Q3",
-        "MS_NBR_ELIGIBLE",
-        "MS_NBR_NOT_ELIGIBLE",
-        "MS_PERC_NOT_ELIGIBLE",
-        "MS_PERC_IOE_HH",
-        "MS_INT_QUART_DIFF",
-        "Commune",
-        "CD_YEAR",
-        "TX_MUNTY_DESCR_NL",
-        "TX_MUNTY_DESCR_FR",
-        "Gemeentenaam",
         "Nom commune",
         "CD_MUNTY_REFNIS",
         "Refnis code",
@@ -119,10 +172,28 @@ def main():
         merged_df_median_price, "district", str
     )
     merged_df_median_price.to_csv("data/additional_data.csv")
+    additional = pd.read_csv("data/additional_data.csv")
+    write_columnar(additional, "data/additional_data.csv")
+    # Precomputed table used by the app to get the data of a zip code
+    medians = zip_code_medians(additional)
+    zip_table = ZipCodeTable.from_dataframe(additional, medians)
+    atomic_write_bytes(os.path.join(PREDICT_DIR, "zip_codes.npz"), zip_table.to_bytes())
 
+    return merged_df_median_price, medians
+
+
+def feature_engineering(df: pd.DataFrame, zip_data: tuple) -> tuple:
+    """
+    Stage that merges the immoweb dataset with the data per zip code and prepares the features of the model
+    :param df: the immoweb dataset
+    :param zip_data: the data per zip code and the medians filling its missing median prices
+    :return: the preprocessed dataset and the fitted encoder
+    """
+    merged_df_median_price, zip_medians = zip_data
     # Merging with the immoweb dataset, removing one column and adding a new one
+    # (several communes share a zip code: the first one is used, as in the app, so the properties are not duplicated)
     final_df = cleaner.merging_dataset(
-        df, merged_df_median_price, "Zip code", "Postal code"
+        df, merged_df_median_price.drop_duplicates("Postal code"), "Zip code", "Postal code"
     )
     final_df = cleaner.drop_columns(final_df, ["Postal code"])
     final_df = cleaner.new_columns_conditions(final_df)
@@ -130,12 +201,19 @@ def main():
     engineering = FeatureEngineering(final_df)
 
     # Transforming the final dataframe by removing outliers and some rows, replacing empty values and transforming columns for the model
-    categorical_columns = ["Property type", "district"]
     final_df = engineering.remove_outliers()
+    for rule, count in engineering.outlier_report.items():
+        print(f"Outliers removed ({rule}): {count}")
     final_df = engineering.remove_rows("Living area")
     final_df = engineering.replace_navalues()
+    # The medians are saved with the model: the app fills the missing values with the same ones
+    imputation = ImputationTables({**zip_medians.tables, **engineering.imputation.tables})
+    atomic_write_bytes(os.path.join(PREDICT_DIR, "imputation.json"), imputation.to_bytes())
     final_df = engineering.transform_columns()
-    final_df = engineering.transform_categorical_values(categorical_columns)
+    # The encoder is saved with the model: the app encodes the properties with the same categories and columns
+    encoder = FeatureEncoder.fit(final_df)
+    atomic_write_bytes(os.path.join(PREDICT_DIR, "encoder.json"), encoder.to_bytes())
+    final_df = engineering.transform_categorical_values(encoder)
 
     # Removing additional columns that won't be necessary
     columns_to_drop = [
@@ -163,16 +241,171 @@ def main():
     final_df = cleaner.drop_columns(final_df, columns_to_drop)
     # Save the cleaned and preprocessed dataset
     final_df.to_csv("./data/dataset-preprocessed.csv", index=False)
+    write_columnar(
+        pd.read_csv("./data/dataset-preprocessed.csv"), "./data/dataset-preprocessed.csv"
+    )
+    return final_df, encoder
+
+
+def training(features: tuple, selection: dict | None = None, engine: str = "linear"):
+    """
+    Stage that trains the linear regression model, prints the metrics and saves the artifacts
+    :param features: the preprocessed dataset and the fitted encoder
+    :param selection: parameters of LinearRegressionModel.select_model (folds, metric, workers) to train
+    the best candidate of a cross-validation, None to train a LinearRegression on the price
+    :param engine: "gbm" to also train the gradient boosting model and compare it with the linear one
+    (the linear model is always trained, it is the default engine of the app)
+    """
+    final_df, encoder = features
     # Split the features and the target
-    X = final_df.drop(columns=["Price"])
+    X = final_df[encoder.columns]
     y = final_df["Price"]
 
     # Train the linear regression model and getting the metrics
     model_trainer = LinearRegressionModel(final_df, X, y)
-    model_trainer.create_linear_model()
-    print(
-        f"\nTime taken to from start to finish: {round(perf_counter()-start_time,3)} seconds."
+    candidate = model_trainer.select_model(**selection) if selection is not None else None
+    model_trainer.create_linear_model(candidate)
+    # Price of a reference property in every zip code, ranked by the app
+    with open(os.path.join(PREDICT_DIR, "zip_codes.npz"), "rb") as zip_file:
+        zip_table = ZipCodeTable.from_bytes(zip_file.read())
+    price_map = PriceMap.compute(zip_table, encoder, model_trainer.scorer)
+    atomic_write_bytes(os.path.join(PREDICT_DIR, "price_map.npz"), price_map.to_bytes())
+    artifacts = list(ARTIFACTS)
+    boosting_path = os.path.join(PREDICT_DIR, MODEL_FILE)
+    if engine == "gbm":
+        boosting_trainer = GradientBoostingModel(X, y, encoder)
+        boosting_trainer.create_model()
+        print_engine_report(compare_engines(model_trainer, boosting_trainer))
+        artifacts.append(MODEL_FILE)
+    elif os.path.exists(boosting_path):
+        # A gradient boosting model of a previous training would not match the new encoder
+        os.remove(boosting_path)
+    # The manifest is written last so the app only picks up a complete set of artifacts
+    write_manifest(PREDICT_DIR, artifacts)
+
+
+def create_pipeline(
+    use_cache: bool = True,
+    selection: dict | None = None,
+    engine: str = "linear",
+    reference_period: str = REFERENCE_PERIOD,
+) -> Pipeline:
+    """
+    Function that declares the stages of the training pipeline
+    :param use_cache: False to run every stage
+    :param selection: parameters of the model selection (see training), None to train a LinearRegression
+    :param engine: "gbm" to also train the gradient boosting model (see training)
+    :param reference_period: period of the sales whose median prices are given to the model, e.g. "2023" or "2023-Q4"
+    :return: the pipeline
+    """
+    pipeline = Pipeline(".cache", use_cache)
+    # Import the necessary CSV files
+    for name, source in SOURCES.items():
+        pipeline.add_stage(name, ingest, params=source, files=[source["path"]])
+    pipeline.add_stage(
+        "market-cube",
+        market_cube,
+        ["ingest-sales"],
+        params={"reference_period": reference_period},
+        outputs=[os.path.join(PREDICT_DIR, "market_cube.npz")],
+    )
+    pipeline.add_stage("median-price", clean_median_price, ["market-cube"])
+    pipeline.add_stage(
+        "income",
+        merge_income,
+        ["ingest-zip-codes", "ingest-income-median", "ingest-income-mean"],
+    )
+    pipeline.add_stage(
+        "additional-data",
+        additional_data,
+        ["income", "median-price"],
+        outputs=[
+            "data/additional_data.csv",
+            columnar_path("data/additional_data.csv"),
+            os.path.join(PREDICT_DIR, "zip_codes.npz"),
+        ],
+    )
+    pipeline.add_stage(
+        "feature-engineering",
+        feature_engineering,
+        ["ingest-immoweb", "additional-data"],
+        outputs=[
+            "./data/dataset-preprocessed.csv",
+            columnar_path("./data/dataset-preprocessed.csv"),
+            os.path.join(PREDICT_DIR, "encoder.json"),
+            os.path.join(PREDICT_DIR, "imputation.json"),
+        ],
+    )
+    pipeline.add_stage(
+        "training",
+        training,
+        ["feature-engineering"],
+        params={"selection": selection, "engine": engine},
+        outputs=[os.path.join(PREDICT_DIR, name) for name in ARTIFACTS + ["manifest.json"]]
+        + ["./data/comparison.csv", "./graphs/prediction-vs-testdata.png"],
+    )
+    return pipeline
+
+
+def main():
+    """
+    Main script to clean, preprocess, and train a linear regression model
+    for predicting real estate prices.
+    Only the stages whose inputs changed since the last run are run again.
+    """
+    parser = argparse.ArgumentParser(description="Train the real estate price model")
+    parser.add_argument("--no-cache", action="store_true", help="run every stage")
+    parser.add_argument(
+        "--select-model",
+        action="store_true",
+        help="compare Linear/Ridge/Lasso models on the price and its log with a cross-validation and train the best one",
+    )
+    parser.add_argument("--folds", type=int, default=5, help="number of folds of the cross-validation")
+    parser.add_argument(
+        "--metric", choices=["mae", "rmse", "mape"], default="mae", help="metric choosing the best model"
+    )
+    parser.add_argument("--workers", type=int, default=None, help="processes of the cross-validation")
+    parser.add_argument(
+        "--engine",
+        choices=["linear", "gbm"],
+        default="linear",
+        help="gbm: also train a gradient boosting model on the categories (used by predict with PREDICTION_ENGINE=gbm) and compare both",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="write a cProfile, a tracemalloc snapshot and their summary of the run (also enabled by IMMO_PROFILE)",
+    )
+    parser.add_argument("--profile-dir", default=None, help="directory of the profiles (default: IMMO_PROFILE_DIR or profiles)")
+    parser.add_argument(
+        "--reference-period",
+        default=REFERENCE_PERIOD,
+        help=f"period of the sales whose median prices per district are given to the model: a year or a quarter, e.g. 2023-Q4 (default: {REFERENCE_PERIOD})",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="stages run at the same time when their inputs are ready (default: number of cores, 1 to run them in order)",
+    )
+    args = parser.parse_args()
+    selection = None
+    if args.select_model:
+        selection = {"folds": args.folds, "metric": args.metric, "workers": args.workers}
+    pipeline = create_pipeline(
+        use_cache=not args.no_cache,
+        selection=selection,
+        engine=args.engine,
+        reference_period=args.reference_period,
     )
+    profiler = Profiler.from_env("training", 1.0 if args.profile else None, args.profile_dir)
+    if profiler is not None and profiler.sampled():
+        # cProfile only sees the main thread: the stages are run in it, one by one
+        with profiler.profile("pipeline"):
+            pipeline.run()
+    else:
+        pipeline.run(args.jobs)
+    pipeline.print_report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """
+    Write bytes to a file atomically: the data goes to a temporary file in the same
+    directory which then replaces the target, so a reader never sees a half-written file
+    :param path: path of the file to write
+    :param data: content of the file
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        # mkstemp creates the file readable by the owner only
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_sha256(path: str) -> str:
+    """
+    Compute the SHA-256 hash of a file
+    :param path: path of the file
+    :return: the hexadecimal digest
+    """
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def write_manifest(directory: str, filenames: list[str]):
+    """
+    Write the manifest listing the hash of every artifact of a training run.
+    It is written last: the serving side only swaps to a new set of artifacts
+    once the files on disk match the hashes of the manifest.
+    :param directory: directory containing the artifacts
+    :param filenames: names of the artifact files to include
+    """
+    manifest = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "files": {
+            name: file_sha256(os.path.join(directory, name)) for name in filenames
+        },
+    }
+    atomic_write_bytes(
+        os.path.join(directory, "manifest.json"),
+        json.dumps(manifest, indent=2).encode("utf-8"),
+    )
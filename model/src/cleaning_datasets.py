@@ -1,5 +1,8 @@
+from collections import deque
 import pandas as pd
 import numpy as np
+from src.columnar import columnar_path, is_in_sync, read_columnar, read_table
+from src.join_index import JoinIndex
 
 class CleaningDatasets:
     """
@@ -10,6 +13,62 @@ class CleaningDatasets:
         Function that initializes the class with the path to the data files
         """
         self.datapath = "./data/"
+        # Lines and unmatched keys of the last merges
+        self.merge_reports = deque(maxlen=100)
+
+    def read_dataset(self, path: str) -> pd.DataFrame:
+        """
+        Read a dataset from its columnar copy (see convert_data.py) if it is up to date, from the CSV otherwise
+        :param path: path of the CSV file
+        :return: the dataframe
+        """
+        return read_table(path)
+
+    def read_source(
+        self,
+        path: str,
+        columns: list[str] | None = None,
+        dtypes: dict[str, str] | None = None,
+        filters: dict | None = None,
+        chunksize: int = 50000,
+    ) -> pd.DataFrame:
+        """
+        Read only the columns and the rows of a dataset that are needed: the CSV is read by chunks,
+        so the other columns are never parsed and the other rows never kept in memory
+        (the columnar copy is used instead if it is up to date)
+        :param path: path of the CSV file
+        :param columns: columns to keep, in this order (all of them if None)
+        :param dtypes: type of the columns, instead of guessing it from every chunk
+        :param filters: values to keep per column ({column: value or list of values}); the filter columns are read even if they are not kept
+        :param chunksize: number of lines parsed at a time
+        :return: the dataframe
+        """
+        filters = filters or {}
+        if is_in_sync(path):
+            df = read_columnar(columnar_path(path), columns, filters)
+            return self.cast_columns(df, dtypes)
+        usecols = None
+        if columns is not None:
+            usecols = list(columns) + [column for column in filters if column not in columns]
+        chunks = []
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+            for column, values in filters.items():
+                chunk = chunk[chunk[column].isin(values if isinstance(values, list) else [values])]
+            chunks.append(chunk if columns is None else chunk[list(columns)])
+        if not chunks:
+            return self.cast_columns(pd.DataFrame(columns=columns), dtypes)
+        return self.cast_columns(pd.concat(chunks, ignore_index=True), dtypes)
+
+    def cast_columns(self, df: pd.DataFrame, dtypes: dict[str, str] | None) -> pd.DataFrame:
+        """
+        Give their type to the columns kept (the filter columns that are not kept have none),
+        so the CSV and its columnar copy give the same dataframe
+        :param df: the dataframe
+        :param dtypes: type of the columns
+        :return: the dataframe with the types
+        """
+        dtypes = {column: dtype for column, dtype in (dtypes or {}).items() if column in df.columns}
+        return df.astype(dtypes) if dtypes else df
 
     # removing unnecessary columns
     def drop_columns(
@@ -118,17 +177,68 @@ class CleaningDatasets:
         return df
 
     def merging_dataset(
-        self, df1: pd.DataFrame, df2: pd.DataFrame, column1: str, column2: str
+        self,
+        df1: pd.DataFrame,
+        df2: pd.DataFrame,
+        column1: str,
+        column2: str,
+        validate: str = "many_to_one",
+        index: JoinIndex | None = None,
     ) -> pd.DataFrame:
         """
-        Merge two DataFrames on specified columns.
+        Merge two DataFrames on specified columns (left join, as pandas.merge with how="left").
+        The second DataFrame is a dimension table with one line per key: its lines are found with its index
+        (see JoinIndex) and its columns gathered at these lines, the keys without a match are reported.
         :param df1: the first DataFrame.
         :param df2: the second DataFrame.
         :param column1: the column in the first DataFrame to join on.
         :param column2: the column in the second DataFrame to join on.
+        :param validate: "many_to_one" (the keys of df2 are unique) or "one_to_one" (the keys of df1 are also unique),
+        a ValueError is raised otherwise.
+        :param index: the index of column2 (see JoinIndex), to build it once for several merges on the same table;
+        built for this merge if None.
         :return: the merged DataFrame.
         """
-        df = pd.merge(df1, df2, left_on=column1, right_on=column2, how="left")
+        if validate not in ("one_to_one", "many_to_one"):
+            raise ValueError(f"Unknown validation: {validate}")
+        if index is None:
+            index = JoinIndex(df2[column2])
+        elif not index.matches(df2[column2]):
+            raise ValueError(f"The index was not built on {column2}")
+        keys = df1[column1]
+        if validate == "one_to_one" and keys.duplicated().any():
+            raise ValueError(f"Duplicated keys in {column1}, the merge is not one to one")
+        positions = index.positions(keys)
+
+        # Columns of df1, then the columns of df2 gathered at the lines found, NaN without a match
+        # (the key is kept once if it has one name, the other common names get a suffix as in pandas.merge)
+        right_columns = [column for column in df2.columns if not (column == column2 and column2 == column1)]
+        overlap = set(df1.columns) & set(right_columns)
+        columns = {
+            f"{column}_x" if column in overlap else column: df1[column].values.copy() for column in df1.columns
+        }
+        for column in right_columns:
+            columns[f"{column}_y" if column in overlap else column] = pd.api.extensions.take(
+                df2[column].values, positions, allow_fill=True
+            )
+        # The dataframe is made of the arrays (copies of the columns of df1), without copying them again
+        df = pd.DataFrame(columns, copy=False)
+
+        unmatched = positions == -1
+        report = {
+            "left": column1,
+            "right": column2,
+            "lines": len(df1),
+            "unmatched_lines": int(unmatched.sum()),
+            "unmatched_keys": pd.unique(keys[unmatched]).tolist(),
+        }
+        self.merge_reports.append(report)
+        if report["unmatched_lines"]:
+            examples = ", ".join(str(key) for key in report["unmatched_keys"][:5])
+            print(
+                f"Merge {column1} -> {column2}: {report['unmatched_lines']} of {len(df1)} lines without a match "
+                f"({len(report['unmatched_keys'])} keys: {examples})"
+            )
         return df
 
     def change_type(self, df: pd.DataFrame, column: str, dtype: type) -> pd.DataFrame:
@@ -1,4 +1,7 @@
 import pandas as pd
+from src.feature_encoder import FeatureEncoder
+from src.imputation import GroupMedians, ImputationTables
+from src.outlier_rules import OUTLIER_RULES, OutlierRules
 
 class FeatureEngineering:
     """
@@ -11,47 +14,17 @@ class FeatureEngineering:
         :param df: dataframe containing the real estate dataset
         """
         self.df = df
+        self.outlier_report = {}
+        self.imputation = None
 
-    def remove_outliers(self) -> pd.DataFrame:
+    def remove_outliers(self, rules: OutlierRules | None = None) -> pd.DataFrame:
         """
-        Function that removes the selected outliers that were spotted in the analysis
+        Function that removes the selected outliers that were spotted in the analysis, in one pass
+        :param rules: the rules selecting the outliers (OUTLIER_RULES if None)
         :return: the new dataset without the outliers
         """
-        self.df.drop(self.df[self.df["Price"] > 2500000].index, inplace=True)
-        self.df.drop(
-            self.df[self.df["Property type"] == "Other_Property"].index, inplace=True
-        )
-        self.df.drop(
-            self.df[
-                (self.df["Property type"] == "Mixed_Use_Building")
-                & (self.df["Living area"] > 1200)
-            ].index,
-            inplace=True,
-        )
-        self.df.drop(
-            self.df[
-                (self.df["Property"] == "Apartment") & (self.df["Living area"] > 450)
-            ].index,
-            inplace=True,
-        )
-        self.df.drop(
-            self.df[
-                (self.df["Property"] == "Apartment") & (self.df["Price"] > 1000000)
-            ].index,
-            inplace=True,
-        )
-        self.df.drop(
-            self.df[
-                (self.df["Property"] == "House") & (self.df["Living area"] > 1200)
-            ].index,
-            inplace=True,
-        )
-        self.df.drop(
-            self.df[
-                (self.df["Property"] != "House") & (self.df["Property"] != "Apartment")
-            ].index,
-            inplace=True,
-        )
+        rules = rules or OutlierRules(OUTLIER_RULES)
+        self.df, self.outlier_report = rules.apply(self.df)
         return self.df
 
     def remove_rows(self, column: str) -> pd.DataFrame:
@@ -62,17 +35,36 @@ class FeatureEngineering:
         self.df.dropna(subset=[column], inplace=True)
         return self.df
 
-    def replace_navalues(self) -> pd.DataFrame:
+    def imputation_tables(self) -> ImputationTables:
+        """
+        Function that computes the medians used to replace the missing values: plot surface per district
+        and median price per province and property
+        :return: the tables "surface_plot_by_district" and "median_price_by_province_property"
+        """
+        # The districts are numbers in the app
+        df = self.df.assign(district=self.df["district"].astype(float))
+        return ImputationTables(
+            {
+                "surface_plot_by_district": GroupMedians.fit(df, ["district"], "Surface of the plot"),
+                "median_price_by_province_property": GroupMedians.fit(
+                    df, ["Province", "Property"], "median-price"
+                ),
+            }
+        )
+
+    def replace_navalues(self, tables: ImputationTables | None = None) -> pd.DataFrame:
         """
         Function that replaces missing values in specific columns using the median
+        :param tables: the medians to use, computed on the dataframe if None (kept in self.imputation)
         :return: the dataframe with missing values replaced
         """
-        self.df["Surface of the plot"] = self.df.groupby("district")[
-            "Surface of the plot"
-        ].transform(lambda x: x.fillna(x.median()))
-        self.df["median-price"] = self.df.groupby(["Province", "Property"])[
-            "median-price"
-        ].transform(lambda x: x.fillna(x.median()))
+        if tables is None:
+            tables = self.imputation_tables()
+        self.imputation = tables
+        self.df["Surface of the plot"] = tables["surface_plot_by_district"].fill(
+            self.df.assign(district=self.df["district"].astype(float))
+        )
+        self.df["median-price"] = tables["median_price_by_province_property"].fill(self.df)
         return self.df
 
     def transform_columns(self) -> pd.DataFrame:
@@ -86,25 +78,16 @@ class FeatureEngineering:
             inplace=True,
         )
         self.df["Building condition"] = self.df["Building condition"].replace(
-            {
-                "As new": 6,
-                "Just renovated": 5,
-                "Good": 4,
-                "To be done up": 3,
-                "To renovate": 2,
-                "To restore": 1,
-            }
+            FeatureEncoder.building_conditions
         )
         return self.df
 
     # Transform categorical columns into new columns of 1/0
-    def transform_categorical_values(
-        self, categorical_columns: list[str]
-    ) -> pd.DataFrame:
+    def transform_categorical_values(self, encoder: FeatureEncoder) -> pd.DataFrame:
         """
-        Function that transforms the categorical columns into dummy variables
-        :param categorical_columns: list of the column names to transform into dummy variables
+        Function that transforms the property type and the district into dummy variables
+        :param encoder: the encoder fitted on the dataset, saved with the model
         :return: the dataframe with categorical columns transformed
         """
-        self.df = pd.get_dummies(self.df, columns=categorical_columns, drop_first=True)
+        self.df = encoder.dummies(self.df)
         return self.df
\ No newline at end of file
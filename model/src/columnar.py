@@ -0,0 +1,106 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+# Metadata stored in the columnar file to know if it is still in sync with its CSV
+SOURCE_SIZE = b"source_size"
+SOURCE_MTIME = b"source_mtime_ns"
+STRING_COLUMNS = b"string_columns"
+
+
+def columnar_path(csv_path: str) -> str:
+    """
+    Function that returns the path of the columnar copy of a CSV file
+    :param csv_path: path of the CSV file
+    :return: path of the columnar file, next to the CSV
+    """
+    return os.path.splitext(csv_path)[0] + ".feather"
+
+
+def write_columnar(df: pd.DataFrame, csv_path: str):
+    """
+    Function that saves a dataframe next to its CSV in a typed columnar format (Arrow IPC, uncompressed so it can be memory-mapped):
+    booleans are stored as bits, text columns are dictionary-encoded
+    :param df: the dataframe, as read from the CSV
+    :param csv_path: path of the CSV file (must exist)
+    """
+    string_columns = [column for column in df.columns if df[column].dtype == object]
+    encoded = df.astype({column: "category" for column in string_columns})
+    table = pa.Table.from_pandas(encoded, preserve_index=False)
+    stat = os.stat(csv_path)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SOURCE_SIZE] = str(stat.st_size).encode()
+    metadata[SOURCE_MTIME] = str(stat.st_mtime_ns).encode()
+    metadata[STRING_COLUMNS] = "\x1f".join(string_columns).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = columnar_path(csv_path) + ".tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, columnar_path(csv_path))
+
+
+def is_in_sync(csv_path: str) -> bool:
+    """
+    Function that checks if the columnar copy of a CSV exists and was written from the current version of the CSV
+    :param csv_path: path of the CSV file
+    :return: True if the columnar file can be read instead of the CSV
+    """
+    path = columnar_path(csv_path)
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    stat = os.stat(csv_path)
+    return metadata.get(SOURCE_SIZE) == str(stat.st_size).encode() and metadata.get(
+        SOURCE_MTIME
+    ) == str(stat.st_mtime_ns).encode()
+
+
+def read_columnar(
+    path: str, columns: list[str] | None = None, filters: dict | None = None
+) -> pd.DataFrame:
+    """
+    Function that reads a columnar file through memory mapping: only the pages of the selected columns are read,
+    and the rows are filtered before being converted to a dataframe
+    :param path: path of the columnar file
+    :param columns: columns to keep, all of them if None
+    :param filters: values to keep per column ({column: value or list of values}), the rows not matching are not loaded
+    :return: the dataframe, with the same types as read from the CSV
+    """
+    filters = filters or {}
+    selected = None
+    if columns is not None:
+        selected = list(columns) + [column for column in filters if column not in columns]
+    table = feather.read_table(path, columns=selected, memory_map=True)
+    if filters:
+        mask = None
+        for column, values in filters.items():
+            values = values if isinstance(values, list) else [values]
+            column_mask = pc.is_in(table[column], value_set=pa.array(values, type=table.schema.field(column).type))
+            mask = column_mask if mask is None else pc.and_(mask, column_mask)
+        table = table.filter(mask)
+        if columns is not None:
+            table = table.select(list(columns))
+    df = table.to_pandas()
+    string_columns = (table.schema.metadata or {}).get(STRING_COLUMNS, b"").decode("utf-8")
+    for column in filter(None, string_columns.split("\x1f")):
+        if column in df.columns:
+            df[column] = df[column].astype(object)
+    return df
+
+
+def read_table(path: str, **read_csv_args) -> pd.DataFrame:
+    """
+    Function that reads a dataset from its columnar copy if it is in sync, from the CSV otherwise
+    :param path: path of the CSV file (or directly of the columnar file)
+    :param read_csv_args: arguments given to pd.read_csv when the CSV is read
+    :return: the dataframe
+    """
+    if path.endswith(".feather"):
+        return read_columnar(path)
+    if not read_csv_args and is_in_sync(path):
+        return read_columnar(columnar_path(path))
+    return pd.read_csv(path, **read_csv_args)
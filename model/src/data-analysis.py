@@ -1,26 +1,47 @@
 # Import necessary libraries and classes
+import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
-from cleaning_datasets import CleaningDatasets
 
-def create_final_dataset() -> pd.DataFrame:
+# The script is run from the model folder (python src/data-analysis.py): the classes are imported from src, as in main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.cleaning_datasets import CleaningDatasets
+from src.outlier_rules import OUTLIER_RULES, OutlierRules
+from src.pipeline import Pipeline
+
+cleaner = CleaningDatasets()
+
+# CSV files gathered in the dataset, read by the stages of create_final_dataset
+ANALYSIS_SOURCES = {
+    "read-immoweb": {"path": "./data/precleaned-dataset-immoweb.csv"},
+    "read-zip-codes": {"path": "./data/code-nis-zip-code.csv"},
+    "read-income-median": {"path": "./data/median-income-2022.csv"},
+    "read-density-population": {"path": "./data/density-population.csv"},
+    "read-income-mean": {"path": "./data/mean-income-2022.csv"},
+    "read-surface-area": {"path": "./data/surface-area-2024-district.csv", "header": None},
+    "read-sales": {"path": "./data/sales-real-estates-belgium-district.csv"},
+}
+
+
+def read_csv(path: str, header: int | None = 0) -> pd.DataFrame:
     """
-    Function that creates the dataset with all the data gathered
-    :return: final dataframe that will be analysed
+    Stage that reads one of the CSV files
+    :param path: path of the CSV file
+    :param header: line of the column names, None if the file has none
+    :return: the dataframe
     """
-    cleaner = CleaningDatasets()
+    return pd.read_csv(path, header=header)
 
-    # Import all CSV files
-    df = pd.read_csv(f"./data/precleaned-dataset-immoweb.csv")
-    zip_code = pd.read_csv(f"./data/code-nis-zip-code.csv")
-    income_median = pd.read_csv(f"./data/median-income-2022.csv")
-    density_population = pd.read_csv(f"./data/density-population.csv")
-    income_mean = pd.read_csv(f"./data/mean-income-2022.csv")
-    surface_area = pd.read_csv(f"./data/surface-area-2024-district.csv", header=None)
-    median_price = pd.read_csv(f"./data/sales-real-estates-belgium-district.csv")
 
+def clean_median_price(median_price: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stage that cleans the median prices of sales per district
+    :param median_price: the sales per district, per year and per quarter
+    :return: one line per district with the transactions and the mean of the median prices of 2023
+    """
     # Cleaning of median_price dataframe : remove rows, columns, rename columns, create new columns
     median_price = cleaner.drop_rows(median_price, (median_price["année"] != 2023))
     columns_drop_medianprice = [
@@ -58,6 +79,15 @@ def create_final_dataset() -> pd.DataFrame:
     )
     median_price = median_price.drop_duplicates()
 
+    return median_price
+
+
+def clean_surface_area(surface_area: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stage that cleans the surface areas per district
+    :param surface_area: the parcels and surface areas per district and per category
+    :return: one line per district with the total, built and land parcels and surface areas
+    """
     # Cleaning of surface_area dataframe : remove columns, drop rows, rename columns, create new columns
     surface_area.columns = [
         "refnis",
@@ -122,9 +152,36 @@ def create_final_dataset() -> pd.DataFrame:
         surface_area_total, surface_area_new_columns
     )
 
-    # Clean income_median CSV
-    income_median = cleaner.drop_rows(income_median, (income_median["CD_YEAR"] != 2022))
+    return surface_area_total
 
+
+def clean_income_median(income_median: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stage that keeps the median incomes of 2022
+    :param income_median: the median income per municipality and per year
+    :return: the median income per municipality
+    """
+    return cleaner.drop_rows(income_median, (income_median["CD_YEAR"] != 2022))
+
+
+def merge_municipalities(
+    zip_code: pd.DataFrame,
+    income_median: pd.DataFrame,
+    density_population: pd.DataFrame,
+    income_mean: pd.DataFrame,
+    surface_area_total: pd.DataFrame,
+    median_price: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Stage that gathers the data per zip code
+    :param zip_code: the zip codes and their refnis codes
+    :param income_median: the median income per municipality
+    :param density_population: the population per municipality
+    :param income_mean: the mean income per municipality
+    :param surface_area_total: the surface areas per district
+    :param median_price: the median prices per district
+    :return: the data per zip code, with the means and sums per district
+    """
     # Merging CSVs
     merged_df_income = cleaner.merging_dataset(
         zip_code, income_median, "Refnis code", "CD_MUNTY_REFNIS"
@@ -233,9 +290,19 @@ def create_final_dataset() -> pd.DataFrame:
     )
     merged_df_median_price = cleaner.new_columns(merged_df_median_price)
 
-    # Merging with the immoweb dataset
+    return merged_df_median_price
+
+
+def merge_immoweb(df: pd.DataFrame, merged_df_median_price: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stage that adds the data per zip code to the immoweb dataset
+    :param df: the immoweb dataset
+    :param merged_df_median_price: the data per zip code
+    :return: final dataframe that will be analysed
+    """
+    # Merging with the immoweb dataset (the first commune of a zip code, so the properties are not duplicated)
     final_df = cleaner.merging_dataset(
-        df, merged_df_median_price, "Zip code", "Postal code"
+        df, merged_df_median_price.drop_duplicates("Postal code"), "Zip code", "Postal code"
     )
     final_df = cleaner.drop_columns(final_df, ["Postal code"])
     final_df = cleaner.new_columns_conditions(final_df)
@@ -243,6 +310,39 @@ def create_final_dataset() -> pd.DataFrame:
     return final_df
 
 
+def create_final_dataset(workers: int | None = None) -> pd.DataFrame:
+    """
+    Function that creates the dataset with all the data gathered.
+    The files are read and cleaned as independent stages, run concurrently, and the report of the run
+    (with its critical path) is printed.
+    :param workers: number of stages run at the same time, the number of cores if None
+    :return: final dataframe that will be analysed
+    """
+    pipeline = Pipeline(".cache/data-analysis")
+    # Import all CSV files
+    for name, source in ANALYSIS_SOURCES.items():
+        pipeline.add_stage(name, read_csv, params=source, files=[source["path"]])
+    pipeline.add_stage("median-price", clean_median_price, ["read-sales"])
+    pipeline.add_stage("surface-area", clean_surface_area, ["read-surface-area"])
+    pipeline.add_stage("income-median", clean_income_median, ["read-income-median"])
+    pipeline.add_stage(
+        "municipalities",
+        merge_municipalities,
+        [
+            "read-zip-codes",
+            "income-median",
+            "read-density-population",
+            "read-income-mean",
+            "surface-area",
+            "median-price",
+        ],
+    )
+    pipeline.add_stage("final-dataset", merge_immoweb, ["read-immoweb", "municipalities"])
+    pipeline.run(workers or os.cpu_count())
+    pipeline.print_report()
+    return pipeline.result("final-dataset")
+
+
 # Creation of the dataset to analyze
 df = create_final_dataset()
 
@@ -338,36 +438,18 @@ check_boxplot("Property")
 
 
 # Removing the outliers
-def remove_outliers():
+def remove_outliers() -> pd.DataFrame:
     """
-    Functiun that removes the outliers we chose to be able to get the new correlation and info about the dataset
+    Functiun that removes the outliers we chose (the same rules as the training) to be able to get the new correlation and info about the dataset
+    :return: the dataset without the outliers
     """
-    df.drop(df[df["Price"] > 2500000].index, inplace=True)
-    df.drop(df[df["Property type"] == "Other_Property"].index, inplace=True)
-    df.drop(
-        df[
-            (df["Property type"] == "Mixed_Use_Building") & (df["Living area"] > 1200)
-        ].index,
-        inplace=True,
-    )
-    df.drop(
-        df[(df["Property"] == "Apartment") & (df["Living area"] > 450)].index,
-        inplace=True,
-    )
-    df.drop(
-        df[(df["Property"] == "Apartment") & (df["Price"] > 1000000)].index,
-        inplace=True,
-    )
-    df.drop(
-        df[(df["Property"] == "House") & (df["Living area"] > 1200)].index, inplace=True
-    )
-    df.drop(
-        df[(df["Property"] != "House") & (df["Property"] != "Apartment")].index,
-        inplace=True,
-    )
+    without_outliers, report = OutlierRules(OUTLIER_RULES).apply(df)
+    for rule, count in report.items():
+        print(f"Outliers removed ({rule}): {count}")
+    return without_outliers
 
 
-remove_outliers()
+df = remove_outliers()
 
 # Creating the new correlation graphs to see the difference once the outliers have been removed
 dataset_check_graphs_info("two")
\ No newline at end of file
@@ -0,0 +1,91 @@
+from time import perf_counter
+import numpy as np
+from src.model_selection import metrics
+
+
+def latency(function, repeat: int) -> float:
+    """
+    Function that measures the median time of a call
+    :param function: the function to call
+    :param repeat: number of calls
+    :return: the median time, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        function()
+        times.append(perf_counter() - start_time)
+    return float(np.median(times))
+
+
+def inference_latency(predict_row, predict_batch, rows: list, batch_size: int = 10000) -> dict:
+    """
+    Function that measures the time to predict one property and a batch of properties
+    :param predict_row: function predicting the price of one row
+    :param predict_batch: function predicting the prices of a list of rows
+    :param rows: rows of the testing set, in the format of the functions
+    :param batch_size: number of rows of the batch (rows drawn from the testing set)
+    :return: time per row alone and per row in a batch, in microseconds
+    """
+    sample = [rows[i % len(rows)] for i in range(200)]
+    single = latency(lambda: [predict_row(row) for row in sample], 5) / len(sample)
+    batch = [rows[i] for i in np.random.default_rng(42).integers(0, len(rows), batch_size)]
+    batched = latency(lambda: predict_batch(batch), 5) / batch_size
+    return {"row_us": single * 1e6, "batch_row_us": batched * 1e6}
+
+
+def compare_engines(linear_trainer, boosting_trainer) -> dict[str, dict]:
+    """
+    Function that measures the linear scorer used by the app and the gradient boosting model on the same testing set
+    :param linear_trainer: the LinearRegressionModel, after create_linear_model
+    :param boosting_trainer: the GradientBoostingModel, after create_model
+    :return: engine name -> metrics, training time, artifact size and latencies
+    """
+    _, X_test, _, y_test = linear_trainer.split()
+    scorer = linear_trainer.scorer
+    type_positions, district_positions = boosting_trainer.encoder.positions_from_one_hot(X_test)
+    numeric = X_test[scorer.numeric_columns].values.astype(float)
+    linear_rows = list(zip(map(tuple, numeric.tolist()), type_positions.tolist(), district_positions.tolist()))
+    linear = {
+        **metrics(y_test.values, scorer.score_dataframe(X_test)),
+        "training_seconds": linear_trainer.metadata["training_seconds"],
+        "artifact_bytes": len(scorer.to_bytes()),
+        **inference_latency(
+            lambda row: scorer.score(*row),
+            lambda rows: scorer.score_batch(*(np.array(column) for column in zip(*rows))),
+            linear_rows,
+        ),
+    }
+    model = boosting_trainer.model
+    boosting_rows = list(boosting_trainer.features(X_test))
+    boosting = {
+        **boosting_trainer.report,
+        **inference_latency(
+            lambda row: model.predict(row.reshape(1, -1)),
+            lambda rows: model.predict(np.array(rows)),
+            boosting_rows,
+        ),
+    }
+    return {"linear": linear, "gbm": boosting}
+
+
+def print_engine_report(reports: dict[str, dict]):
+    """
+    Function that prints the accuracy and the cost of the model engines side by side
+    :param reports: engine name -> metrics (mae, rmse, mape), training_seconds, artifact_bytes, row_us, batch_row_us
+    """
+    lines = [
+        ("MAE", "mae", "{:.0f}"),
+        ("RMSE", "rmse", "{:.0f}"),
+        ("MAPE", "mape", "{:.3f}"),
+        ("Training time (s)", "training_seconds", "{:.3f}"),
+        ("Artifact size (kB)", "artifact_bytes", "{:.1f}"),
+        ("Latency per row (us)", "row_us", "{:.1f}"),
+        ("Latency per row in a batch of 10k (us)", "batch_row_us", "{:.2f}"),
+    ]
+    print(f"\n{'':<40}" + "".join(f"{name:>16}" for name in reports))
+    for label, key, value_format in lines:
+        values = [
+            report[key] / 1000 if key == "artifact_bytes" else report[key] for report in reports.values()
+        ]
+        print(f"{label:<40}" + "".join(f"{value_format.format(value):>16}" for value in values))
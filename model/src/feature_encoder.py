@@ -0,0 +1,221 @@
+import json
+import numpy as np
+import pandas as pd
+
+TYPE_PREFIX = "Property type_"
+DISTRICT_PREFIX = "district_"
+
+
+class FeatureEncoder:
+    """
+    Class that turns the features of a property into the columns of the model.
+    It is fitted on the training data by model/main.py and saved with the model, so the
+    training and the app use the same mappings and the same order of the columns.
+    The one-hot columns follow pd.get_dummies(drop_first=True): sorted categories, the first one
+    being the reference category without column.
+    """
+
+    numeric_columns = [
+        "Living area",
+        "Surface of the plot",
+        "Building condition",
+        "Swimming pool",
+        "mean-income",
+        "median-price",
+    ]
+
+    # Building conditions -> numerical values used by the model
+    building_conditions = {
+        "As new": 6,
+        "Just renovated": 5,
+        "Good": 4,
+        "To be done up": 3,
+        "To renovate": 2,
+        "To restore": 1,
+    }
+
+    # Names of the property types in the app -> names used in the dataset
+    property_type_names = {
+        "Country cottage": "Country_Cottage",
+        "Exceptional property": "Exceptional_Property",
+        "Town house": "Town_House",
+        "Manor house": "Manor_House",
+        "Studio": "Flat_Studio",
+    }
+
+    def __init__(self, types: list[str], districts: list[float]):
+        """
+        Initialize the encoder with the categories of the training data
+        :param types: property types, sorted
+        :param districts: district codes, sorted
+        """
+        self.types = list(types)
+        self.districts = [float(district) for district in districts]
+        # Position of each category among the one-hot columns, -1 for the reference category
+        self.type_positions = {name: i - 1 for i, name in enumerate(self.types)}
+        for label, name in self.property_type_names.items():
+            if name in self.type_positions:
+                self.type_positions[label] = self.type_positions[name]
+        self.district_positions = {code: i - 1 for i, code in enumerate(self.districts)}
+        self.columns = (
+            self.numeric_columns
+            + [TYPE_PREFIX + name for name in self.types[1:]]
+            + [DISTRICT_PREFIX + str(code) for code in self.districts[1:]]
+        )
+        self.type_offset = len(self.numeric_columns)
+        self.district_offset = self.type_offset + len(self.types) - 1
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame) -> "FeatureEncoder":
+        """
+        Function that learns the categories of the property types and the districts
+        :param df: the training data
+        :return: the fitted encoder
+        """
+        types = sorted(df["Property type"].unique())
+        districts = sorted(df["district"].astype(float).unique())
+        return cls(types, districts)
+
+    def to_bytes(self) -> bytes:
+        """
+        Function that serializes the encoder in JSON
+        :return: the content of the file
+        """
+        content = {
+            "numeric_columns": self.numeric_columns,
+            "building_conditions": self.building_conditions,
+            "property_type_names": self.property_type_names,
+            "types": self.types,
+            "districts": self.districts,
+        }
+        return json.dumps(content, indent=2).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "FeatureEncoder":
+        """
+        Function that loads an encoder serialized with to_bytes
+        :param content: the content of the file
+        :return: the encoder
+        """
+        content = json.loads(content)
+        if (
+            content["numeric_columns"] != cls.numeric_columns
+            or content["building_conditions"] != cls.building_conditions
+            or content["property_type_names"] != cls.property_type_names
+        ):
+            raise ValueError("The saved encoder does not match the code of FeatureEncoder")
+        return cls(content["types"], content["districts"])
+
+    def condition_code(self, building_condition: str) -> int:
+        """
+        Function that returns the numerical value of a building condition
+        :param building_condition: the building condition, e.g. "Good"
+        :return: the numerical value
+        """
+        if building_condition not in self.building_conditions:
+            raise ValueError(f"Unknown building condition: {building_condition}")
+        return self.building_conditions[building_condition]
+
+    def type_position(self, property_type: str) -> int:
+        """
+        Function that returns the position of a property type among the one-hot columns
+        :param property_type: the property type, as in the app or as in the dataset
+        :return: the position, -1 for the reference type
+        """
+        if property_type not in self.type_positions:
+            raise ValueError(f"Unknown property type: {property_type}")
+        return self.type_positions[property_type]
+
+    def district_position(self, district: float) -> int:
+        """
+        Function that returns the position of a district among the one-hot columns
+        :param district: the district code
+        :return: the position, -1 for the reference district
+        """
+        if district not in self.district_positions:
+            raise ValueError(f"Unknown district: {district}")
+        return self.district_positions[district]
+
+    def condition_codes(self, building_conditions: pd.Series) -> np.ndarray:
+        """
+        Function that returns the numerical values of several building conditions
+        :param building_conditions: the building conditions
+        :return: the numerical values
+        """
+        codes = building_conditions.map(self.building_conditions)
+        if codes.isna().any():
+            unknown = sorted(set(building_conditions[codes.isna()]))
+            raise ValueError(f"Unknown building conditions: {unknown}")
+        return codes.values.astype(int)
+
+    def type_positions_of(self, property_types: pd.Series) -> np.ndarray:
+        """
+        Function that returns the positions of several property types
+        :param property_types: the property types, as in the app or as in the dataset
+        :return: the positions, -1 for the reference type
+        """
+        positions = property_types.map(self.type_positions)
+        if positions.isna().any():
+            unknown = sorted(set(property_types[positions.isna()]))
+            raise ValueError(f"Unknown property types: {unknown}")
+        return positions.values.astype(int)
+
+    def district_positions_of(self, districts: pd.Series) -> np.ndarray:
+        """
+        Function that returns the positions of several districts
+        :param districts: the district codes
+        :return: the positions, -1 for the reference district
+        """
+        positions = districts.astype(float).map(self.district_positions)
+        if positions.isna().any():
+            unknown = sorted(set(districts[positions.isna()]))
+            raise ValueError(f"Unknown districts: {unknown}")
+        return positions.values.astype(int)
+
+    def one_hot(
+        self, numeric: np.ndarray, type_positions: np.ndarray, district_positions: np.ndarray
+    ) -> np.ndarray:
+        """
+        Function that builds the matrix with the columns of the model
+        :param numeric: array with one line per property and one column per element of numeric_columns
+        :param type_positions: position of the property type of each property
+        :param district_positions: position of the district of each property
+        :return: the matrix, one line per property and one column per element of columns
+        """
+        numeric = np.asarray(numeric, dtype=float)
+        type_positions = np.asarray(type_positions)
+        district_positions = np.asarray(district_positions)
+        data = np.zeros((len(numeric), len(self.columns)))
+        data[:, : self.type_offset] = numeric
+        rows = np.arange(len(numeric))
+        has_type = type_positions >= 0
+        data[rows[has_type], self.type_offset + type_positions[has_type]] = 1
+        has_district = district_positions >= 0
+        data[rows[has_district], self.district_offset + district_positions[has_district]] = 1
+        return data
+
+    def positions_from_one_hot(self, X: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Function that finds the position of the property type and of the district from their one-hot columns
+        :param X: data with the columns of the model
+        :return: the positions of the property types and of the districts, -1 for the reference categories
+        """
+        positions = []
+        for prefix, categories in ((TYPE_PREFIX, self.types), (DISTRICT_PREFIX, self.districts)):
+            one_hot = X[[prefix + str(category) for category in categories[1:]]].values.astype(bool)
+            positions.append(np.where(one_hot.any(axis=1), one_hot.argmax(axis=1), -1))
+        return positions[0], positions[1]
+
+    def dummies(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Function that replaces the property type and the district by their one-hot columns, like pd.get_dummies
+        :param df: the training data, with the columns "Property type" and "district"
+        :return: the dataframe with the one-hot columns at the end
+        """
+        one_hot = self.one_hot(
+            np.zeros((len(df), self.type_offset)),
+            self.type_positions_of(df["Property type"]),
+            self.district_positions_of(df["district"]),
+        )[:, self.type_offset :].astype(bool)
+        dummies = pd.DataFrame(one_hot, columns=self.columns[self.type_offset :], index=df.index)
+        return pd.concat([df.drop(columns=["Property type", "district"]), dummies], axis=1)
@@ -0,0 +1,88 @@
+# Import libraries
+import os
+import pickle
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from src.artifacts import atomic_write_bytes
+from src.feature_encoder import FeatureEncoder
+from src.model_selection import metrics
+
+# Directory of the artifacts, whatever the working directory
+PREDICT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "predict")
+MODEL_FILE = "gradient_boosting.pkl"
+
+
+class GradientBoostingModel:
+    """
+    Class to create the histogram gradient boosting model & compute the metrics.
+    The property type and the district are given to the model as two categorical columns
+    (their position in the encoder + 1) instead of about 60 one-hot columns.
+    """
+
+    def __init__(self, X: pd.DataFrame, y: pd.Series, encoder: FeatureEncoder):
+        """
+        Initialize the class with the dataset
+        :param X: features set, with the columns of the encoder (one-hot encoded categories)
+        :param y: target values corresponding to the features
+        :param encoder: the encoder fitted on the dataset
+        """
+        self.X = X
+        self.y = y
+        self.encoder = encoder
+        self.model = None
+        self.report = {}
+
+    def features(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Function that turns the one-hot columns into the columns of the model: the numeric columns,
+        then the codes of the property type and of the district (0 for the reference categories)
+        :param X: data with the columns of the encoder
+        :return: the features of the model
+        """
+        type_positions, district_positions = self.encoder.positions_from_one_hot(X)
+        return np.column_stack(
+            [X[FeatureEncoder.numeric_columns].values.astype(float), type_positions + 1, district_positions + 1]
+        )
+
+    def create_model(self) -> dict:
+        """
+        Function that trains the model on the same training set as LinearRegressionModel, prints the metrics
+        on the testing set and saves the model
+        :return: the metrics, training time and size of the saved model
+        """
+        X_train, X_test, y_train, y_test = train_test_split(
+            self.X, self.y, test_size=0.2, random_state=42
+        )
+        features_train, features_test = self.features(X_train), self.features(X_test)
+        categorical = [False] * len(FeatureEncoder.numeric_columns) + [True, True]
+        self.model = HistGradientBoostingRegressor(categorical_features=categorical, random_state=42)
+        start_time = perf_counter()
+        self.model.fit(features_train, y_train)
+        training_seconds = perf_counter() - start_time
+        prediction_test = self.model.predict(features_test)
+        print("Gradient boosting, testing metrics:")
+        test_metrics = metrics(y_test.values, prediction_test)
+        for name in ("mae", "rmse", "mape"):
+            print(f"{name.upper()}: {round(test_metrics[name], 2)}")
+        size = self.save_model()
+        self.report = {**test_metrics, "training_seconds": training_seconds, "artifact_bytes": size}
+        return self.report
+
+    def save_model(self) -> int:
+        """
+        Function that saves the model next to the prediction code, with the categories its codes refer to
+        :return: the size of the file
+        """
+        content = pickle.dumps(
+            {
+                "model": self.model,
+                "numeric_columns": FeatureEncoder.numeric_columns,
+                "types": self.encoder.types,
+                "districts": self.encoder.districts,
+            }
+        )
+        atomic_write_bytes(os.path.join(PREDICT_DIR, MODEL_FILE), content)
+        return len(content)
@@ -0,0 +1,121 @@
+import json
+import numpy as np
+import pandas as pd
+
+
+class GroupMedians:
+    """
+    Median of a column per group (e.g. plot surface per district), used to fill the missing values of the column.
+    The medians are computed once with one groupby aggregation, filling the values is a lookup.
+    """
+
+    def __init__(self, keys: list[str], column: str, medians: dict[tuple, float]):
+        """
+        Initialize the table
+        :param keys: columns defining the groups
+        :param column: column whose missing values are filled
+        :param medians: group (tuple of the values of the keys) -> median of the column
+        """
+        self.keys = list(keys)
+        self.column = column
+        self.medians = medians
+        # Index of the groups and their medians, built once for values_of (NaN last, for the groups not found)
+        if len(self.keys) > 1:
+            self.index = pd.MultiIndex.from_tuples(list(medians), names=self.keys)
+        else:
+            self.index = pd.Index([group[0] for group in medians])
+        self.values = np.append(np.array(list(medians.values()), dtype=float), np.nan)
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, keys: list[str], column: str) -> "GroupMedians":
+        """
+        Function that computes the median of a column per group
+        :param df: the data
+        :param keys: columns defining the groups
+        :param column: column to compute the median of
+        :return: the table
+        """
+        medians = df.groupby(keys)[column].median().dropna()
+        groups = medians.index if len(keys) > 1 else [(key,) for key in medians.index]
+        return cls(keys, column, dict(zip((tuple(group) for group in groups), medians.tolist())))
+
+    def values_of(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Function that returns the median of the group of every line
+        :param df: dataframe with the key columns
+        :return: the medians, NaN for the groups without median
+        """
+        groups = pd.MultiIndex.from_frame(df[self.keys]) if len(self.keys) > 1 else df[self.keys[0]]
+        return self.values[self.index.get_indexer(groups)]
+
+    def fill(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Function that fills the missing values of the column with the median of their group
+        :param df: dataframe with the column and the key columns
+        :return: the filled column
+        """
+        missing = df[self.column].isna()
+        if not missing.any():
+            return df[self.column]
+        filled = df[self.column].copy()
+        filled[missing] = self.values_of(df[missing])
+        return filled
+
+    def value(self, *group) -> float:
+        """
+        Function that returns the median of one group
+        :param group: the values of the keys
+        :return: the median, NaN if the group has none
+        """
+        return self.medians.get(group, np.nan)
+
+    def to_dict(self) -> dict:
+        return {
+            "keys": self.keys,
+            "column": self.column,
+            "groups": [list(group) + [median] for group, median in self.medians.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "GroupMedians":
+        medians = {tuple(line[:-1]): line[-1] for line in content["groups"]}
+        return cls(content["keys"], content["column"], medians)
+
+
+class ImputationTables:
+    """
+    Class holding the medians used to fill the missing values, by name. They are computed by
+    model/main.py and saved with the model, so the app fills a missing value (e.g. the plot surface)
+    with the same median as the training, without any groupby.
+    """
+
+    def __init__(self, tables: dict[str, GroupMedians]):
+        """
+        Initialize the tables
+        :param tables: name -> table
+        """
+        self.tables = dict(tables)
+
+    def __getitem__(self, name: str) -> GroupMedians:
+        return self.tables[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tables
+
+    def to_bytes(self) -> bytes:
+        """
+        Function that serializes the tables in JSON
+        :return: the content of the file
+        """
+        content = {name: table.to_dict() for name, table in self.tables.items()}
+        return json.dumps(content, indent=2).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "ImputationTables":
+        """
+        Function that loads tables serialized with to_bytes
+        :param content: the content of the file
+        :return: the tables
+        """
+        content = json.loads(content)
+        return cls({name: GroupMedians.from_dict(table) for name, table in content.items()})
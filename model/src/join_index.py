@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Integer keys spanning at most this many values (and this many per line) are looked up in a dense array:
+# zip codes are, refnis codes (a few hundred keys spread over 80 000 values) are hashed
+DENSE_MAX_SPAN = 1_000_000
+DENSE_MAX_SPAN_PER_LINE = 16
+
+
+def is_integer(keys: pd.Series) -> bool:
+    """
+    Function that checks if keys are integers, without missing values
+    :param keys: the keys
+    :return: True if their type is a numpy integer type
+    """
+    return isinstance(keys.dtype, np.dtype) and keys.dtype.kind in "iu"
+
+
+class JoinIndex:
+    """
+    Index of the key column of a dimension table (one line per key), built once and reused by every merge on it.
+    Integer keys in a small range (refnis codes, zip codes) are looked up in a dense array: key -> line,
+    the other keys (names of communes...) in a pandas index whose hash table is built once.
+    A merge then only gathers the columns of the dimension table at the lines found, instead of a full hash join.
+    """
+
+    def __init__(self, keys: pd.Series):
+        """
+        Initialize the index
+        :param keys: the key column of the dimension table, without duplicates
+        """
+        self.name = keys.name
+        # A copy: the table may be changed after, the index must then be built again (see matches)
+        self.keys = keys.to_numpy(copy=True)
+        self.dtype = keys.dtype
+        index = pd.Index(keys)
+        if not index.is_unique:
+            duplicates = index[index.duplicated()].unique()
+            raise ValueError(
+                f"{len(duplicates)} duplicated keys in {self.name}, the merge would multiply the lines "
+                f"(e.g. {', '.join(str(key) for key in duplicates[:5])})"
+            )
+        self.index = index
+        # Line of the missing key, missing keys match it as in pandas.merge
+        missing = np.flatnonzero(pd.isna(self.keys))
+        self.missing_position = missing[0] if len(missing) else -1
+        self.table = None
+        self.offset = 0
+        if is_integer(keys) and len(keys) > 0:
+            low, high = int(self.keys.min()), int(self.keys.max())
+            span = high - low + 1
+            if span <= min(DENSE_MAX_SPAN, DENSE_MAX_SPAN_PER_LINE * len(keys)):
+                self.offset = low
+                self.table = np.full(span, -1, dtype=np.int32)
+                self.table[self.keys.astype(np.int64) - low] = np.arange(len(keys))
+
+    def matches(self, keys: pd.Series) -> bool:
+        """
+        Function that checks if the index was built on these keys (so it can be reused instead of built again)
+        :param keys: the key column of the dimension table
+        :return: True if the keys are the same
+        """
+        return keys.dtype == self.dtype and len(keys) == len(self.keys) and np.array_equal(keys.to_numpy(), self.keys)
+
+    def positions(self, keys: pd.Series) -> np.ndarray:
+        """
+        Function that finds the line of the dimension table of every key
+        :param keys: the keys to look up, e.g. the key column of the fact table
+        :return: the line of every key, -1 if it is not in the index
+        """
+        numeric = pd.api.types.is_numeric_dtype(keys.dtype) and not pd.api.types.is_bool_dtype(keys.dtype)
+        if numeric != (pd.api.types.is_numeric_dtype(self.dtype) and not pd.api.types.is_bool_dtype(self.dtype)):
+            raise ValueError(f"Cannot merge {keys.name} ({keys.dtype}) on {self.name} ({self.dtype})")
+        if self.table is not None and numeric:
+            if is_integer(keys):
+                values = keys.to_numpy()
+                lines = np.arange(len(values))
+            else:
+                # Missing or non integer keys are never found
+                values = keys.to_numpy(dtype=float, na_value=np.nan)
+                lines = np.flatnonzero(np.isfinite(values) & (values == np.floor(values)))
+            codes = values[lines].astype(np.int64) - self.offset
+            in_range = (codes >= 0) & (codes < len(self.table))
+            positions = np.full(len(values), -1, dtype=np.intp)
+            positions[lines[in_range]] = self.table[codes[in_range]]
+            return positions
+        # Every distinct key is looked up once
+        codes, uniques = pd.factorize(keys)
+        return np.append(self.index.get_indexer(uniques), self.missing_position)[codes]
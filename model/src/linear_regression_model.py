@@ -1,4 +1,7 @@
 # Import libraries & dataset
+import os
+from datetime import datetime, timezone
+from time import perf_counter
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -6,7 +9,22 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+import sklearn
 import pickle
+from src.artifacts import atomic_write_bytes
+from src.linear_scorer import LinearScorer
+from src.model_bundle import ModelBundle
+from src.model_selection import (
+    CANDIDATES,
+    SELECTION_METRICS,
+    candidate_name,
+    cross_validate,
+    make_estimator,
+    print_results,
+)
+
+# Directory of the artifacts, whatever the working directory
+PREDICT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "predict")
 
 
 class LinearRegressionModel:
@@ -25,43 +43,143 @@ class LinearRegressionModel:
         self.df = df
         self.X = X
         self.y = y
+        self.scaler = None
+        # Scorer saved for the app, see export_scorer
+        self.scorer = None
+        # Information about the training, saved in the model bundle
+        self.metadata = {}
 
-    def create_linear_model(self):
+    def split(self) -> tuple:
+        """
+        Function that splits the dataset into the training & testing sets
+        :return: X_train, X_test, y_train, y_test
+        """
+        return train_test_split(self.X, self.y, test_size=0.2, random_state=42)
+
+    def select_model(
+        self,
+        candidates: list[dict] = CANDIDATES,
+        folds: int = 5,
+        metric: str = "mae",
+        workers: int | None = None,
+    ) -> dict:
+        """
+        Function that compares candidate models (estimator, alpha, log of the price) with a k-fold
+        cross-validation on the training set, in parallel, and prints their metrics
+        :param candidates: the candidates, see model_selection.CANDIDATES
+        :param folds: number of folds
+        :param metric: metric used to choose the best candidate ("mae", "rmse" or "mape")
+        :param workers: number of processes (number of cores if None)
+        :return: the best candidate
+        """
+        if metric not in SELECTION_METRICS:
+            raise ValueError(f"The metric must be one of {SELECTION_METRICS}")
+        X_train, _, y_train, _ = self.split()
+        start_time = perf_counter()
+        results = cross_validate(X_train, y_train, candidates, folds, workers)
+        wall_time = perf_counter() - start_time
+        print_results(results, metric, wall_time)
+        best = min(results, key=lambda result: result[metric])
+        self.metadata["cross_validation"] = {
+            "folds": folds,
+            "metric": metric,
+            "wall_seconds": wall_time,
+            "results": {
+                result["name"]: {name: result[name] for name in SELECTION_METRICS + ["r2", "seconds"]}
+                for result in results
+            },
+        }
+        return best["candidate"]
+
+    def create_linear_model(self, candidate: dict | None = None):
         """
         Function that creates the train & test datasets, the linear regression model and get the metrics
+        :param candidate: estimator, alpha and target of the model (see select_model), a LinearRegression on the price if None
         """
+        candidate = candidate or {"estimator": "linear", "alpha": None, "log_target": False}
+        log_target = candidate["log_target"]
         # Split the dataset into training & testing sets
-        X_train, X_test, y_train, y_test = train_test_split(
-            self.X, self.y, test_size=0.2, random_state=42
-        )
+        X_train, X_test, y_train, y_test = self.split()
+        X_test_raw = X_test
         # Standaridization of the features
         X_train, X_test = self.standardization_values(X_train, X_test)
         # Create and train the model
-        regression = LinearRegression()
-        regression.fit(X_train, y_train)
+        regression = make_estimator(candidate)
+        start_time = perf_counter()
+        regression.fit(X_train, np.log(y_train) if log_target else y_train)
+        training_seconds = perf_counter() - start_time
         # Make predictions
         prediction_test = regression.predict(X_test)
         prediction_train = regression.predict(X_train)
+        if log_target:
+            prediction_test, prediction_train = np.exp(prediction_test), np.exp(prediction_train)
         # Gettings the metrics & print them
         print("Training metrics:")
-        self.score_model(regression, X_train, y_train)
+        self.score_model(y_train, prediction_train)
         self.mae_metric(y_train, prediction_train)
         self.rmse_metric(y_train, prediction_train)
         self.mape_metric(y_train, prediction_train)
         print("Testing metrics:")
-        self.score_model(regression, X_test, y_test)
-        self.mae_metric(y_test, prediction_test)
-        self.rmse_metric(y_test, prediction_test)
-        self.mape_metric(y_test, prediction_test)
+        self.metadata.update(
+            {
+                "trained_at": datetime.now(timezone.utc).isoformat(),
+                "model": type(regression).__name__,
+                "candidate": candidate_name(candidate),
+                "log_target": log_target,
+                "target": str(self.y.name),
+                "training_rows": len(X_train),
+                "testing_rows": len(X_test),
+                "training_seconds": training_seconds,
+                "testing_metrics": {
+                    "r2": self.score_model(y_test, prediction_test),
+                    "mae": self.mae_metric(y_test, prediction_test),
+                    "rmse": self.rmse_metric(y_test, prediction_test),
+                    "mape": self.mape_metric(y_test, prediction_test),
+                },
+                "sklearn_version": sklearn.__version__,
+            }
+        )
         # Save comparison of test into a CSV and a plot
         self.comparison_test_prediction(y_test, prediction_test)
-        self.save_model(regression)
+        self.save_model(regression, log_target)
+        self.export_scorer(regression, X_test_raw, prediction_test, log_target)
 
     # Saving the model
-    def save_model(self, model):
-        pickle_out = open("../predict/regression.pkl", "wb")
-        pickle.dump(model, pickle_out)
-        pickle_out.close()
+    def save_model(self, model, log_target: bool = False):
+        """
+        Function that saves the scaler and the model next to the prediction code: as pickles,
+        and as a versioned bundle (numpy archive + JSON manifest) read by the app without sklearn.
+        The files are written atomically, the model last.
+        :param model: the trained regression model
+        :param log_target: True if the model predicts the log of the price
+        """
+        bundle = ModelBundle.from_pipeline(
+            self.scaler, model, list(self.X.columns), self.metadata, log_target
+        )
+        atomic_write_bytes(os.path.join(PREDICT_DIR, "model_bundle.json"), bundle.manifest_bytes())
+        atomic_write_bytes(os.path.join(PREDICT_DIR, "model_bundle.npz"), bundle.to_bytes())
+        atomic_write_bytes(os.path.join(PREDICT_DIR, "scaler.pkl"), pickle.dumps(self.scaler))
+        atomic_write_bytes(os.path.join(PREDICT_DIR, "regression.pkl"), pickle.dumps(model))
+
+    def export_scorer(
+        self,
+        model: LinearRegression,
+        X_test: pd.DataFrame,
+        prediction: np.ndarray,
+        log_target: bool = False,
+    ):
+        """
+        Function that folds the scaler into the model coefficients, checks the result
+        against the pipeline on the testing set and saves it for the app
+        :param model: the trained regression model
+        :param X_test: testing set, before standardization
+        :param prediction: predicted values of the pipeline for the testing set
+        :param log_target: True if the model predicts the log of the price
+        """
+        scorer = LinearScorer.from_pipeline(self.scaler, model, list(self.X.columns), log_target)
+        scorer.check_parity(X_test, prediction)
+        self.scorer = scorer
+        atomic_write_bytes(os.path.join(PREDICT_DIR, "scorer.npz"), scorer.to_bytes())
 
     def standardization_values(
         self, X_train: np.ndarray, X_test: np.ndarray
@@ -75,48 +193,54 @@ class LinearRegressionModel:
         scaler = StandardScaler()
         X_train = scaler.fit_transform(X_train)
         X_test = scaler.transform(X_test)
-        with open("../predict/scaler.pkl", "wb") as scaler_file:
-            pickle.dump(scaler, scaler_file)
+        # The scaler is saved together with the model in save_model
+        self.scaler = scaler
         return X_train, X_test
 
-    def score_model(
-        self, model: LinearRegression, features: np.ndarray, target: pd.Series
-    ):
+    def score_model(self, target: pd.Series, prediction: np.ndarray):
         """
         Function that calculates and prints the R2 score of the model
-        :param features: feature dataset
         :param target: target values corresponding to the features
+        :param prediction: predicted values
+        :return: the score
         """
-        score = round(model.score(features, target), 2)
+        score = round(r2_score(target, prediction), 2)
         print(f"Score: {score}")
+        return score
 
     def mae_metric(self, target: pd.Series, prediction: np.ndarray):
         """
         Function that calculates and prints the mean absolute error (MAE)
         :param target: target values corresponding to the features
         :param prediction: predicted values
+        :return: the MAE
         """
         mae = round(mean_absolute_error(target, prediction), 2)
         print(f"MAE: {mae}")
+        return mae
 
     def rmse_metric(self, target: pd.Series, prediction: np.ndarray):
         """
         Function that calcultes and prints the mean squared error (MSE) and the root MSE (RSME)
         :param target: target values corresponding to the features
         :param prediction: predicted values
+        :return: the RMSE
         """
         mse = mean_squared_error(target, prediction)
         rmse = round(np.sqrt(mse), 2)
         print(f"RMSE: {rmse}")
+        return rmse
 
     def mape_metric(self, target: pd.Series, prediction: np.ndarray):
         """
         Function that calcultes and prints the mean absolute percentage error (MAPE)
         :param target: target values corresponding to the features
         :param prediction: predicted values
+        :return: the MAPE
         """
         mape = round(np.mean(np.abs((target - prediction) / target)), 2)
         print(f"MAPE: {mape}")
+        return mape
 
     def comparison_test_prediction(self, y_test: pd.Series, prediction: np.ndarray):
         """
@@ -0,0 +1,175 @@
+import io
+import math
+import numpy as np
+import pandas as pd
+from .feature_encoder import DISTRICT_PREFIX, TYPE_PREFIX
+
+
+class LinearScorer:
+    """
+    Class that computes the prediction of the StandardScaler + LinearRegression pipeline without pandas nor sklearn.
+    The scaler is folded into the coefficients: a price is the intercept, plus the dot product of the numeric
+    features, plus the weight of the property type and the weight of the district, both found by index
+    (and the exponential of this sum if the model was trained on the log of the prices).
+    """
+
+    def __init__(
+        self,
+        intercept: float,
+        numeric_columns: list[str],
+        numeric_weights: np.ndarray,
+        types: list[str],
+        type_weights: np.ndarray,
+        districts: list[float],
+        district_weights: np.ndarray,
+        log_target: bool = False,
+    ):
+        """
+        Initialize the scorer with the folded coefficients
+        :param intercept: intercept of the model once the scaler is folded in
+        :param numeric_columns: names of the numeric columns, in the order of the values given to score()
+        :param numeric_weights: weight of each numeric column
+        :param types: property types having a column in the model
+        :param type_weights: weight of each property type
+        :param districts: districts having a column in the model
+        :param district_weights: weight of each district
+        :param log_target: True if the model predicts the log of the price
+        """
+        self.intercept = float(intercept)
+        self.numeric_columns = list(numeric_columns)
+        self.numeric_weights = np.asarray(numeric_weights, dtype=float)
+        self.types = list(types)
+        self.districts = [float(district) for district in districts]
+        # The reference category of get_dummies(drop_first=True) has no column: it gets the last position, with a weight of 0
+        self.type_weights = np.append(np.asarray(type_weights, dtype=float), 0.0)
+        self.district_weights = np.append(np.asarray(district_weights, dtype=float), 0.0)
+        self.log_target = bool(log_target)
+        # Python floats: faster than numpy for the dot product of a single property
+        self._numeric_weights = self.numeric_weights.tolist()
+        self._type_weights = self.type_weights.tolist()
+        self._district_weights = self.district_weights.tolist()
+
+    @classmethod
+    def from_pipeline(cls, scaler, regression, columns: list[str], log_target: bool = False) -> "LinearScorer":
+        """
+        Function that folds a fitted StandardScaler into the coefficients of the fitted LinearRegression (or Ridge, Lasso)
+        :param scaler: the fitted scaler
+        :param regression: the fitted linear regression
+        :param columns: the columns of the training data, in order
+        :param log_target: True if the regression was trained on the log of the prices
+        :return: the scorer
+        """
+        # coef * (x - mean) / scale = (coef / scale) * x - coef * mean / scale
+        weights = regression.coef_ / scaler.scale_
+        intercept = regression.intercept_ - np.sum(weights * scaler.mean_)
+        columns = list(columns)
+        numeric = [i for i, column in enumerate(columns) if not column.startswith((TYPE_PREFIX, DISTRICT_PREFIX))]
+        types = [i for i, column in enumerate(columns) if column.startswith(TYPE_PREFIX)]
+        districts = [i for i, column in enumerate(columns) if column.startswith(DISTRICT_PREFIX)]
+        return cls(
+            intercept,
+            [columns[i] for i in numeric],
+            weights[numeric],
+            [columns[i][len(TYPE_PREFIX):] for i in types],
+            weights[types],
+            [float(columns[i][len(DISTRICT_PREFIX):]) for i in districts],
+            weights[districts],
+            log_target,
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        Function that serializes the scorer in the numpy format
+        :return: the content of the file
+        """
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            intercept=self.intercept,
+            numeric_columns=np.array(self.numeric_columns),
+            numeric_weights=self.numeric_weights,
+            types=np.array(self.types),
+            type_weights=self.type_weights[:-1],
+            districts=np.array(self.districts),
+            district_weights=self.district_weights[:-1],
+            log_target=self.log_target,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "LinearScorer":
+        """
+        Function that loads a scorer serialized with to_bytes
+        :param content: the content of the file
+        :return: the scorer
+        """
+        with np.load(io.BytesIO(content)) as arrays:
+            return cls(
+                float(arrays["intercept"]),
+                arrays["numeric_columns"].tolist(),
+                arrays["numeric_weights"],
+                arrays["types"].tolist(),
+                arrays["type_weights"],
+                arrays["districts"].tolist(),
+                arrays["district_weights"],
+                # Scorers saved before the log target existed predict the price
+                bool(arrays["log_target"]) if "log_target" in arrays else False,
+            )
+
+    def score(self, numeric: tuple, type_position: int, district_position: int) -> float:
+        """
+        Function that predicts the price of one property
+        :param numeric: values of the numeric columns, in the order of numeric_columns
+        :param type_position: position of the property type in types (-1 for the reference type)
+        :param district_position: position of the district in districts (-1 for the reference district)
+        :return: the predicted price
+        """
+        price = self.intercept
+        for value, weight in zip(numeric, self._numeric_weights):
+            price += value * weight
+        price += self._type_weights[type_position] + self._district_weights[district_position]
+        return math.exp(price) if self.log_target else price
+
+    def score_batch(
+        self, numeric: np.ndarray, type_positions: np.ndarray, district_positions: np.ndarray
+    ) -> np.ndarray:
+        """
+        Function that predicts the prices of several properties
+        :param numeric: array with one line per property and one column per element of numeric_columns
+        :param type_positions: position of the property type of each property (-1 for the reference type)
+        :param district_positions: position of the district of each property (-1 for the reference district)
+        :return: the predicted prices
+        """
+        prices = (
+            self.intercept
+            + np.asarray(numeric, dtype=float) @ self.numeric_weights
+            + self.type_weights[type_positions]
+            + self.district_weights[district_positions]
+        )
+        return np.exp(prices) if self.log_target else prices
+
+    def score_dataframe(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Function that predicts the prices of data with the columns of the model (one-hot encoded categories)
+        :param X: data with the columns used to train the model
+        :return: the predicted prices
+        """
+        type_columns = X[[TYPE_PREFIX + name for name in self.types]].values.astype(float)
+        district_columns = X[[DISTRICT_PREFIX + str(code) for code in self.districts]].values.astype(float)
+        # Position of the 1 in the one-hot columns, or -1 if all of them are 0 (reference category)
+        type_positions = np.where(type_columns.any(axis=1), type_columns.argmax(axis=1), -1)
+        district_positions = np.where(district_columns.any(axis=1), district_columns.argmax(axis=1), -1)
+        return self.score_batch(X[self.numeric_columns].values, type_positions, district_positions)
+
+    def check_parity(self, X: pd.DataFrame, expected: np.ndarray, tolerance: float = 1e-6):
+        """
+        Function that checks the scorer gives the same prices as the scaler + regression pipeline
+        :param X: data with the columns used to train the model (not standardized)
+        :param expected: prices predicted by the pipeline for X
+        :param tolerance: maximum relative difference allowed
+        """
+        difference = np.abs(self.score_dataframe(X) - expected) / np.maximum(np.abs(expected), 1.0)
+        if difference.max() > tolerance:
+            raise ValueError(
+                f"The linear scorer differs from the pipeline (max relative difference: {difference.max():.3g})"
+            )
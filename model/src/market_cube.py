@@ -0,0 +1,238 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+
+QUARTERS = ["Q1", "Q2", "Q3", "Q4"]
+# Position of the whole year on the quarter axis, after the 4 quarters
+YEAR = len(QUARTERS)
+PROPERTIES = ["House", "Apartment"]
+STATISTICS = ["transactions", "median-price", "first-quartile", "third-quartile"]
+# Columns of the sales CSV per property, in the order of STATISTICS
+SALES_COLUMNS = {
+    "House": [
+        "nombre transactions - maison",
+        "prix médian(€)-maison",
+        "prix premier quartile(€)-maison",
+        "prix troisième quartile(€)-maison",
+    ],
+    "Apartment": [
+        "nombre transactions-appartement",
+        "prix médian(€)-appartement",
+        "prix premier quartile(€)-appartement",
+        "prix troisième quartile(€)-appartement",
+    ],
+}
+
+
+def parse_period(period: str) -> tuple[int, int]:
+    """
+    Function that reads a period of the sales, a year ("2023") or a quarter ("2023-Q4")
+    :param period: the period
+    :return: the year and the position of the quarter (YEAR for the whole year)
+    """
+    year, _, quarter = str(period).partition("-")
+    if not year.isdigit() or (quarter and quarter not in QUARTERS):
+        raise ValueError(f"Invalid period: {period}, expected a year (2023) or a quarter (2023-Q4)")
+    return int(year), QUARTERS.index(quarter) if quarter else YEAR
+
+
+def previous_year(period: str) -> str:
+    """
+    Function that returns the same period one year before, e.g. "2022-Q4" for "2023-Q4"
+    :param period: the period
+    :return: the period of the year before
+    """
+    year, quarter = parse_period(period)
+    return str(year - 1) if quarter == YEAR else f"{year - 1}-{QUARTERS[quarter]}"
+
+
+class MarketCube:
+    """
+    Statistics of the sales of the districts, per year and per quarter (sales-real-estates-belgium-district.csv):
+    for houses and apartments, the number of transactions and the median, first and third quartiles of the prices.
+    They are kept in one array (district, year, quarter, property, statistic), the 5th quarter being the whole year,
+    so the statistics of a district and a period are read without searching anything.
+    """
+
+    def __init__(
+        self,
+        districts: np.ndarray,
+        names: np.ndarray,
+        first_year: int,
+        values: np.ndarray,
+        present: np.ndarray,
+        reference: str,
+    ):
+        """
+        Initialize the cube
+        :param districts: the refnis codes of the districts, sorted
+        :param names: name of each district
+        :param first_year: the first year of the sales
+        :param values: array (district, year, quarter, property, statistic), NaN if unknown
+        :param present: boolean array (district, year, quarter), True if the sales have a line for it
+        :param reference: the period of the median prices given to the model, e.g. "2023"
+        """
+        self.districts = np.asarray(districts)
+        self.names = np.asarray(names)
+        self.first_year = int(first_year)
+        self.values = np.asarray(values, dtype=float)
+        self.present = np.asarray(present, dtype=bool)
+        self.reference = str(reference)
+        self.positions = {int(district): position for position, district in enumerate(self.districts)}
+
+    @property
+    def years(self) -> np.ndarray:
+        return np.arange(self.first_year, self.first_year + self.values.shape[1])
+
+    @classmethod
+    def from_sales(cls, sales: pd.DataFrame, reference: str) -> "MarketCube":
+        """
+        Function that builds the cube from the sales, grouped once per district, year and quarter.
+        The statistics of a year are the sum of the transactions and the mean of the quarterly prices
+        (as the median prices given to the model always were).
+        :param sales: the sales, one line per district and quarter
+        :param reference: the period of the median prices given to the model
+        :return: the cube
+        """
+        counts = [SALES_COLUMNS[property][0] for property in PROPERTIES]
+        prices = [column for property in PROPERTIES for column in SALES_COLUMNS[property][1:]]
+        grouped = sales.groupby(["refnis", "année", "période"])
+        quarters = pd.concat(
+            [grouped[counts].sum(min_count=1), grouped[prices].mean(), grouped["localité"].first()], axis=1
+        ).reset_index()
+
+        districts, district_positions = np.unique(quarters["refnis"].values, return_inverse=True)
+        first_year = int(quarters["année"].min())
+        year_positions = quarters["année"].values - first_year
+        quarter_positions = quarters["période"].map({quarter: position for position, quarter in enumerate(QUARTERS)})
+        if quarter_positions.isna().any():
+            raise ValueError(f"Unknown quarters in the sales: {sorted(set(quarters['période']) - set(QUARTERS))}")
+        quarter_positions = quarter_positions.values.astype(int)
+        shape = (len(districts), int(year_positions.max()) + 1, len(QUARTERS) + 1)
+        values = np.full(shape + (len(PROPERTIES), len(STATISTICS)), np.nan)
+        present = np.zeros(shape, dtype=bool)
+        columns = [column for property in PROPERTIES for column in SALES_COLUMNS[property]]
+        values[district_positions, year_positions, quarter_positions] = quarters[columns].values.reshape(
+            -1, len(PROPERTIES), len(STATISTICS)
+        )
+        present[district_positions, year_positions, quarter_positions] = True
+
+        # Whole years: sum of the transactions and mean of the prices of the quarters known
+        known = ~np.isnan(values[:, :, :YEAR])
+        totals = np.where(known, values[:, :, :YEAR], 0).sum(axis=2)
+        numbers = known.sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            years = np.where(numbers > 0, totals / numbers, np.nan)
+        years[..., 0] = np.where(numbers[..., 0] > 0, totals[..., 0], np.nan)
+        values[:, :, YEAR] = years
+        present[:, :, YEAR] = present[:, :, :YEAR].any(axis=2)
+
+        names = quarters.groupby(district_positions)["localité"].first().values
+        cube = cls(districts, names, first_year, values, present, reference)
+        cube.check_period(reference)
+        return cube
+
+    def check_period(self, period: str) -> tuple[int, int]:
+        """
+        Function that checks that the sales have a period
+        :param period: the period, e.g. "2023" or "2023-Q4"
+        :return: the position of the year and of the quarter
+        """
+        year, quarter = parse_period(period)
+        year_position = year - self.first_year
+        if not 0 <= year_position < self.values.shape[1] or not self.present[:, year_position, quarter].any():
+            raise ValueError(f"No sales in {period}, the sales go from {self.first_year} to {self.years[-1]}")
+        return year_position, quarter
+
+    def to_bytes(self) -> bytes:
+        """
+        Function that serializes the cube in the numpy format
+        :return: the content of the file
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            districts=self.districts,
+            names=self.names.astype(str),
+            first_year=np.array(self.first_year),
+            values=self.values,
+            present=self.present,
+            reference=np.array(json.dumps(self.reference)),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "MarketCube":
+        """
+        Function that loads a cube serialized with to_bytes
+        :param content: the content of the file
+        :return: the cube
+        """
+        with np.load(io.BytesIO(content), allow_pickle=False) as arrays:
+            return cls(
+                arrays["districts"],
+                arrays["names"],
+                int(arrays["first_year"]),
+                arrays["values"],
+                arrays["present"],
+                json.loads(str(arrays["reference"])),
+            )
+
+    def __contains__(self, district) -> bool:
+        return district == district and int(district) in self.positions
+
+    def name(self, district) -> str:
+        """
+        Function that returns the name of a district, as in the sales
+        :param district: refnis code of the district
+        :return: the name
+        """
+        if district not in self:
+            raise ValueError(f"Unknown district: {district}")
+        return str(self.names[self.positions[int(district)]])
+
+    def lookup(self, district, period: str) -> pd.DataFrame:
+        """
+        Function that returns the statistics of a district in a period
+        :param district: refnis code of the district
+        :param period: the period, e.g. "2023" or "2023-Q4"
+        :return: one line per property and one column per statistic (NaN if unknown)
+        """
+        if district not in self:
+            raise ValueError(f"Unknown district: {district}")
+        year, quarter = parse_period(period)
+        year_position = year - self.first_year
+        if not 0 <= year_position < self.values.shape[1]:
+            return pd.DataFrame(np.nan, index=PROPERTIES, columns=STATISTICS)
+        values = self.values[self.positions[int(district)], year_position, quarter]
+        return pd.DataFrame(values, index=PROPERTIES, columns=STATISTICS)
+
+    def history(self, district, property: str) -> pd.DataFrame:
+        """
+        Function that returns the statistics of a district for every year
+        :param district: refnis code of the district
+        :param property: "House" or "Apartment"
+        :return: one line per year and one column per statistic (NaN if unknown)
+        """
+        if district not in self:
+            raise ValueError(f"Unknown district: {district}")
+        values = self.values[self.positions[int(district)], :, YEAR, PROPERTIES.index(property)]
+        return pd.DataFrame(values, index=pd.Index(self.years, name="year"), columns=STATISTICS)
+
+    def median_prices(self, period: str | None = None) -> pd.DataFrame:
+        """
+        Function that returns the median prices of the districts with sales in a period, given to the model
+        :param period: the period, the reference period of the cube if None
+        :return: one line per district: refnis, house-median-price and apartment-median-price
+        """
+        year_position, quarter = self.check_period(period or self.reference)
+        keep = self.present[:, year_position, quarter]
+        prices = self.values[keep, year_position, quarter, :, STATISTICS.index("median-price")]
+        return pd.DataFrame(
+            {
+                "refnis": self.districts[keep],
+                "house-median-price": prices[:, PROPERTIES.index("House")],
+                "apartment-median-price": prices[:, PROPERTIES.index("Apartment")],
+            }
+        )
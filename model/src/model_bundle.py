@@ -0,0 +1,194 @@
+import io
+import json
+import numpy as np
+
+# Name and version of the format: the version changes when the content of the bundle changes
+BUNDLE_FORMAT = "immo-eliza-linear-model"
+BUNDLE_VERSION = 2
+# Transformation of the price the model was trained on, reverted by predict()
+TARGET_TRANSFORMS = ["identity", "log"]
+# Arrays of the bundle: name -> number of dimensions (0 for a scalar, 1 for one value per column)
+BUNDLE_ARRAYS = {
+    "coefficients": 1,
+    "intercept": 0,
+    "scaler_mean": 1,
+    "scaler_scale": 1,
+}
+
+
+class ModelBundle:
+    """
+    Class holding the StandardScaler + LinearRegression pipeline as plain arrays, saved as a numpy archive
+    with a JSON manifest (format, version, column order, shape of the arrays, training metadata).
+    Unlike the pickles, it is loaded with numpy alone and can be inspected by reading the manifest.
+    """
+
+    def __init__(
+        self,
+        columns: list[str],
+        coefficients: np.ndarray,
+        intercept: float,
+        scaler_mean: np.ndarray,
+        scaler_scale: np.ndarray,
+        metadata: dict | None = None,
+        target_transform: str = "identity",
+    ):
+        """
+        Initialize the bundle
+        :param columns: columns of the model, in order
+        :param coefficients: coefficient of each column (on standardized values)
+        :param intercept: intercept of the model
+        :param scaler_mean: mean of each column in the training set
+        :param scaler_scale: standard deviation of each column in the training set
+        :param metadata: information about the training (date, number of lines, metrics...)
+        :param target_transform: "log" if the model predicts the log of the price
+        """
+        if target_transform not in TARGET_TRANSFORMS:
+            raise ValueError(f"Unknown target transform: {target_transform!r}")
+        self.columns = list(columns)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.intercept = np.float64(intercept)
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+        self.metadata = dict(metadata or {})
+        self.target_transform = target_transform
+
+    @classmethod
+    def from_pipeline(
+        cls,
+        scaler,
+        regression,
+        columns: list[str],
+        metadata: dict | None = None,
+        log_target: bool = False,
+    ) -> "ModelBundle":
+        """
+        Function that creates the bundle from the fitted scaler and linear regression
+        :param scaler: the fitted StandardScaler
+        :param regression: the fitted LinearRegression (or Ridge, Lasso)
+        :param columns: the columns of the training data, in order
+        :param metadata: information about the training
+        :param log_target: True if the regression was trained on the log of the prices
+        :return: the bundle
+        """
+        return cls(
+            columns,
+            regression.coef_,
+            regression.intercept_,
+            scaler.mean_,
+            scaler.scale_,
+            metadata,
+            "log" if log_target else "identity",
+        )
+
+    def manifest(self) -> dict:
+        """
+        Function that describes the content of the bundle
+        :return: the manifest
+        """
+        return {
+            "format": BUNDLE_FORMAT,
+            "version": BUNDLE_VERSION,
+            "columns": self.columns,
+            "target_transform": self.target_transform,
+            "arrays": {
+                name: {"dtype": "float64", "shape": list(getattr(self, name).shape)}
+                for name in BUNDLE_ARRAYS
+            },
+            "metadata": self.metadata,
+        }
+
+    def manifest_bytes(self) -> bytes:
+        """
+        Function that serializes the manifest in JSON, to save it next to the archive
+        :return: the content of the file
+        """
+        return json.dumps(self.manifest(), indent=2).encode("utf-8")
+
+    def to_bytes(self) -> bytes:
+        """
+        Function that serializes the bundle in the numpy format (uncompressed), manifest included
+        :return: the content of the file
+        """
+        buffer = io.BytesIO()
+        arrays = {name: getattr(self, name) for name in BUNDLE_ARRAYS}
+        np.savez(buffer, manifest=np.array(json.dumps(self.manifest())), **arrays)
+        return buffer.getvalue()
+
+    @staticmethod
+    def check_manifest(manifest: dict):
+        """
+        Function that checks a manifest describes a bundle this code can read
+        :param manifest: the manifest
+        """
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Not a model bundle: format {manifest.get('format')!r}")
+        if manifest.get("version") != BUNDLE_VERSION:
+            raise ValueError(
+                f"Model bundle version {manifest.get('version')!r} is not supported (expected {BUNDLE_VERSION}), train the model again"
+            )
+        if set(manifest.get("arrays", {})) != set(BUNDLE_ARRAYS):
+            raise ValueError(f"The model bundle must contain the arrays {sorted(BUNDLE_ARRAYS)}")
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "ModelBundle":
+        """
+        Function that loads a bundle serialized with to_bytes and checks it matches its manifest
+        :param content: the content of the file
+        :return: the bundle
+        """
+        with np.load(io.BytesIO(content), allow_pickle=False) as archive:
+            manifest = json.loads(str(archive["manifest"]))
+            cls.check_manifest(manifest)
+            arrays = {name: archive[name] for name in BUNDLE_ARRAYS}
+        columns = manifest["columns"]
+        for name, dimensions in BUNDLE_ARRAYS.items():
+            array = arrays[name]
+            expected_shape = [len(columns)] * dimensions
+            if (
+                array.dtype != np.float64
+                or list(array.shape) != expected_shape
+                or manifest["arrays"][name] != {"dtype": "float64", "shape": expected_shape}
+            ):
+                raise ValueError(
+                    f"Array {name} of the model bundle: {array.dtype} {list(array.shape)}, expected float64 {expected_shape}"
+                )
+        return cls(
+            columns,
+            arrays["coefficients"],
+            arrays["intercept"],
+            arrays["scaler_mean"],
+            arrays["scaler_scale"],
+            manifest["metadata"],
+            manifest["target_transform"],
+        )
+
+    def transform(self, data) -> np.ndarray:
+        """
+        Function that standardizes the data, like StandardScaler.transform()
+        :param data: dataframe or array with the columns of the model
+        :return: the standardized data
+        """
+        # Dataframe: the columns are taken in the order of the model
+        if hasattr(data, "columns"):
+            data = data[self.columns]
+        return (np.asarray(data, dtype=np.float64) - self.scaler_mean) / self.scaler_scale
+
+    def predict(self, data) -> np.ndarray:
+        """
+        Function that predicts the prices, like the scaler + LinearRegression.predict().
+        einsum sums every line in the same order whatever the number of lines,
+        so a property gets exactly the same price alone or in a batch.
+        :param data: dataframe or array with the columns of the model, one line per property
+        :return: the predicted prices
+        """
+        return self.predict_standardized(self.transform(data))
+
+    def predict_standardized(self, standardized: np.ndarray) -> np.ndarray:
+        """
+        Function that predicts the prices of data already standardized with transform()
+        :param standardized: the standardized data, one line per property
+        :return: the predicted prices
+        """
+        prediction = np.einsum("ij,j->i", standardized, self.coefficients) + self.intercept
+        return np.exp(prediction) if self.target_transform == "log" else prediction
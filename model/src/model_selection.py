@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Lasso, LinearRegression, Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold
+from sklearn.preprocessing import StandardScaler
+
+# Candidates compared by the cross-validation: estimator, regularization and target (price or log of the price)
+CANDIDATES = (
+    [{"estimator": "linear", "alpha": None, "log_target": log_target} for log_target in (False, True)]
+    + [{"estimator": "ridge", "alpha": alpha, "log_target": False} for alpha in (0.1, 1.0, 10.0, 100.0)]
+    + [{"estimator": "ridge", "alpha": alpha, "log_target": True} for alpha in (0.1, 1.0, 10.0, 100.0)]
+    + [{"estimator": "lasso", "alpha": alpha, "log_target": False} for alpha in (10.0, 100.0, 1000.0)]
+    + [{"estimator": "lasso", "alpha": alpha, "log_target": True} for alpha in (0.0001, 0.001, 0.01)]
+)
+
+# Metrics the candidates can be ranked by (the lower the better)
+SELECTION_METRICS = ["mae", "rmse", "mape"]
+
+# Data of the cross-validation, sent once to every process of the pool
+_worker_data = {}
+
+
+def candidate_name(candidate: dict) -> str:
+    """
+    Function that returns a readable name for a candidate
+    :param candidate: the candidate
+    :return: e.g. "ridge(alpha=10.0) log"
+    """
+    name = candidate["estimator"]
+    if candidate["alpha"] is not None:
+        name += f"(alpha={candidate['alpha']})"
+    return name + (" log" if candidate["log_target"] else "")
+
+
+def make_estimator(candidate: dict):
+    """
+    Function that creates the (unfitted) estimator of a candidate
+    :param candidate: the candidate
+    :return: the estimator
+    """
+    if candidate["estimator"] == "linear":
+        return LinearRegression()
+    if candidate["estimator"] == "ridge":
+        return Ridge(alpha=candidate["alpha"])
+    if candidate["estimator"] == "lasso":
+        return Lasso(alpha=candidate["alpha"], max_iter=10000)
+    raise ValueError(f"Unknown estimator: {candidate['estimator']}")
+
+
+def fit_candidate(candidate: dict, X_train: np.ndarray, y_train: np.ndarray) -> tuple:
+    """
+    Function that standardizes the features and fits the estimator of a candidate
+    :param candidate: the candidate
+    :param X_train: training features
+    :param y_train: training prices
+    :return: the fitted scaler and estimator
+    """
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    estimator = make_estimator(candidate)
+    estimator.fit(X_train, np.log(y_train) if candidate["log_target"] else y_train)
+    return scaler, estimator
+
+
+def predict_candidate(candidate: dict, scaler, estimator, X: np.ndarray) -> np.ndarray:
+    """
+    Function that predicts prices with a fitted candidate
+    :param candidate: the candidate
+    :param scaler: the fitted scaler
+    :param estimator: the fitted estimator
+    :param X: features
+    :return: the predicted prices
+    """
+    prediction = estimator.predict(scaler.transform(X))
+    return np.exp(prediction) if candidate["log_target"] else prediction
+
+
+def metrics(target: np.ndarray, prediction: np.ndarray) -> dict:
+    """
+    Function that computes the metrics printed by LinearRegressionModel
+    :param target: real prices
+    :param prediction: predicted prices
+    :return: MAE, RMSE, MAPE and R2
+    """
+    return {
+        "mae": mean_absolute_error(target, prediction),
+        "rmse": float(np.sqrt(mean_squared_error(target, prediction))),
+        "mape": float(np.mean(np.abs((target - prediction) / target))),
+        "r2": r2_score(target, prediction),
+    }
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray):
+    _worker_data["X"] = X
+    _worker_data["y"] = y
+
+
+def _evaluate_fold(candidate: dict, train_index: np.ndarray, test_index: np.ndarray) -> tuple[dict, float]:
+    """
+    Function run in the pool: fits a candidate on the other folds and evaluates it on one fold
+    :return: the metrics on the fold and the time spent
+    """
+    start_time = perf_counter()
+    X, y = _worker_data["X"], _worker_data["y"]
+    scaler, estimator = fit_candidate(candidate, X[train_index], y[train_index])
+    fold_metrics = metrics(y[test_index], predict_candidate(candidate, scaler, estimator, X[test_index]))
+    return fold_metrics, perf_counter() - start_time
+
+
+def cross_validate(
+    X: pd.DataFrame,
+    y: pd.Series,
+    candidates: list[dict] = CANDIDATES,
+    folds: int = 5,
+    workers: int | None = None,
+) -> list[dict]:
+    """
+    Function that evaluates every candidate with a k-fold cross-validation, all the folds of all the
+    candidates running in parallel in a pool of processes
+    :param X: training features
+    :param y: training prices
+    :param candidates: the candidates
+    :param folds: number of folds
+    :param workers: number of processes (number of cores if None)
+    :return: per candidate, the mean metrics over the folds and the time spent fitting and evaluating
+    """
+    X_values, y_values = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=42).split(X_values))
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(X_values, y_values)
+    ) as pool:
+        futures = [
+            [pool.submit(_evaluate_fold, candidate, train_index, test_index) for train_index, test_index in splits]
+            for candidate in candidates
+        ]
+        results = []
+        for candidate, candidate_futures in zip(candidates, futures):
+            fold_results = [future.result() for future in candidate_futures]
+            result = {"candidate": candidate, "name": candidate_name(candidate)}
+            for metric in ("mae", "rmse", "mape", "r2"):
+                result[metric] = float(np.mean([fold_metrics[metric] for fold_metrics, _ in fold_results]))
+            result["seconds"] = sum(seconds for _, seconds in fold_results)
+            results.append(result)
+    return results
+
+
+def print_results(results: list[dict], metric: str, wall_time: float):
+    """
+    Function that prints the metrics of every candidate, the best one first
+    :param results: the results of cross_validate
+    :param metric: the metric used to rank the candidates
+    :param wall_time: time spent by the whole cross-validation
+    """
+    print(f"\n{'Candidate':<28} {'MAE':>10} {'RMSE':>10} {'MAPE':>6} {'R2':>6} {'Seconds':>8}")
+    for result in sorted(results, key=lambda line: line[metric]):
+        print(
+            f"{result['name']:<28} {result['mae']:>10.0f} {result['rmse']:>10.0f} "
+            f"{result['mape']:>6.3f} {result['r2']:>6.3f} {result['seconds']:>8.3f}"
+        )
+    print(f"Cross-validation wall time: {wall_time:.3f} s (best {metric}: {min(results, key=lambda line: line[metric])['name']})")
@@ -0,0 +1,88 @@
+import operator
+from typing import Any, NamedTuple
+import numpy as np
+import pandas as pd
+
+# Operators a rule can use, applied to the values of its column
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "in": lambda values, threshold: values.isin(threshold),
+    "not in": lambda values, threshold: ~values.isin(threshold),
+}
+
+
+class OutlierRule(NamedTuple):
+    """
+    A row is an outlier if `column op threshold`, only in the rows of the segment ({column: value}, all rows if None)
+    """
+
+    column: str
+    op: str
+    threshold: Any
+    segment: dict | None = None
+
+    def __str__(self) -> str:
+        segment = " & ".join(f"{column} == {value}" for column, value in (self.segment or {}).items())
+        return f"{self.column} {self.op} {self.threshold}" + (f" [{segment}]" if segment else "")
+
+
+# Outliers spotted in the analysis (data-analysis.py), removed before training
+OUTLIER_RULES = [
+    OutlierRule("Price", ">", 2500000),
+    OutlierRule("Property type", "==", "Other_Property"),
+    OutlierRule("Living area", ">", 1200, {"Property type": "Mixed_Use_Building"}),
+    OutlierRule("Living area", ">", 450, {"Property": "Apartment"}),
+    OutlierRule("Price", ">", 1000000, {"Property": "Apartment"}),
+    OutlierRule("Living area", ">", 1200, {"Property": "House"}),
+    OutlierRule("Property", "not in", ["House", "Apartment"]),
+]
+
+
+class OutlierRules:
+    """
+    Class removing the outliers of a dataframe with a list of rules: the rules are combined into one mask,
+    so the dataframe is filtered (and copied) only once
+    """
+
+    def __init__(self, rules: list[OutlierRule]):
+        """
+        Initialize the rules
+        :param rules: the rules, checked in this order to count the rows removed by each of them
+        """
+        for rule in rules:
+            if rule.op not in OPERATORS:
+                raise ValueError(f"Unknown operator {rule.op!r} in rule {rule}")
+        self.rules = list(rules)
+
+    def masks(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Function that computes which rows each rule matches
+        :param df: the dataframe
+        :return: boolean array of shape (number of rules, number of rows)
+        """
+        masks = np.zeros((len(self.rules), len(df)), dtype=bool)
+        for position, rule in enumerate(self.rules):
+            mask = OPERATORS[rule.op](df[rule.column], rule.threshold).to_numpy(dtype=bool)
+            for column, value in (rule.segment or {}).items():
+                mask &= (df[column] == value).to_numpy(dtype=bool)
+            masks[position] = mask
+        return masks
+
+    def apply(self, df: pd.DataFrame) -> tuple[pd.DataFrame, dict[str, int]]:
+        """
+        Function that removes the rows matched by at least one rule
+        :param df: the dataframe
+        :return: the dataframe without the outliers, and the number of rows removed per rule
+        (a row matched by several rules is counted for the first one, as if the rules were applied one after the other)
+        """
+        masks = self.masks(df)
+        outliers = masks.any(axis=0)
+        first_rules = masks[:, outliers].argmax(axis=0)
+        counts = np.bincount(first_rules, minlength=len(self.rules))
+        report = {str(rule): int(count) for rule, count in zip(self.rules, counts)}
+        return df.take(np.flatnonzero(~outliers)), report
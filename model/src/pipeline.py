@@ -0,0 +1,280 @@
+import glob
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+from src.artifacts import atomic_write_bytes, file_sha256
+
+
+class Stage:
+    """
+    One named step of the training pipeline
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function,
+        inputs: list[str],
+        params: dict,
+        files: list[str],
+        outputs: list[str],
+    ):
+        """
+        Initialize the stage
+        :param name: name of the stage
+        :param function: function called with the results of the input stages, then the parameters as keyword arguments
+        :param inputs: names of the stages whose results are given to the function
+        :param params: parameters of the function
+        :param files: files read by the function
+        :param outputs: files written by the function
+        """
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.params = params
+        self.files = files
+        self.outputs = outputs
+
+
+class Pipeline:
+    """
+    Class running the training pipeline as named stages, with the result of every stage cached on disk.
+    The cache key of a stage is a hash of its code, its parameters, the content of the files it reads
+    and the keys of its input stages: a stage is only run again if one of them changed.
+    The stages form a dependency graph: with several workers, the stages whose inputs are ready run concurrently.
+    """
+
+    def __init__(self, cache_dir: str = ".cache", use_cache: bool = True):
+        """
+        Initialize the pipeline
+        :param cache_dir: directory where the results of the stages are saved
+        :param use_cache: False to run every stage
+        """
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.stages = {}
+        self.keys = {}
+        self.results = {}
+        self.report = {}
+        self.workers = 1
+        self.wall_seconds = 0.0
+        self.start_time = 0.0
+        # Code shared by the stages: a change in one of the classes reruns all of them
+        self.code_hash = hashlib.sha256(
+            b"".join(
+                open(path, "rb").read()
+                for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py")))
+            )
+        ).hexdigest()
+
+    def add_stage(
+        self,
+        name: str,
+        function,
+        inputs: list[str] | None = None,
+        params: dict | None = None,
+        files: list[str] | None = None,
+        outputs: list[str] | None = None,
+    ):
+        """
+        Function that adds a stage after the ones already added
+        :param name: name of the stage
+        :param function: function called with the results of the input stages, then the parameters as keyword arguments
+        :param inputs: names of the stages whose results are given to the function
+        :param params: parameters of the function
+        :param files: files read by the function
+        :param outputs: files written by the function
+        """
+        inputs = inputs or []
+        for input_name in inputs:
+            if input_name not in self.stages:
+                raise ValueError(f"Stage {name}: unknown input stage {input_name}")
+        self.stages[name] = Stage(name, function, inputs, params or {}, files or [], outputs or [])
+
+    def stage_key(self, stage: Stage) -> str:
+        """
+        Function that computes the cache key of a stage
+        :param stage: the stage
+        :return: the key
+        """
+        content = {
+            "name": stage.name,
+            "code": hashlib.sha256(inspect.getsource(stage.function).encode()).hexdigest(),
+            "shared_code": self.code_hash,
+            "params": json.dumps(stage.params, sort_keys=True, default=str),
+            "files": {path: file_sha256(path) for path in stage.files},
+            "inputs": [self.keys[name] for name in stage.inputs],
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:16]
+
+    def cache_path(self, stage: Stage) -> str:
+        """
+        Function that returns the path of the cache entry of a stage, without extension
+        :param stage: the stage
+        :return: the path
+        """
+        return os.path.join(self.cache_dir, f"{stage.name}-{self.keys[stage.name]}")
+
+    def is_cached(self, stage: Stage) -> bool:
+        """
+        Function that checks if the result of a stage is in the cache and the files it wrote were not changed since
+        :param stage: the stage
+        :return: True if the stage does not need to run
+        """
+        path = self.cache_path(stage)
+        if not self.use_cache or not os.path.exists(path + ".json"):
+            return False
+        with open(path + ".json") as meta_file:
+            outputs = json.load(meta_file)["outputs"]
+        return all(
+            os.path.exists(output) and file_sha256(output) == digest
+            for output, digest in outputs.items()
+        )
+
+    def result(self, name: str):
+        """
+        Function that returns the result of a stage, from the cache or by running it
+        :param name: name of the stage
+        :return: the result of the stage
+        """
+        if name in self.results:
+            return self.results[name]
+        if self.report[name]["status"] == "miss":
+            for input_name in self.stages[name].inputs:
+                self.result(input_name)
+        return self.execute(name)
+
+    def execute(self, name: str):
+        """
+        Function that loads the result of a stage from the cache or runs it, the results of its inputs being ready
+        :param name: name of the stage
+        :return: the result of the stage
+        """
+        stage = self.stages[name]
+        line = self.report[name]
+        start_time = perf_counter()
+        if line["status"] == "hit":
+            with open(self.cache_path(stage) + ".pkl", "rb") as cache_file:
+                result = pickle.load(cache_file)
+        else:
+            values = [self.results[input_name] for input_name in stage.inputs]
+            result = stage.function(*values, **stage.params)
+        end_time = perf_counter()
+        line["seconds"] += end_time - start_time
+        line["start"] = start_time - self.start_time
+        line["end"] = end_time - self.start_time
+        self.results[name] = result
+        if line["status"] == "miss" and self.use_cache:
+            self.save(stage, result)
+        return result
+
+    def run_concurrently(self, names: list[str], workers: int):
+        """
+        Function that runs stages in a pool of threads, each one as soon as the stages it depends on are done
+        :param names: the stages to load or run (with the stages they depend on)
+        :param workers: number of threads
+        """
+        waiting = {
+            name: {input_name for input_name in self.stages[name].inputs if input_name in names}
+            for name in names
+        }
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage") as pool:
+            while waiting or running:
+                for name in [name for name, inputs in waiting.items() if not inputs]:
+                    del waiting[name]
+                    running[pool.submit(self.execute, name)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # The error of a stage stops the run once the running stages are done
+                    future.result()
+                    for inputs in waiting.values():
+                        inputs.discard(name)
+
+    def save(self, stage: Stage, result):
+        """
+        Function that saves the result of a stage and the hash of the files it wrote, replacing its previous entries
+        :param stage: the stage
+        :param result: the result of the stage
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for old_path in glob.glob(os.path.join(self.cache_dir, f"{stage.name}-{'[0-9a-f]' * 16}.*")):
+            os.remove(old_path)
+        path = self.cache_path(stage)
+        atomic_write_bytes(path + ".pkl", pickle.dumps(result))
+        meta = {"outputs": {output: file_sha256(output) for output in stage.outputs}}
+        atomic_write_bytes(path + ".json", json.dumps(meta, indent=2).encode("utf-8"))
+
+    def run(self, workers: int = 1) -> dict:
+        """
+        Function that runs the stages whose inputs changed
+        :param workers: number of stages run at the same time, 1 to run them one by one in order
+        :return: the report of the run, per stage: "hit" or "miss", the time spent (loading or running)
+        and when it started and ended, in seconds since the start of the run (None if it was not loaded)
+        """
+        self.results = {}
+        self.report = {}
+        self.workers = max(1, workers)
+        self.start_time = perf_counter()
+        for name, stage in self.stages.items():
+            self.keys[name] = self.stage_key(stage)
+            # A stage is run again if one of its inputs is
+            upstream_miss = any(self.report[input_name]["status"] == "miss" for input_name in stage.inputs)
+            status = "miss" if upstream_miss or not self.is_cached(stage) else "hit"
+            self.report[name] = {"status": status, "seconds": 0.0, "start": None, "end": None}
+        misses = [name for name in self.stages if self.report[name]["status"] == "miss"]
+        if self.workers == 1:
+            for name in misses:
+                self.result(name)
+        else:
+            # The cached stages are only loaded if a stage run needs their results
+            needed = set(misses)
+            for name in misses:
+                needed.update(self.stages[name].inputs)
+            self.run_concurrently([name for name in self.stages if name in needed], self.workers)
+        self.wall_seconds = perf_counter() - self.start_time
+        return self.report
+
+    def critical_path(self) -> tuple[list[str], float]:
+        """
+        Function that finds the chain of dependent stages taking the longest time in the last run:
+        with enough workers, the run cannot take less time than this chain
+        :return: the names of the stages of the chain, in order, and its time in seconds
+        """
+        finish, previous = {}, {}
+        for name, stage in self.stages.items():
+            previous[name] = max(stage.inputs, key=finish.get, default=None)
+            start = finish[previous[name]] if previous[name] is not None else 0.0
+            finish[name] = start + self.report[name]["seconds"]
+        name = max(finish, key=finish.get, default=None)
+        if name is None or finish[name] == 0:
+            return [], 0.0
+        seconds = finish[name]
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], seconds
+
+    def print_report(self):
+        """
+        Function that prints the status and the time of every stage
+        """
+        print("\nStage                    Cache   Seconds   Start     End")
+        for name, line in self.report.items():
+            start = f"{line['start']:.3f}" if line["start"] is not None else "-"
+            end = f"{line['end']:.3f}" if line["end"] is not None else "-"
+            print(f"{name:<24} {line['status']:<7} {line['seconds']:<9.3f} {start:<9} {end}")
+        total = sum(line["seconds"] for line in self.report.values())
+        print(f"{'total':<24} {'':<7} {total:.3f}")
+        path, seconds = self.critical_path()
+        print(f"\nCritical path ({seconds:.3f} s): {' -> '.join(path) or 'no stage loaded or run'}")
+        print(
+            f"Wall time: {self.wall_seconds:.3f} s with {self.workers} worker(s), "
+            f"{total:.3f} s of stages, {seconds:.3f} s on the critical path"
+        )
@@ -0,0 +1,185 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+from .feature_encoder import FeatureEncoder
+from .linear_scorer import LinearScorer
+from .zip_code_table import FIRST_ZIP_CODE, ZipCodeTable, add_provinces
+
+# Property types of the app, per property
+PROPERTY_TYPES = {
+    "House": [
+        "House",
+        "Bungalow",
+        "Castle",
+        "Chalet",
+        "Country cottage",
+        "Exceptional property",
+        "Farmhouse",
+        "Manor house",
+        "Mansion",
+        "Town house",
+        "Villa",
+    ],
+    "Apartment": [
+        "Apartment",
+        "Loft",
+        "Penthouse",
+        "Triplex",
+        "Duplex",
+        "Studio",
+        "Kot",
+    ],
+}
+
+# Property whose price is predicted in every zip code
+REFERENCE_PROPERTY = {
+    "living_area": 120,
+    "surface_plot": 300,
+    "building_condition": "Good",
+    "swimming_pool": "No",
+}
+
+
+class PriceMap:
+    """
+    Predicted price of a reference property (REFERENCE_PROPERTY) for every zip code and every property type of the app.
+    It is computed by model/main.py in one call to the scorer, so the app ranks the zip codes without predicting anything.
+    """
+
+    def __init__(
+        self,
+        zip_codes: np.ndarray,
+        provinces: np.ndarray,
+        property_types: list[str],
+        prices: np.ndarray,
+        reference: dict,
+    ):
+        """
+        Initialize the map
+        :param zip_codes: the zip codes, sorted
+        :param provinces: province of each zip code
+        :param property_types: the property types, as in the app
+        :param prices: array with one line per zip code and one column per property type (NaN if the price is unknown)
+        :param reference: the features of the reference property
+        """
+        self.zip_codes = np.asarray(zip_codes)
+        self.provinces = np.asarray(provinces)
+        self.property_types = list(property_types)
+        self.prices = np.asarray(prices, dtype=float)
+        self.reference = dict(reference)
+
+    @classmethod
+    def compute(
+        cls,
+        zip_table: ZipCodeTable,
+        encoder: FeatureEncoder,
+        scorer: LinearScorer,
+        reference: dict = REFERENCE_PROPERTY,
+    ) -> "PriceMap":
+        """
+        Function that predicts the price of the reference property for every zip code and property type
+        :param zip_table: the zip code table
+        :param encoder: the encoder of the model
+        :param scorer: the scorer of the model
+        :param reference: the features of the reference property
+        :return: the map
+        """
+        positions = np.flatnonzero(zip_table.known)
+        zip_codes = positions + FIRST_ZIP_CODE
+        districts, mean_incomes, house_prices, apartment_prices = zip_table.values[positions].T
+        # Districts unknown to the model have no price
+        district_positions = np.array([encoder.district_positions.get(district, -2) for district in districts])
+        known_district = district_positions != -2
+        district_positions[~known_district] = -1
+        property_types = [name for names in PROPERTY_TYPES.values() for name in names]
+        numeric, type_positions = [], []
+        for property, names in PROPERTY_TYPES.items():
+            median_prices = house_prices if property == "House" else apartment_prices
+            for name in names:
+                numeric.append(
+                    np.column_stack(
+                        [
+                            np.full(len(zip_codes), reference["living_area"]),
+                            np.full(len(zip_codes), reference["surface_plot"]),
+                            np.full(len(zip_codes), encoder.condition_code(reference["building_condition"])),
+                            np.full(len(zip_codes), 1 if reference["swimming_pool"] == "Yes" else 0),
+                            mean_incomes,
+                            median_prices,
+                        ]
+                    )
+                )
+                type_positions.append(np.full(len(zip_codes), encoder.type_position(name)))
+        # The whole grid in one call: one line per (property type, zip code)
+        prices = scorer.score_batch(
+            np.concatenate(numeric), np.concatenate(type_positions), np.tile(district_positions, len(property_types))
+        ).reshape(len(property_types), len(zip_codes)).T
+        prices[~known_district] = np.nan
+        provinces = add_provinces(pd.DataFrame({"Postal code": zip_codes, "district": districts}))["province"].values
+        return cls(zip_codes, provinces.astype(str), property_types, prices, reference)
+
+    def to_bytes(self) -> bytes:
+        """
+        Function that serializes the map in the numpy format
+        :return: the content of the file
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            zip_codes=self.zip_codes,
+            provinces=self.provinces,
+            property_types=np.array(self.property_types),
+            prices=self.prices,
+            reference=np.array(json.dumps(self.reference)),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "PriceMap":
+        """
+        Function that loads a map serialized with to_bytes
+        :param content: the content of the file
+        :return: the map
+        """
+        with np.load(io.BytesIO(content), allow_pickle=False) as arrays:
+            return cls(
+                arrays["zip_codes"],
+                arrays["provinces"],
+                arrays["property_types"].tolist(),
+                arrays["prices"],
+                json.loads(str(arrays["reference"])),
+            )
+
+    def ranking(
+        self,
+        property_type: str,
+        provinces: list[str] | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        ascending: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Function that ranks the zip codes by the price of a property type
+        :param property_type: the property type, as in the app
+        :param provinces: provinces to keep, all of them if None
+        :param min_price: minimum price to keep
+        :param max_price: maximum price to keep
+        :param ascending: True to rank the cheapest zip codes first
+        :return: the zip codes, their provinces and their prices, ranked
+        """
+        if property_type not in self.property_types:
+            raise ValueError(f"Unknown property type: {property_type}")
+        prices = self.prices[:, self.property_types.index(property_type)]
+        keep = ~np.isnan(prices)
+        if provinces is not None:
+            keep &= np.isin(self.provinces, provinces)
+        if min_price is not None:
+            keep &= prices >= min_price
+        if max_price is not None:
+            keep &= prices <= max_price
+        positions = np.flatnonzero(keep)
+        order = np.argsort(prices[positions], kind="stable")
+        if not ascending:
+            order = order[::-1]
+        positions = positions[order]
+        return self.zip_codes[positions], self.provinces[positions], prices[positions]
@@ -0,0 +1,149 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Fraction of the calls to profile, between 0 and 1 (profiling is disabled if the variable is not set)
+PROFILE_ENV = "IMMO_PROFILE"
+# Directory of the profiles
+PROFILE_DIR_ENV = "IMMO_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = "profiles"
+
+
+class Profiler:
+    """
+    Class capturing a cProfile and a tracemalloc snapshot of a sampled fraction of the calls of a function.
+    Every profiled call writes, with a timestamp in the file names:
+    - <name>-<timestamp>-<label>.prof: the cProfile statistics (pstats, snakeviz...)
+    - <name>-<timestamp>-<label>.tracemalloc: the allocations still alive at the end (tracemalloc.Snapshot.load)
+    - <name>-<timestamp>-<label>.txt: the top functions by cumulative time and the top allocation sites
+    """
+
+    def __init__(self, name: str, directory: str = DEFAULT_PROFILE_DIR, sample_rate: float = 1.0, top: int = 25):
+        """
+        Initialize the profiler
+        :param name: prefix of the files, e.g. "app" or "training"
+        :param directory: directory where the files are written
+        :param sample_rate: fraction of the calls to profile, between 0 and 1
+        :param top: number of functions and allocation sites in the summary
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"The sample rate must be between 0 and 1, not {sample_rate}")
+        self.name = name
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.top = top
+        # tracemalloc is global to the process: one profiled call at a time
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, sample_rate: float | None = None, directory: str | None = None) -> "Profiler | None":
+        """
+        Function that creates the profiler configured by the environment variables
+        :param name: prefix of the files
+        :param sample_rate: fraction of the calls to profile, overrides IMMO_PROFILE (e.g. given by a flag)
+        :param directory: directory of the files, overrides IMMO_PROFILE_DIR
+        :return: the profiler, None if profiling is disabled
+        """
+        if sample_rate is None:
+            value = os.environ.get(PROFILE_ENV, "")
+            if not value:
+                return None
+            sample_rate = float(value)
+        if sample_rate <= 0:
+            return None
+        directory = directory or os.environ.get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+        return cls(name, directory, sample_rate)
+
+    def sampled(self) -> bool:
+        """
+        Function that draws whether the next call is profiled
+        :return: True to profile it
+        """
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, label: str):
+        """
+        Context manager profiling the code it runs and writing the files at the end.
+        The code runs without profiling if another call is being profiled.
+        :param label: end of the file names, e.g. the name of the function
+        """
+        if not self._lock.acquire(blocking=False):
+            yield
+            return
+        started_tracemalloc = not tracemalloc.is_tracing()
+        try:
+            if started_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                self.write(label, profile, snapshot, peak)
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+            self._lock.release()
+
+    def write(self, label: str, profile: cProfile.Profile, snapshot: tracemalloc.Snapshot, peak: int) -> str:
+        """
+        Function that writes the files of a profiled call
+        :param label: end of the file names
+        :param profile: the cProfile of the call
+        :param snapshot: the tracemalloc snapshot taken at the end of the call
+        :param peak: peak of the memory traced during the call, in bytes
+        :return: the path of the files, without extension
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.directory, f"{self.name}-{timestamp}-{label}")
+        profile.dump_stats(path + ".prof")
+        snapshot.dump(path + ".tracemalloc")
+        stats_text = io.StringIO()
+        pstats.Stats(profile, stream=stats_text).sort_stats("cumulative").print_stats(self.top)
+        lines = [f"Profile of {self.name} ({label}), peak traced memory: {peak / 1024 / 1024:.1f} MB", ""]
+        lines.append(f"Top {self.top} functions by cumulative time:")
+        lines.append(stats_text.getvalue().strip())
+        lines.append("")
+        lines.append(f"Top {self.top} allocation sites (memory still allocated at the end):")
+        for statistic in snapshot.statistics("lineno")[: self.top]:
+            lines.append(str(statistic))
+        with open(path + ".txt", "w") as summary_file:
+            summary_file.write("\n".join(lines) + "\n")
+        return path
+
+
+def profiled(name: str):
+    """
+    Decorator profiling a sampled fraction of the calls of a function, as configured by IMMO_PROFILE.
+    Without the variable, the function is returned as is: the profiling costs nothing.
+    :param name: prefix of the files
+    """
+
+    def decorator(function):
+        profiler = Profiler.from_env(name)
+        if profiler is None:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.sampled():
+                return function(*args, **kwargs)
+            with profiler.profile(function.__name__):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,171 @@
+import io
+import numpy as np
+import pandas as pd
+from .imputation import GroupMedians, ImputationTables
+
+# Belgian postal codes go from 1000 to 9999
+FIRST_ZIP_CODE = 1000
+LAST_ZIP_CODE = 9999
+
+
+def add_provinces(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function that adds the missing district and the provinces to the additional data per zip code
+    :param df: the additional data as written by model/main.py
+    :return: the dataframe with the "province" column
+    """
+    # Adding the missing district on the right line
+    district = 37000
+    df.loc[df["Postal code"] == 3717, "district"] = district
+
+    # Adding the provinces in the dataframe
+    # Create a list of conditions
+    conditions_province = [
+        (df["Postal code"] <= 1299),
+        (df["Postal code"] > 1299) & (df["Postal code"] <= 1499),
+        (df["Postal code"] > 1499) & (df["Postal code"] <= 1999)
+        | (df["Postal code"] > 2999) & (df["Postal code"] <= 3499),
+        (df["Postal code"] > 1999) & (df["Postal code"] <= 2999),
+        (df["Postal code"] > 3499) & (df["Postal code"] <= 3999),
+        (df["Postal code"] > 3999) & (df["Postal code"] <= 4999),
+        (df["Postal code"] > 4999) & (df["Postal code"] <= 5680),
+        (df["Postal code"] > 5999) & (df["Postal code"] <= 6599)
+        | (df["Postal code"] > 6999) & (df["Postal code"] <= 7999),
+        (df["Postal code"] > 6599) & (df["Postal code"] <= 6999),
+        (df["Postal code"] > 7999) & (df["Postal code"] <= 8999),
+        (df["Postal code"] > 8999),
+    ]
+
+    # Create a list of the values we want to assign for each condition
+    values_province = [
+        "Brussels",
+        "Brabant Wallon",
+        "Vlaams-Brabant",
+        "Antwerp",
+        "Limburg",
+        "Liège",
+        "Namur",
+        "Hainaut",
+        "Luxembourg",
+        "West-Vlaanderen",
+        "Oost-Vlaanderen",
+    ]
+
+    # Create a new column and use np.select to assign values to it using our lists as arguments
+    df["province"] = np.select(conditions_province, values_province, default="Unknown")
+    return df
+
+
+def zip_code_medians(df: pd.DataFrame) -> ImputationTables:
+    """
+    Function that computes the medians filling the missing median prices of the zip codes:
+    house prices per district and apartment prices per province
+    :param df: the additional data as written by model/main.py
+    :return: the tables "house_price_by_district" and "apartment_price_by_province"
+    """
+    df = add_provinces(df.copy())
+    return ImputationTables(
+        {
+            "house_price_by_district": GroupMedians.fit(df, ["district"], "house-median-price"),
+            "apartment_price_by_province": GroupMedians.fit(df, ["province"], "apartment-median-price"),
+        }
+    )
+
+
+def complete_zip_codes(df: pd.DataFrame, medians: ImputationTables | None = None) -> pd.DataFrame:
+    """
+    Function that completes the additional data per zip code: missing district, provinces and missing median prices
+    :param df: the additional data as written by model/main.py
+    :param medians: the tables saved by the training (see zip_code_medians), computed from df if None
+    :return: the cleaned and complete dataframe
+    """
+    if medians is None:
+        medians = zip_code_medians(df)
+    df = add_provinces(df)
+    # Filling in the empty values
+    df["house-median-price"] = medians["house_price_by_district"].fill(df)
+    df["apartment-median-price"] = medians["apartment_price_by_province"].fill(df)
+    return df
+
+
+class ZipCodeTable:
+    """
+    Class holding the data needed for a prediction for every zip code, in arrays indexed by zip code - 1000.
+    It is computed once by model/main.py so the app only has to read one line of the arrays.
+    """
+
+    columns = ["district", "mean-income", "house-median-price", "apartment-median-price"]
+
+    def __init__(self, known: np.ndarray, values: np.ndarray):
+        """
+        Initialize the table
+        :param known: boolean array, True if the zip code exists
+        :param values: array with one line per zip code and one column per element of `columns`
+        """
+        self.known = known
+        self.values = values
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, medians: ImputationTables | None = None) -> "ZipCodeTable":
+        """
+        Function that creates the table from the additional data per zip code
+        :param df: the additional data as written by model/main.py
+        :param medians: the tables filling the missing median prices (see zip_code_medians)
+        :return: the table
+        """
+        df = complete_zip_codes(df, medians)
+        # Several lines for one zip code: the first one is used, as it always was in the app
+        df = df.drop_duplicates("Postal code")
+        positions = df["Postal code"].values - FIRST_ZIP_CODE
+        known = np.zeros(LAST_ZIP_CODE - FIRST_ZIP_CODE + 1, dtype=bool)
+        values = np.full((len(known), len(cls.columns)), np.nan)
+        known[positions] = True
+        values[positions] = df[cls.columns].values
+        return cls(known, values)
+
+    def to_bytes(self) -> bytes:
+        """
+        Function that serializes the table in the numpy format
+        :return: the content of the file
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, known=self.known, values=self.values)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "ZipCodeTable":
+        """
+        Function that loads a table serialized with to_bytes
+        :param content: the content of the file
+        :return: the table
+        """
+        with np.load(io.BytesIO(content)) as arrays:
+            return cls(arrays["known"], arrays["values"])
+
+    def __contains__(self, zip_code: int) -> bool:
+        position = int(zip_code) - FIRST_ZIP_CODE
+        return 0 <= position < len(self.known) and bool(self.known[position])
+
+    def lookup(self, zip_code: int) -> np.ndarray:
+        """
+        Function that returns the data of one zip code
+        :param zip_code: the zip code
+        :return: the values of `columns` for the zip code
+        """
+        if zip_code not in self:
+            raise ValueError(f"Unknown zip code: {zip_code}")
+        return self.values[int(zip_code) - FIRST_ZIP_CODE]
+
+    def lookup_many(self, zip_codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Function that returns the data of several zip codes
+        :param zip_codes: array of zip codes
+        :return: boolean array (True if the zip code exists) and the values of `columns` per zip code (NaN if unknown)
+        """
+        positions = np.asarray(zip_codes, dtype=np.int64) - FIRST_ZIP_CODE
+        in_range = (positions >= 0) & (positions < len(self.known))
+        positions = np.where(in_range, positions, 0)
+        known = in_range & self.known[positions]
+        values = self.values[positions]
+        values[~known] = np.nan
+        return known, values
@@ -0,0 +1,278 @@
+# Import necessary libraries
+import argparse
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from model.src.artifacts import atomic_write_bytes
+from predict.prediction import artifacts, check_engine, predict_batch, predict_features_batch
+from preprocessing.cleaning_data import encode_property, input_fields, preprocess_batch, validate_batch
+
+# Columns added to the input lines in the output file
+PRICE_COLUMN = "price"
+ERROR_COLUMN = "error"
+
+
+def is_jsonl(path: str) -> bool:
+    return path.endswith((".jsonl", ".json", ".ndjson"))
+
+
+def read_chunks(path: str, chunk_size: int):
+    """
+    Function that reads the input file by chunks, without loading it whole
+    :param path: CSV or JSON Lines file, one property per line with the fields in input_fields
+    :param chunk_size: number of lines per chunk
+    :return: iterator of dataframes (every value as text for a CSV file, so the lines are written back as they were;
+    a JSON line that cannot be read gets its error in the error column)
+    """
+    if not is_jsonl(path):
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+        return
+    with open(path) as input_file:
+        lines = ((number, line) for number, line in enumerate(input_file, 1) if line.strip())
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield pd.DataFrame([read_record(number, line) for number, line in chunk])
+
+
+def read_record(number: int, line: str) -> dict:
+    """
+    Function that reads one line of a JSON Lines file
+    :param number: number of the line in the file
+    :param line: the line
+    :return: the record, or only its error if the line is not a JSON object
+    """
+    try:
+        record = json.loads(line)
+    except ValueError as error:
+        return {ERROR_COLUMN: f"Invalid JSON on line {number}: {error}"}
+    if not isinstance(record, dict):
+        return {ERROR_COLUMN: f"Invalid JSON on line {number}: expected an object"}
+    return record
+
+
+def _init_worker():
+    # Every process loads the artifacts once, before its first chunk
+    artifacts.get()
+
+
+def score_chunk(chunk: pd.DataFrame, engine: str | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function run in the pool: predicts the prices of a chunk, the invalid lines get an error instead of a price
+    :param chunk: the input lines
+    :param engine: model to use (see predict/prediction.py)
+    :return: the price of every line (NaN if invalid) and its error (empty string if valid)
+    """
+    errors = validate_batch(chunk)
+    if ERROR_COLUMN in chunk.columns:
+        # Lines that could not be read (see read_chunks) keep their error
+        read_errors = chunk[ERROR_COLUMN].fillna("").astype(str).values
+        errors = np.where(read_errors != "", read_errors, errors).astype(object)
+    prices = np.full(len(chunk), np.nan)
+    valid = np.flatnonzero(errors == "")
+    if len(valid) == 0:
+        return prices, errors
+    lines = chunk.iloc[valid].reset_index(drop=True)
+    try:
+        prices[valid] = predict_batch(preprocess_batch(lines), engine)
+    except ValueError:
+        # An error validate_batch did not catch: the lines are encoded one by one to find it
+        features, positions = [], []
+        for position, record in zip(valid, lines.to_dict("records")):
+            try:
+                features.append(encode_property(*(record.get(field) for field in input_fields)))
+                positions.append(position)
+            except (TypeError, ValueError) as error:
+                errors[position] = str(error)
+        if features:
+            prices[positions] = predict_features_batch(features, engine)
+    return prices, errors
+
+
+def write_chunk(output_file, chunk: pd.DataFrame, prices: np.ndarray, errors: np.ndarray, jsonl: bool, header: bool):
+    """
+    Function that appends the scored lines to the output file
+    :param output_file: the output file, opened in append mode
+    :param chunk: the input lines
+    :param prices: their prices
+    :param errors: their errors
+    :param jsonl: True to write JSON Lines, False to write CSV
+    :param header: True to write the header of the CSV file
+    """
+    chunk = chunk.assign(**{PRICE_COLUMN: np.round(prices, 2), ERROR_COLUMN: errors})
+    if jsonl:
+        for record in chunk.to_dict("records"):
+            # Missing values (the price of an invalid line, the fields of a line that could not be read) as null
+            record = {key: None if value != value else value for key, value in record.items()}
+            output_file.write(json.dumps(record, default=str) + "\n")
+    else:
+        chunk.to_csv(output_file, header=header, index=False, lineterminator="\n")
+
+
+class Checkpoint:
+    """
+    Progress of a scoring run, saved next to the output file after every chunk written, so an interrupted run
+    resumes after the last chunk written instead of starting again
+    """
+
+    def __init__(self, output: str, identity: dict):
+        """
+        Initialize the checkpoint
+        :param output: path of the output file
+        :param identity: what the run depends on (input file, chunk size, version of the model...): a checkpoint
+        of another run is not resumed
+        """
+        self.path = output + ".checkpoint.json"
+        self.identity = identity
+        self.chunks = 0
+        self.rows = 0
+        self.errors = 0
+        self.output_bytes = 0
+
+    def load(self) -> bool:
+        """
+        Function that reads the progress saved by a previous run with the same identity
+        :return: True if there is one
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as checkpoint_file:
+            content = json.load(checkpoint_file)
+        if content["identity"] != self.identity:
+            raise ValueError(
+                f"{self.path} was written by another run (other input, chunk size or model), use --restart"
+            )
+        self.chunks, self.rows, self.errors = content["chunks"], content["rows"], content["errors"]
+        self.output_bytes = content["output_bytes"]
+        return True
+
+    def save(self):
+        content = {
+            "identity": self.identity,
+            "chunks": self.chunks,
+            "rows": self.rows,
+            "errors": self.errors,
+            "output_bytes": self.output_bytes,
+        }
+        atomic_write_bytes(self.path, json.dumps(content, indent=2).encode("utf-8"))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def score_file(
+    input_path: str,
+    output_path: str,
+    chunk_size: int = 50000,
+    workers: int | None = None,
+    engine: str | None = None,
+    restart: bool = False,
+) -> dict:
+    """
+    Function that predicts the prices of every line of a file, chunk by chunk in a pool of processes.
+    The chunks are written in the order of the input as soon as they and the previous ones are scored.
+    :param input_path: CSV or JSON Lines file with the fields in input_fields
+    :param output_path: the input lines with the price and error columns (JSON Lines if it ends with .jsonl)
+    :param chunk_size: number of lines per chunk
+    :param workers: number of processes (number of cores if None)
+    :param engine: model to use (see predict/prediction.py)
+    :param restart: True to ignore the checkpoint of an interrupted run
+    :return: the report of the run
+    """
+    engine = check_engine(engine)
+    artifacts.get()
+    stat = os.stat(input_path)
+    identity = {
+        "input": os.path.abspath(input_path),
+        "input_size": stat.st_size,
+        "input_mtime_ns": stat.st_mtime_ns,
+        "chunk_size": chunk_size,
+        "engine": engine,
+        "model_version": artifacts.version,
+    }
+    checkpoint = Checkpoint(output_path, identity)
+    if restart:
+        checkpoint.remove()
+    resumed = checkpoint.load()
+    resumed_rows = checkpoint.rows
+    jsonl = is_jsonl(output_path)
+    workers = workers or os.cpu_count()
+    start_time = perf_counter()
+    if resumed:
+        # Lines written after the last checkpoint are written again
+        os.truncate(output_path, checkpoint.output_bytes)
+    with open(output_path, "a" if resumed else "w", encoding="utf-8", newline="") as output_file:
+        pending = deque()
+
+        def write_oldest():
+            # The chunks are written in the order of the input, then the progress is saved
+            chunk, future = pending.popleft()
+            prices, errors = future.result()
+            write_chunk(output_file, chunk, prices, errors, jsonl, header=checkpoint.output_bytes == 0)
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            checkpoint.chunks += 1
+            checkpoint.rows += len(chunk)
+            checkpoint.errors += int((errors != "").sum())
+            checkpoint.output_bytes = os.fstat(output_file.fileno()).st_size
+            checkpoint.save()
+            print(f"{checkpoint.rows} lines scored", file=sys.stderr)
+
+        chunks = itertools.islice(read_chunks(input_path, chunk_size), checkpoint.chunks, None)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(score_chunk, chunk, engine)))
+                # At most 2 chunks per process in memory
+                if len(pending) > 2 * workers:
+                    write_oldest()
+            while pending:
+                write_oldest()
+    seconds = perf_counter() - start_time
+    checkpoint.remove()
+    scored = checkpoint.rows - resumed_rows
+    return {
+        "rows": checkpoint.rows,
+        "rows_this_run": scored,
+        "resumed_from": resumed_rows if resumed else None,
+        "errors": checkpoint.errors,
+        "seconds": seconds,
+        "rows_per_second": scored / seconds if seconds else 0.0,
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "model_version": artifacts.version,
+    }
+
+
+def main():
+    """
+    Command line tool predicting the prices of a large file of properties, e.g.:
+    python -m predict.batch_scoring listings.csv prices.csv --chunk-size 50000 --workers 4
+    """
+    parser = argparse.ArgumentParser(description="Predict the prices of a CSV or JSON Lines file of properties")
+    parser.add_argument("input", help="CSV or JSON Lines file with the fields of the form of the app")
+    parser.add_argument("output", help="output file: the input lines with a price and an error column")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="number of lines per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (one per core by default)")
+    parser.add_argument("--engine", choices=["linear", "gbm"], default=None, help="model to use")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    args = parser.parse_args()
+    report = score_file(args.input, args.output, args.chunk_size, args.workers, args.engine, args.restart)
+    if report["resumed_from"] is not None:
+        print(f"Resumed after {report['resumed_from']} lines")
+    print(
+        f"{report['rows']} lines, {report['errors']} errors, {report['rows_this_run']} lines scored in "
+        f"{report['seconds']:.2f} s ({report['rows_per_second']:.0f} lines/s, {report['workers']} processes, "
+        f"chunks of {report['chunk_size']}), model {report['model_version']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# Import necessary libraries
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable
+from predict.metrics import Histogram
+
+
+class QueueFullError(Exception):
+    """
+    Error raised when too many requests are waiting to be scored
+    """
+
+
+class MicroBatcher:
+    """
+    Scheduler gathering the requests arriving within a short window and scoring them as one batch.
+    Every request waits at most `window` seconds before its batch starts, a batch holds at most
+    `max_batch` requests and new requests are refused once `max_queue` requests are waiting.
+    Only one batch is scored at a time: the requests arriving meanwhile form the next batch.
+    """
+
+    def __init__(
+        self,
+        score_batch: Callable[[list], list],
+        window: float = 0.002,
+        max_batch: int = 64,
+        max_queue: int = 1024,
+        executor: Executor | None = None,
+    ):
+        """
+        Initialize the scheduler
+        :param score_batch: function scoring a list of items; it returns one result per item, or an exception for the items that failed
+        :param window: maximum time (in seconds) to wait for other requests once a request arrives
+        :param max_batch: maximum number of items scored together
+        :param max_queue: maximum number of items waiting to be scored
+        :param executor: executor in which score_batch runs (default executor of the loop if None)
+        """
+        self.score_batch = score_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.executor = executor
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.queue_wait = Histogram([0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0])
+        self.rejected = 0
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        """
+        Function that starts the task collecting and scoring the batches
+        """
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Function that stops the scheduler, the waiting requests get a CancelledError
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+
+    async def submit(self, item) -> Any:
+        """
+        Function that adds an item to the next batch and waits for its result
+        :param item: the item to score
+        :return: the result of the item
+        """
+        if self._task is None:
+            raise RuntimeError("The scheduler is not started")
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"More than {self.max_queue} requests waiting")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        """
+        Function that waits for a first item, then for other ones until the window ends or the batch is full
+        :return: the items of the batch, with their future and arrival time
+        """
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            # Items already waiting do not need the window
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        """
+        Function that scores the batches one after the other
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            start = time.perf_counter()
+            for _, _, arrival in batch:
+                self.queue_wait.observe(start - arrival)
+            self.batch_size.observe(len(batch))
+            items = [item for item, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.score_batch, items)
+            except Exception as error:
+                if len(batch) == 1:
+                    results = [error]
+                else:
+                    # The item that failed is not known: every item is scored alone, so it only fails its own request
+                    results = [await self._score_alone(loop, item) for item in items]
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _score_alone(self, loop, item) -> Any:
+        """
+        Function that scores one item in a batch of its own
+        :param loop: the running event loop
+        :param item: the item to score
+        :return: its result, or the exception raised
+        """
+        try:
+            return (await loop.run_in_executor(self.executor, self.score_batch, [item]))[0]
+        except Exception as error:
+            return error
+
+    def stats(self) -> dict:
+        """
+        Function that returns the configuration and the histograms of the scheduler
+        :return: the statistics
+        """
+        return {
+            "window": self.window,
+            "max_batch": self.max_batch,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "rejected": self.rejected,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
@@ -0,0 +1,158 @@
+# Import necessary libraries
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+from predict.metrics import REGISTRY, cache_access
+from predict.prediction import artifacts
+
+# Maximum number of prices kept in memory (0 disables the cache) and their lifetime in seconds (no limit if not set)
+CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+CACHE_TTL = float(os.environ["PREDICTION_CACHE_TTL"]) if os.environ.get("PREDICTION_CACHE_TTL") else None
+
+
+def artifacts_version() -> str:
+    """
+    Function that returns the version of the artifacts in use, checking first if a new training replaced them
+    :return: the version
+    """
+    artifacts.get()
+    return artifacts.version
+
+
+class PredictionCache:
+    """
+    Bounded, thread-safe LRU cache of predicted prices, keyed on the normalized input of a property
+    (see property_key). The least recently used price is evicted beyond max_size, a price older than ttl
+    is computed again, and the whole cache is emptied when the version of the artifacts changes.
+    """
+
+    def __init__(
+        self,
+        max_size: int = CACHE_SIZE,
+        ttl: float | None = CACHE_TTL,
+        version: Callable[[], Any] = artifacts_version,
+        name: str = "predictions",
+    ):
+        """
+        Initialize the cache
+        :param max_size: maximum number of prices
+        :param ttl: lifetime of a price in seconds, None to keep it until it is evicted
+        :param version: function returning the version of the artifacts the prices are computed with
+        :param name: name of the cache in the metrics (see predict/metrics.py)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = version
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._evictions = REGISTRY.counter(
+            "immo_cache_evictions_total", "Entries evicted from the caches of the service", cache=name
+        )
+
+    def current_version(self) -> Any:
+        """
+        Function that returns the version of the artifacts, emptying the cache if it changed
+        :return: the version
+        """
+        version = self.version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    if self._entries:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self._version = version
+        return version
+
+    def get_or_compute(self, key: tuple | None, compute: Callable[[], float]) -> float:
+        """
+        Function that returns the cached price of a property, or computes and caches it
+        :param key: the normalized input of the property, None to compute without caching
+        :param compute: function computing the price
+        :return: the price
+        """
+        if key is None or self.max_size <= 0:
+            return compute()
+        version = self.current_version()
+        price = self.get(key)
+        if price is None:
+            price = compute()
+            self.put(key, price, version)
+        return price
+
+    def get(self, key: tuple) -> float | None:
+        """
+        Function that returns the cached price of a property (call current_version first to drop the old prices)
+        :param key: the normalized input of the property
+        :return: the price, None if it is not cached or expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and (self.ttl is None or now - entry[1] < self.ttl)
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        cache_access(self.name, hit)
+        return entry[0] if hit else None
+
+    def put(self, key: tuple, price: float, version: Any):
+        """
+        Function that caches a price
+        :param key: the normalized input of the property
+        :param price: the price
+        :param version: version of the artifacts the price was computed with, the price is dropped if it is no longer current
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (price, time.monotonic())
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            self._evictions.inc(evicted)
+
+    def clear(self):
+        """
+        Function that empties the cache
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Function that returns the size and the counters of the cache
+        :return: the statistics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Cache of the process, used by the app and the API
+prediction_cache = PredictionCache()
@@ -0,0 +1,312 @@
+# Import necessary libraries
+import bisect
+import functools
+import threading
+from time import perf_counter
+
+# Upper bounds (in seconds) of the buckets of the latency histograms, from 10 us to 1 s
+LATENCY_BUCKETS = [
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0,
+]
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, cheap enough to be updated on every request
+    """
+
+    def __init__(self, buckets: list[float]):
+        """
+        Initialize the histogram
+        :param buckets: upper bounds of the buckets, sorted (a last bucket catches the values above)
+        """
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        Function that records a value
+        :param value: the value to record
+        """
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Function that estimates a quantile by the upper bound of the bucket containing it
+        :param q: the quantile, between 0 and 1
+        :return: the estimate (inf if it is in the last bucket, 0 if the histogram is empty)
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        """
+        Function that returns the content of the histogram
+        :return: count, sum, mean, p50/p95/p99 and cumulative count per bucket
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+            cumulative += bucket_count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class Counter:
+    """
+    Counter that only goes up (calls, errors, cache hits...)
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        """
+        Function that increments the counter
+        :param amount: the increment
+        """
+        with self._lock:
+            self.value += amount
+
+
+class Registry:
+    """
+    In-process registry of the metrics of the service, exported in the Prometheus text format or as JSON.
+    A metric is a family (name, type, help) of series, one per set of labels (e.g. {"stage": "predict"}).
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _series(self, kind: str, name: str, help: str, labels: dict, factory):
+        """
+        Function that returns the series of a metric with the given labels, created the first time
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, {"type": kind, "help": help, "series": {}})
+            if family["type"] != kind:
+                raise ValueError(f"Metric {name} is a {family['type']}, not a {kind}")
+            if key not in family["series"]:
+                family["series"][key] = factory()
+            return family["series"][key]
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        """
+        Function that returns a counter of the registry
+        :param name: name of the metric
+        :param help: description of the metric
+        :param labels: labels of the series
+        :return: the counter
+        """
+        return self._series("counter", name, help, labels, Counter)
+
+    def histogram(self, name: str, help: str, buckets: list[float], **labels) -> Histogram:
+        """
+        Function that returns a histogram of the registry
+        :param name: name of the metric
+        :param help: description of the metric
+        :param buckets: upper bounds of the buckets, used when the histogram is created
+        :param labels: labels of the series
+        :return: the histogram
+        """
+        return self._series("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def _families_copy(self) -> dict:
+        with self._lock:
+            return {
+                name: {**family, "series": dict(family["series"])} for name, family in self._families.items()
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Function that exports the metrics in the Prometheus text format (version 0.0.4)
+        :return: the text of the metrics
+        """
+        lines = []
+        for name, family in sorted(self._families_copy().items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for key, metric in family["series"].items():
+                if family["type"] == "counter":
+                    lines.append(f"{name}{format_labels(key)} {metric.value}")
+                    continue
+                snapshot = metric.snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', bound),))} {count}")
+                lines.append(f"{name}_sum{format_labels(key)} {snapshot['sum']}")
+                lines.append(f"{name}_count{format_labels(key)} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """
+        Function that returns the content of the registry
+        :return: metric name -> type, help and the value (counter) or snapshot (histogram) of every series
+        """
+        return {
+            name: {
+                "type": family["type"],
+                "help": family["help"],
+                "series": [
+                    {
+                        "labels": dict(key),
+                        **({"value": metric.value} if family["type"] == "counter" else metric.snapshot()),
+                    }
+                    for key, metric in family["series"].items()
+                ],
+            }
+            for name, family in sorted(self._families_copy().items())
+        }
+
+
+def format_labels(key: tuple) -> str:
+    """
+    Function that formats the labels of a series for Prometheus
+    :param key: (name, value) pairs
+    :return: e.g. {stage="predict"}, empty without labels
+    """
+    if not key:
+        return ""
+    values = []
+    for name, value in key:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        values.append(f'{name}="{value}"')
+    return "{" + ",".join(values) + "}"
+
+
+# Registry of the process, filled by the instrumented functions of preprocessing/ and predict/
+REGISTRY = Registry()
+_stages = {}
+_caches = {}
+
+
+class Span:
+    """
+    Context manager timing one stage of the hot path: its latency is recorded in the histogram of the stage
+    and an exception counts as an error of the stage
+    """
+
+    __slots__ = ("latency", "errors", "start")
+
+    def __init__(self, latency: Histogram, errors: Counter):
+        self.latency = latency
+        self.errors = errors
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.latency.observe(perf_counter() - self.start)
+        if exc_type is not None:
+            self.errors.inc()
+        return False
+
+
+def span(stage: str) -> Span:
+    """
+    Function that returns a span timing a stage, to use with "with"
+    :param stage: name of the stage, e.g. "zip_lookup"
+    :return: the span
+    """
+    metrics = _stages.get(stage)
+    if metrics is None:
+        metrics = _stages[stage] = (
+            REGISTRY.histogram(
+                "immo_stage_latency_seconds", "Latency of the stages of the prediction", LATENCY_BUCKETS, stage=stage
+            ),
+            REGISTRY.counter("immo_stage_errors_total", "Exceptions raised in the stages of the prediction", stage=stage),
+        )
+    return Span(*metrics)
+
+
+def instrument(stage: str):
+    """
+    Decorator timing every call of a function as a stage (calls, latency and errors)
+    :param stage: name of the stage
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def cache_access(cache: str, hit: bool):
+    """
+    Function that counts a lookup in a cache
+    :param cache: name of the cache
+    :param hit: True if the value was in the cache
+    """
+    counter = _caches.get((cache, hit))
+    if counter is None:
+        counter = _caches[(cache, hit)] = REGISTRY.counter(
+            "immo_cache_requests_total",
+            "Lookups in the caches of the service",
+            cache=cache,
+            result="hit" if hit else "miss",
+        )
+    counter.inc()
+
+
+def summary() -> dict:
+    """
+    Function that summarizes the registry for people: calls, errors and latency percentiles per stage,
+    hit ratio per cache
+    :return: the summary
+    """
+    snapshot = REGISTRY.snapshot()
+    errors = {
+        series["labels"]["stage"]: series["value"]
+        for series in snapshot.get("immo_stage_errors_total", {}).get("series", [])
+    }
+    stages = {}
+    for series in snapshot.get("immo_stage_latency_seconds", {}).get("series", []):
+        stage = series["labels"]["stage"]
+        stages[stage] = {
+            "calls": series["count"],
+            "errors": errors.get(stage, 0),
+            "mean_seconds": series["mean"],
+            "p50_seconds": series["p50"],
+            "p95_seconds": series["p95"],
+            "p99_seconds": series["p99"],
+        }
+    caches = {}
+    for series in snapshot.get("immo_cache_requests_total", {}).get("series", []):
+        counts = caches.setdefault(series["labels"]["cache"], {"hits": 0, "misses": 0})
+        counts["hits" if series["labels"]["result"] == "hit" else "misses"] += series["value"]
+    for counts in caches.values():
+        counts["hit_ratio"] = counts["hits"] / (counts["hits"] + counts["misses"])
+    return {"stages": stages, "caches": caches}
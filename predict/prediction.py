@@ -1,19 +1,275 @@
 # Import necessary library
+import hashlib
+import json
+import os
 import pickle
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable
+import numpy as np
 import pandas as pd
+from model.src.feature_encoder import FeatureEncoder
+from model.src.imputation import ImputationTables
+from model.src.linear_scorer import LinearScorer
+from model.src.model_bundle import ModelBundle
+from model.src.price_map import PriceMap
+from model.src.market_cube import MarketCube
+from model.src.zip_code_table import ZipCodeTable
+from predict.metrics import cache_access, instrument, span
 
-def predict(data: pd.DataFrame) -> float:
+# Directory where model/main.py writes the artifacts
+ARTIFACT_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = "manifest.json"
+# Model used when the caller does not choose one: "linear", or "gbm" if model/main.py was run with --engine gbm
+DEFAULT_ENGINE = os.environ.get("PREDICTION_ENGINE", "linear")
+ENGINES = ["linear", "gbm"]
+
+
+class ArtifactStore:
+    """
+    Process-wide holder of the artifacts written by the training pipeline.
+    The artifacts are loaded once and served from memory. Every `check_interval` seconds
+    the files are checked and, if a new training run wrote new ones, the whole set is
+    reloaded and swapped at once so a caller never gets an old scaler with a new model.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        loaders: dict[str, Callable[[bytes], Any]],
+        check_interval: float = 1.0,
+        name: str = "artifacts",
+    ):
+        """
+        Initialize the store
+        :param directory: directory containing the artifact files
+        :param loaders: file name -> function building the object from the file content
+        :param check_interval: minimum number of seconds between two checks of the files
+        :param name: name of the store in the metrics (see predict/metrics.py)
+        """
+        self.directory = directory
+        self.loaders = loaders
+        self.check_interval = check_interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._artifacts = None
+        self._signature = None
+        self._last_check = 0.0
+        self.version = None
+
+    def _stat(self, name: str) -> tuple:
+        stat = os.stat(os.path.join(self.directory, name))
+        return (name, stat.st_mtime_ns, stat.st_size)
+
+    def _current_signature(self) -> tuple:
+        """
+        Function that returns a cheap signature of the files on disk: the manifest if the
+        training pipeline wrote one, otherwise the modification time of every artifact
+        """
+        if os.path.exists(os.path.join(self.directory, MANIFEST)):
+            return (self._stat(MANIFEST),)
+        return tuple(self._stat(name) for name in self.loaders)
+
+    def _load(self, signature: tuple) -> bool:
+        """
+        Function that reads and deserializes all the artifacts, then swaps them in
+        :param signature: signature of the files that triggered the reload
+        :return: True if the new artifacts were swapped in, False if the files were being written
+        """
+        manifest_path = os.path.join(self.directory, MANIFEST)
+        expected = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "rb") as manifest_file:
+                expected = json.loads(manifest_file.read())["files"]
+        contents = {}
+        for name in self.loaders:
+            with open(os.path.join(self.directory, name), "rb") as file:
+                contents[name] = file.read()
+        if expected:
+            # The files must be the ones the manifest was written for
+            for name, content in contents.items():
+                if name in expected and hashlib.sha256(content).hexdigest() != expected[name]:
+                    return False
+            version = hashlib.sha256(json.dumps(expected, sort_keys=True).encode()).hexdigest()
+        else:
+            # Without manifest, the files must not have changed while reading them
+            if self._current_signature() != signature:
+                return False
+            version = hashlib.sha256(b"".join(contents.values())).hexdigest()
+        artifacts = {name: self.loaders[name](content) for name, content in contents.items()}
+        # One assignment: readers see either the old set or the new set
+        self._artifacts = MappingProxyType(artifacts)
+        self._signature = signature
+        self.version = version[:12]
+        return True
+
+    def reload(self, blocking: bool = True):
+        """
+        Function that checks the files and reloads them if they changed
+        :param blocking: if False, return at once when another thread is already checking
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            self._last_check = time.monotonic()
+            signature = self._current_signature()
+            if signature == self._signature:
+                return
+            with span("artifact_load"):
+                loaded = self._load(signature)
+            if not loaded and self._artifacts is None:
+                raise RuntimeError(
+                    f"The artifacts in {self.directory} do not match their manifest"
+                )
+        finally:
+            self._lock.release()
+
+    def get(self) -> MappingProxyType:
+        """
+        Function that returns the current artifacts, loading them the first time
+        :return: mapping of file name -> loaded object
+        """
+        # A miss: the artifacts are read from disk
+        cache_access(self.name, self._artifacts is not None)
+        if self._artifacts is None:
+            self.reload()
+        elif time.monotonic() - self._last_check >= self.check_interval:
+            try:
+                self.reload(blocking=False)
+            except OSError:
+                # Files being replaced: keep serving the current artifacts
+                pass
+        return self._artifacts
+
+
+artifacts = ArtifactStore(
+    ARTIFACT_DIR,
+    {
+        "model_bundle.npz": ModelBundle.from_bytes,
+        "scorer.npz": LinearScorer.from_bytes,
+        "encoder.json": FeatureEncoder.from_bytes,
+        "zip_codes.npz": ZipCodeTable.from_bytes,
+        "imputation.json": ImputationTables.from_bytes,
+    },
+)
+
+# The price map is only used by the ranking view of the app: it has its own store, loaded the first time
+# the view is shown, so the predictions do not wait for it
+price_map_artifacts = ArtifactStore(ARTIFACT_DIR, {"price_map.npz": PriceMap.from_bytes}, name="price_map_artifacts")
+
+# The statistics of the sales are only shown by the app: they have their own store, loaded the first time
+# they are shown, so the predictions do not wait for them (with the zip code table they are looked up with)
+market_artifacts = ArtifactStore(
+    ARTIFACT_DIR,
+    {
+        "market_cube.npz": MarketCube.from_bytes,
+        "zip_codes.npz": ZipCodeTable.from_bytes,
+    },
+    name="market_artifacts",
+)
+
+# The gradient boosting model is only written by model/main.py --engine gbm (and needs sklearn):
+# it has its own store, loaded the first time the engine is used
+boosting_artifacts = ArtifactStore(
+    ARTIFACT_DIR,
+    {
+        "gradient_boosting.pkl": pickle.loads,
+        "encoder.json": FeatureEncoder.from_bytes,
+    },
+    name="boosting_artifacts",
+)
+
+
+def check_engine(engine: str | None) -> str:
+    """
+    Function that returns the engine to use
+    :param engine: "linear", "gbm" or None for DEFAULT_ENGINE
+    :return: the engine
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown prediction engine: {engine!r}, expected one of {ENGINES}")
+    return engine
+
+
+def boosting_predict(numeric: np.ndarray, type_positions: np.ndarray, district_positions: np.ndarray) -> np.ndarray:
+    """
+    Function to predict prices with the gradient boosting model
+    :param numeric: array with one line per property and one column per numeric column of the encoder
+    :param type_positions: position of the property type of each property (see FeatureEncoder.type_position)
+    :param district_positions: position of the district of each property
+    :return: the predicted prices
+    """
+    current = boosting_artifacts.get()
+    boosting, encoder = current["gradient_boosting.pkl"], current["encoder.json"]
+    if boosting["types"] != encoder.types or boosting["districts"] != encoder.districts:
+        raise RuntimeError("The gradient boosting model was trained with other categories, train the model again")
+    # The model takes the categories as codes: position + 1, 0 for the reference category
+    features = np.column_stack([numeric, type_positions + 1, district_positions + 1])
+    with span("model"):
+        return boosting["model"].predict(features)
+
+
+@instrument("predict")
+def predict(data: pd.DataFrame, engine: str | None = None) -> float:
     """
     Function to predict a price based on preprocessed input data
     :param: input data of the property
+    :param engine: model to use, "linear" or "gbm" (DEFAULT_ENGINE if None)
     :return: the predicted price
     """
-    # Scaling the data
-    with open("predict/scaler.pkl", "rb") as scaler_file:
-        scaler = pickle.load(scaler_file)
-    scaled_data = scaler.transform(data)
-    # Loading the model to predict on the data
-    pickle_in = open("predict/regression.pkl", "rb")
-    regression = pickle.load(pickle_in)
-    prediction = regression.predict(scaled_data)[0]
-    return prediction
\ No newline at end of file
+    return predict_batch(data, engine)[0]
+
+
+@instrument("predict_batch")
+def predict_batch(data: pd.DataFrame, engine: str | None = None) -> np.ndarray:
+    """
+    Function to predict the prices of several properties with one call to the scaler and the model
+    :param data: preprocessed input data, one line per property (see preprocess_batch)
+    :param engine: model to use, "linear" or "gbm" (DEFAULT_ENGINE if None)
+    :return: the predicted prices, in the order of the lines
+    """
+    if check_engine(engine) == "gbm":
+        encoder = artifacts.get()["encoder.json"]
+        type_positions, district_positions = encoder.positions_from_one_hot(data)
+        numeric = data[FeatureEncoder.numeric_columns].values.astype(float)
+        return boosting_predict(numeric, type_positions, district_positions)
+    bundle = artifacts.get()["model_bundle.npz"]
+    with span("scaling"):
+        standardized = bundle.transform(data)
+    with span("model"):
+        return bundle.predict_standardized(standardized)
+
+
+@instrument("predict_features")
+def predict_features(features, engine: str | None = None) -> float:
+    """
+    Function to predict a price from the features of one property (see encode_property),
+    with the scaler folded into the coefficients of the model: no dataframe and no sklearn call
+    :param features: features of the property
+    :param engine: model to use, "linear" or "gbm" (DEFAULT_ENGINE if None)
+    :return: the predicted price
+    """
+    if check_engine(engine) == "gbm":
+        return float(predict_features_batch([features], engine)[0])
+    scorer = artifacts.get()["scorer.npz"]
+    return scorer.score(features.numeric, features.type_position, features.district_position)
+
+
+@instrument("predict_features_batch")
+def predict_features_batch(features: list, engine: str | None = None) -> np.ndarray:
+    """
+    Function to predict the prices of several properties from their features (see encode_property),
+    with one matrix product
+    :param features: features of each property
+    :param engine: model to use, "linear" or "gbm" (DEFAULT_ENGINE if None)
+    :return: the predicted prices, in the same order
+    """
+    numeric = np.array([feature.numeric for feature in features], dtype=float)
+    type_positions = np.array([feature.type_position for feature in features], dtype=int)
+    district_positions = np.array([feature.district_position for feature in features], dtype=int)
+    if check_engine(engine) == "gbm":
+        return boosting_predict(numeric, type_positions, district_positions)
+    scorer = artifacts.get()["scorer.npz"]
+    return scorer.score_batch(numeric, type_positions, district_positions)
\ No newline at end of file
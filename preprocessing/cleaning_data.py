@@ -1,132 +1,64 @@
 # Import librairies
 import pandas as pd
 import numpy as np
+from typing import NamedTuple
+from model.src.columnar import read_table
+from model.src.feature_encoder import FeatureEncoder
+from model.src.imputation import ImputationTables
+from model.src.zip_code_table import ZipCodeTable, complete_zip_codes
+from predict.metrics import instrument, span
+from predict.prediction import artifacts, check_engine
 
+@instrument("dataframe_zip_code")
 def dataframe_zip_code() -> pd.DataFrame:
     """
     Function that will clean the CSV file containing the zip code and the necessary data not provided by the user
     :return: the cleaned and complete dataframe
     """
-    df = pd.read_csv("model/data/additional_data.csv")
-    # Adding the missing district on the right line
-    district = 37000
-    df.loc[df["Postal code"] == 3717, "district"] = district
-
-    # Adding the provinces in the dataframe
-    # Create a list of conditions
-    conditions_province = [
-        (df["Postal code"] <= 1299),
-        (df["Postal code"] > 1299) & (df["Postal code"] <= 1499),
-        (df["Postal code"] > 1499) & (df["Postal code"] <= 1999)
-        | (df["Postal code"] > 2999) & (df["Postal code"] <= 3499),
-        (df["Postal code"] > 1999) & (df["Postal code"] <= 2999),
-        (df["Postal code"] > 3499) & (df["Postal code"] <= 3999),
-        (df["Postal code"] > 3999) & (df["Postal code"] <= 4999),
-        (df["Postal code"] > 4999) & (df["Postal code"] <= 5680),
-        (df["Postal code"] > 5999) & (df["Postal code"] <= 6599)
-        | (df["Postal code"] > 6999) & (df["Postal code"] <= 7999),
-        (df["Postal code"] > 6599) & (df["Postal code"] <= 6999),
-        (df["Postal code"] > 7999) & (df["Postal code"] <= 8999),
-        (df["Postal code"] > 8999),
-    ]
+    df = read_table("model/data/additional_data.csv")
+    return complete_zip_codes(df, imputation_tables())
 
-    # Create a list of the values we want to assign for each condition
-    values_province = [
-        "Brussels",
-        "Brabant Wallon",
-        "Vlaams-Brabant",
-        "Antwerp",
-        "Limburg",
-        "Liège",
-        "Namur",
-        "Hainaut",
-        "Luxembourg",
-        "West-Vlaanderen",
-        "Oost-Vlaanderen",
-    ]
 
-    # Create a new column and use np.select to assign values to it using our lists as arguments
-    df["province"] = np.select(conditions_province, values_province, default="Unknown")
-    # Filling in the empty values
-    df["house-median-price"] = df.groupby(["district"])["house-median-price"].transform(
-        lambda x: x.fillna(x.median())
-    )
-    df["apartment-median-price"] = df.groupby(["province"])[
-        "apartment-median-price"
-    ].transform(lambda x: x.fillna(x.median()))
-    return df
-
-
-# Data used by the model -> columns used to predict a price
-model_columns = [
-    "Living area",
-    "Surface of the plot",
-    "Building condition",
-    "Swimming pool",
-    "mean-income",
-    "median-price",
-    "Property type_Bungalow",
-    "Property type_Castle",
-    "Property type_Chalet",
-    "Property type_Country_Cottage",
-    "Property type_Duplex",
-    "Property type_Exceptional_Property",
-    "Property type_Farmhouse",
-    "Property type_Flat_Studio",
-    "Property type_House",
-    "Property type_Kot",
-    "Property type_Loft",
-    "Property type_Manor_House",
-    "Property type_Mansion",
-    "Property type_Penthouse",
-    "Property type_Town_House",
-    "Property type_Triplex",
-    "Property type_Villa",
-    "district_12000.0",
-    "district_13000.0",
-    "district_21000.0",
-    "district_23000.0",
-    "district_24000.0",
-    "district_25000.0",
-    "district_31000.0",
-    "district_32000.0",
-    "district_33000.0",
-    "district_34000.0",
-    "district_35000.0",
-    "district_36000.0",
-    "district_37000.0",
-    "district_38000.0",
-    "district_41000.0",
-    "district_42000.0",
-    "district_43000.0",
-    "district_44000.0",
-    "district_45000.0",
-    "district_46000.0",
-    "district_51000.0",
-    "district_52000.0",
-    "district_53000.0",
-    "district_55000.0",
-    "district_56000.0",
-    "district_57000.0",
-    "district_58000.0",
-    "district_61000.0",
-    "district_62000.0",
-    "district_63000.0",
-    "district_64000.0",
-    "district_71000.0",
-    "district_72000.0",
-    "district_73000.0",
-    "district_81000.0",
-    "district_82000.0",
-    "district_83000.0",
-    "district_84000.0",
-    "district_85000.0",
-    "district_91000.0",
-    "district_92000.0",
-    "district_93000.0",
+def zip_code_table() -> ZipCodeTable:
+    """
+    Function that returns the table precomputed by model/main.py with the data needed for every zip code
+    :return: the zip code table
+    """
+    return artifacts.get()["zip_codes.npz"]
+
+
+def feature_encoder() -> FeatureEncoder:
+    """
+    Function that returns the encoder saved with the model, with the mappings and the columns used in training
+    :return: the feature encoder
+    """
+    return artifacts.get()["encoder.json"]
+
+
+def imputation_tables() -> ImputationTables:
+    """
+    Function that returns the medians saved with the model to fill the missing values
+    :return: the imputation tables
+    """
+    return artifacts.get()["imputation.json"]
+
+
+# Fields of one property, same as the form of the app and the parameters of preprocess()
+input_fields = [
+    "property",
+    "property_type",
+    "zip_code",
+    "living_area",
+    "surface_plot",
+    "building_condition",
+    "swimming_pool",
 ]
 
+# Fields that can be left empty: they are filled with the medians of the training (see imputation_tables)
+optional_fields = ["surface_plot"]
 
+
+@instrument("create_input_table")
 def create_input_table(
     property_type: str,
     living_area: int,
@@ -142,21 +74,169 @@ def create_input_table(
     :param: all the data needed to predict a price using the model
     :return: a dataframe containing the columns name and the data for one property
     """
-    columns_data = pd.DataFrame(columns=model_columns)
-    columns_data.loc[0] = 0
-    columns_data["Living area"] = living_area
-    columns_data["Surface of the plot"] = surface_plot
-    columns_data["Building condition"] = building_condition
-    columns_data["Swimming pool"] = swimming_pool
-    columns_data["mean-income"] = mean_income
-    columns_data["median-price"] = median_price
-    if property_type != "Apartment":
-        columns_data[f"Property type_{property_type}"] = 1
-    if district != 11000.0:
-        columns_data[f"district_{district}"] = 1
+    encoder = feature_encoder()
+    numeric = [
+        (
+            living_area,
+            surface_plot,
+            building_condition,
+            swimming_pool,
+            mean_income,
+            median_price,
+        )
+    ]
+    data = encoder.one_hot(
+        numeric,
+        [encoder.type_position(property_type)],
+        [encoder.district_position(district)],
+    )
+    columns_data = pd.DataFrame(data, columns=encoder.columns)
     return columns_data
 
 
+def is_missing(value) -> bool:
+    """
+    Function that checks if an optional field is left empty
+    :param value: the value of the field
+    :return: True for None, NaN and blank text
+    """
+    return value is None or value != value or (isinstance(value, str) and not value.strip())
+
+
+def missing_values(values: pd.Series) -> np.ndarray:
+    """
+    Function that finds the values of an optional field left empty, in a column (see is_missing)
+    :param values: the values of the field
+    :return: True for None, NaN and blank text
+    """
+    missing = values.isna().values
+    if values.dtype == object:
+        missing |= np.fromiter(
+            (isinstance(value, str) and not value.strip() for value in values.values), dtype=bool, count=len(values)
+        )
+    return missing
+
+
+def check_area(value, name: str) -> float:
+    """
+    Function that checks a surface given by the user
+    :param value: the surface, number or text
+    :param name: name of the surface in the error message
+    :return: the surface as a number
+    """
+    try:
+        area = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value}") from None
+    if not area > 0:
+        raise ValueError(f"Invalid {name}: {value}, it must be a positive number")
+    return area
+
+
+def invalid_areas(values: pd.Series) -> np.ndarray:
+    """
+    Function that finds the surfaces that check_area rejects, in a column
+    :param values: the surfaces, numbers or text
+    :return: True for the invalid surfaces
+    """
+    areas = pd.to_numeric(values, errors="coerce").astype(float).values
+    return ~(areas > 0)
+
+
+class PropertyFeatures(NamedTuple):
+    """
+    Features of one property, ready for the linear scorer
+    """
+
+    # Values of FeatureEncoder.numeric_columns
+    numeric: tuple
+    type_position: int
+    district_position: int
+
+
+@instrument("encode_property")
+def encode_property(
+    property: str,
+    property_type: str,
+    zip_code: int,
+    living_area: int,
+    surface_plot: int,
+    building_condition: str,
+    swimming_pool: str,
+) -> PropertyFeatures:
+    """
+    Function that turns the input data into the features of the model, without building a dataframe
+    :param: input data (surface_plot can be None: the median of the district is used)
+    :return: the features of the property
+    """
+    encoder = feature_encoder()
+    living_area = check_area(living_area, "living area")
+    # from the zip code: getting the district code, the mean income and the median price
+    with span("zip_lookup"):
+        district, mean_income, house_median_price, apartment_median_price = zip_code_table().lookup(zip_code)
+    if is_missing(surface_plot):
+        surface_plot = imputation_tables()["surface_plot_by_district"].value(district)
+        if surface_plot != surface_plot:
+            raise ValueError(f"Enter the surface of the plot, it is unknown in zip code {zip_code}")
+    else:
+        surface_plot = check_area(surface_plot, "surface of the plot")
+    if property == "House":
+        median_price = house_median_price
+    elif property == "Apartment":
+        median_price = apartment_median_price
+    else:
+        raise ValueError("The property must be 'House' or 'Apartment'")
+    # Swimming pool: changing Yes/no by 1/0
+    swimming_pool = 1 if swimming_pool == "Yes" else 0
+    numeric = (
+        living_area,
+        surface_plot,
+        encoder.condition_code(building_condition),
+        swimming_pool,
+        mean_income,
+        median_price,
+    )
+    return PropertyFeatures(
+        numeric,
+        encoder.type_position(property_type),
+        encoder.district_position(district),
+    )
+
+
+def property_key(
+    property: str,
+    property_type: str,
+    zip_code: int,
+    living_area: int,
+    surface_plot: int,
+    building_condition: str,
+    swimming_pool: str,
+    engine: str | None = None,
+) -> tuple | None:
+    """
+    Function that normalizes the input data of a property into the key of the prediction cache:
+    the same property gets the same key whatever the name of its type ("Studio" or "Flat_Studio")
+    or the type of its numbers (150 or 150.0)
+    :param: input data, as in encode_property
+    :param engine: model used to predict the price (see predict/prediction.py)
+    :return: the key, None if the data is invalid (encode_property raises the error)
+    """
+    try:
+        return (
+            check_engine(engine),
+            property,
+            FeatureEncoder.property_type_names.get(property_type, property_type),
+            int(zip_code),
+            float(living_area),
+            None if surface_plot is None or surface_plot != surface_plot else float(surface_plot),
+            FeatureEncoder.building_conditions[building_condition],
+            1 if swimming_pool == "Yes" else 0,
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+@instrument("preprocess")
 def preprocess(
     property: str,
     property_type: str,
@@ -171,51 +251,148 @@ def preprocess(
     :param: input data
     :return:the final dataframe with the information to make a prediction
     """
-    # Property type: changing the name of the property type to match the columns from the model
-    if property_type == "Country cottage":
-        property_type = "Country_Cottage"
-    elif property_type == "Exceptional property":
-        property_type = "Exceptional_Property"
-    elif property_type == "Town house":
-        property_type = "Town_House"
-    elif property_type == "Manor house":
-        property_type = "Manor_House"
-    elif property_type == "Studio":
-        property_type = "Flat_Studio"
-    # from the zip code: getting the district code, the mean income and the median price
-    zip_code_df = dataframe_zip_code()
-    if zip_code in zip_code_df["Postal code"].values:
-        zip_line = zip_code_df[zip_code_df["Postal code"] == zip_code]
-        district = zip_line["district"].values[0]
-        mean_income = zip_line["mean-income"].values[0]
-        if property == "House":
-            median_price = zip_line["house-median-price"].values[0]
-        elif property == "Apartment":
-            median_price = zip_line["apartment-median-price"].values[0]
-    # Building condition: changing with numbers
-    if building_condition == "As new":
-        building_condition = 6
-    elif building_condition == "Just renovated":
-        building_condition = 5
-    elif building_condition == "Good":
-        building_condition = 4
-    elif building_condition == "To be done up":
-        building_condition = 3
-    elif building_condition == "To renovate":
-        building_condition = 2
-    elif building_condition == "To restore":
-        building_condition = 1
-    # Swimming pool: changing Yes/no by 1/0
-    swimming_pool = 1 if swimming_pool == "Yes" else 0
-    # Create the dataframe with all the info
-    input_data = create_input_table(
+    features = encode_property(
+        property,
         property_type,
+        zip_code,
         living_area,
         surface_plot,
         building_condition,
         swimming_pool,
-        mean_income,
-        median_price,
-        district
     )
-    return input_data
\ No newline at end of file
+    # Create the dataframe with all the info
+    encoder = feature_encoder()
+    data = encoder.one_hot(
+        [features.numeric], [features.type_position], [features.district_position]
+    )
+    input_data = pd.DataFrame(data, columns=encoder.columns)
+    return input_data
+
+
+@instrument("preprocess_batch")
+def preprocess_batch(properties: pd.DataFrame | list[dict]) -> pd.DataFrame:
+    """
+    Function that processes the input data of several properties at once, in the same way as preprocess()
+    :param properties: dataframe or list of records with the fields in input_fields
+    :return: a dataframe with the columns of the model and one line per property
+    """
+    encoder = feature_encoder()
+    df = pd.DataFrame(properties).reset_index(drop=True)
+    for field in optional_fields:
+        if field not in df.columns:
+            df[field] = np.nan
+    missing_fields = [field for field in input_fields if field not in df.columns]
+    if missing_fields:
+        raise ValueError(f"Missing fields: {missing_fields}")
+
+    # From the zip code: getting the district code, the mean income and the median price
+    with span("zip_lookup"):
+        known_zip, zip_values = zip_code_table().lookup_many(df["zip_code"].values)
+    zip_lines = pd.DataFrame(zip_values, columns=ZipCodeTable.columns)
+    invalid_zip = ~known_zip
+    if invalid_zip.any():
+        raise ValueError(f"Unknown zip codes: {sorted(set(df.loc[invalid_zip, 'zip_code']))}")
+    median_price = np.select(
+        [df["property"] == "House", df["property"] == "Apartment"],
+        [zip_lines["house-median-price"].values, zip_lines["apartment-median-price"].values],
+        default=np.nan,
+    )
+    if np.isnan(median_price).any():
+        raise ValueError("The property must be 'House' or 'Apartment'")
+
+    # Surfaces: numbers above 0 (see check_area), converted once
+    living_area = pd.to_numeric(df["living_area"], errors="coerce").values.astype(float)
+    invalid_living_area = ~(living_area > 0)
+    if invalid_living_area.any():
+        raise ValueError(f"Invalid living areas: {list(df.loc[invalid_living_area, 'living_area'])}")
+    missing_surface = missing_values(df["surface_plot"])
+    surface_plot = pd.to_numeric(df["surface_plot"].mask(missing_surface), errors="coerce").astype(float)
+    invalid_surface = ~(surface_plot.values > 0) & ~missing_surface
+    if invalid_surface.any():
+        raise ValueError(f"Invalid surfaces of the plot: {list(df.loc[invalid_surface, 'surface_plot'])}")
+
+    # Missing plot surfaces: median of the district
+    surface_plot = imputation_tables()["surface_plot_by_district"].fill(
+        pd.DataFrame({"Surface of the plot": surface_plot, "district": zip_lines["district"]})
+    )
+    if surface_plot.isna().any():
+        raise ValueError("Enter the surface of the plot, it is unknown in some zip codes")
+
+    # Swimming pool: changing Yes/no by 1/0
+    swimming_pool = (df["swimming_pool"] == "Yes").values.astype(int)
+    numeric = np.column_stack(
+        [
+            living_area,
+            surface_plot.values,
+            encoder.condition_codes(df["building_condition"]),
+            swimming_pool,
+            zip_lines["mean-income"].values,
+            median_price,
+        ]
+    )
+    data = encoder.one_hot(
+        numeric,
+        encoder.type_positions_of(df["property_type"]),
+        encoder.district_positions_of(zip_lines["district"]),
+    )
+    return pd.DataFrame(data, columns=encoder.columns)
+
+
+def validate_batch(properties: pd.DataFrame) -> np.ndarray:
+    """
+    Function that checks the input data of several properties without stopping at the first invalid one,
+    so a batch can be scored without its invalid lines (preprocess_batch raises an error for the whole batch)
+    :param properties: dataframe with the fields in input_fields (numbers possibly as text)
+    :return: the error of every line, an empty string for the valid lines
+    """
+    encoder = feature_encoder()
+    errors = np.full(len(properties), "", dtype=object)
+
+    def add_error(invalid: np.ndarray, message):
+        # Only the first error of a line is kept
+        for position in np.flatnonzero(invalid & (errors == "")):
+            errors[position] = message(position)
+
+    missing_fields = [field for field in input_fields if field not in properties.columns and field not in optional_fields]
+    if missing_fields:
+        errors[:] = f"Missing fields: {missing_fields}"
+        return errors
+    zip_codes = pd.to_numeric(properties["zip_code"], errors="coerce").values
+    known_zip, zip_values = zip_code_table().lookup_many(np.nan_to_num(zip_codes, nan=0).astype(np.int64))
+    known_zip &= zip_codes == np.round(zip_codes)
+    add_error(~known_zip, lambda i: f"Unknown zip code: {properties['zip_code'].iloc[i]}")
+    districts = zip_values[:, ZipCodeTable.columns.index("district")]
+    known_district = np.array([district in encoder.district_positions for district in districts], dtype=bool)
+    add_error(~known_district, lambda i: f"Unknown district of zip code {properties['zip_code'].iloc[i]}")
+    add_error(
+        ~properties["property"].isin(["House", "Apartment"]).values,
+        lambda i: "The property must be 'House' or 'Apartment'",
+    )
+    add_error(
+        ~properties["property_type"].isin(list(encoder.type_positions)).values,
+        lambda i: f"Unknown property type: {properties['property_type'].iloc[i]}",
+    )
+    add_error(
+        invalid_areas(properties["living_area"]),
+        lambda i: f"Invalid living area: {properties['living_area'].iloc[i]}",
+    )
+    if "surface_plot" in properties.columns:
+        missing_surface = missing_values(properties["surface_plot"])
+        add_error(
+            ~missing_surface & invalid_areas(properties["surface_plot"].mask(missing_surface)),
+            lambda i: f"Invalid surface of the plot: {properties['surface_plot'].iloc[i]}",
+        )
+    else:
+        missing_surface = np.ones(len(properties), dtype=bool)
+    district_surface = imputation_tables()["surface_plot_by_district"].values_of(
+        pd.DataFrame({"district": districts})
+    )
+    add_error(
+        missing_surface & np.isnan(district_surface),
+        lambda i: f"Enter the surface of the plot, it is unknown in zip code {properties['zip_code'].iloc[i]}",
+    )
+    add_error(
+        ~properties["building_condition"].isin(list(encoder.building_conditions)).values,
+        lambda i: f"Unknown building condition: {properties['building_condition'].iloc[i]}",
+    )
+    return errors
\ No newline at end of file
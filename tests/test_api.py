@@ -0,0 +1,73 @@
+import asyncio
+import json
+from api import PredictionService
+
+PROPERTY = {
+    "property": "House",
+    "property_type": "House",
+    "zip_code": 1000,
+    "living_area": 150,
+    "surface_plot": 300,
+    "building_condition": "Good",
+    "swimming_pool": "No",
+}
+
+
+async def send(port: int, request: bytes) -> tuple[int, dict]:
+    """
+    Function that sends a raw HTTP request to the service and reads the response
+    :param port: port of the service
+    :param request: the request, head and body
+    :return: the status and the JSON content of the response
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def post(path: str, content: bytes, headers: str | None = None) -> bytes:
+    if headers is None:
+        headers = f"Content-Length: {len(content)}\r\n"
+    return f"POST {path} HTTP/1.1\r\nConnection: close\r\n{headers}\r\n".encode("latin-1") + content
+
+
+def call(*requests: bytes) -> list[tuple[int, dict]]:
+    """
+    Function that starts the service with the micro-batching and sends the requests one after the other
+    :param requests: the raw requests
+    :return: the status and the content of every response
+    """
+
+    async def run():
+        service = PredictionService(port=0, workers=2, batching={"window": 0.002})
+        await service.start()
+        port = service.server.sockets[0].getsockname()[1]
+        try:
+            return [await send(port, request) for request in requests]
+        finally:
+            service.server.close()
+            await service.batcher.stop()
+
+    return asyncio.run(run())
+
+
+def test_predict_same_property_twice():
+    body = json.dumps(PROPERTY).encode()
+    first, second = call(post("/predict", body), post("/predict", body))
+    assert first[0] == 200
+    assert second == first
+
+
+def test_invalid_content_length():
+    body = json.dumps(PROPERTY).encode()
+    responses = call(
+        post("/predict", body, "Content-Length: abc\r\n"),
+        post("/predict", body, "Content-Length: -5\r\n"),
+        post("/predict", body, "Content-Length: 999999999999\r\n"),
+        post("/predict", body),
+    )
+    assert [status for status, _ in responses] == [400, 400, 413, 200]
@@ -0,0 +1,47 @@
+import json
+import numpy as np
+from predict.batch_scoring import ERROR_COLUMN, PRICE_COLUMN, read_chunks, score_chunk, score_file
+from preprocessing.cleaning_data import preprocess_batch
+
+CSV = """property,property_type,zip_code,living_area,surface_plot,building_condition,swimming_pool
+House,House,1000,150,300,Good,No
+Apartment,Apartment,1000,80,,Good,No
+Apartment,Apartment,1000,80, ,Good,No
+"""
+
+
+def test_blank_plot_cell_uses_district_median(tmp_path):
+    path = tmp_path / "properties.csv"
+    path.write_text(CSV)
+    chunk = next(read_chunks(str(path), 10))
+    data = preprocess_batch(chunk)
+    assert data["Surface of the plot"].iloc[1] == data["Surface of the plot"].iloc[2] > 0
+    prices, errors = score_chunk(chunk)
+    assert list(errors) == ["", "", ""]
+    assert not np.isnan(prices).any()
+
+
+def test_corrupt_jsonl_line_gets_an_error(tmp_path):
+    record = json.dumps(
+        {
+            "property": "House",
+            "property_type": "House",
+            "zip_code": 1000,
+            "living_area": 150,
+            "surface_plot": 300,
+            "building_condition": "Good",
+            "swimming_pool": "No",
+        }
+    )
+    input_path = tmp_path / "properties.jsonl"
+    input_path.write_text("\n".join([record, record, '{"property": "House", "zip', record, "[1, 2]", record]) + "\n")
+    output_path = tmp_path / "prices.jsonl"
+    report = score_file(str(input_path), str(output_path), chunk_size=2, workers=1)
+    # Strict JSON: the missing values are written as null
+    lines = [json.loads(line, parse_constant=ValueError) for line in output_path.read_text().splitlines()]
+    assert report["rows"] == 6 and report["errors"] == 2
+    assert [line[ERROR_COLUMN][:23] for line in lines] == [
+        "", "", "Invalid JSON on line 3:", "", "Invalid JSON on line 5:", ""
+    ]
+    assert lines[2][PRICE_COLUMN] is None
+    assert lines[0][PRICE_COLUMN] == lines[5][PRICE_COLUMN] > 0
@@ -0,0 +1,24 @@
+import pytest
+from preprocessing.cleaning_data import encode_property
+
+APARTMENT = {
+    "property": "Apartment",
+    "property_type": "Apartment",
+    "zip_code": 1000,
+    "living_area": 80,
+    "surface_plot": None,
+    "building_condition": "Good",
+    "swimming_pool": "No",
+}
+
+
+@pytest.mark.parametrize("surface_plot", ["", "  "])
+def test_encode_property_blank_plot_uses_district_median(surface_plot):
+    expected = encode_property(**APARTMENT)
+    assert encode_property(**{**APARTMENT, "surface_plot": surface_plot}) == expected
+
+
+@pytest.mark.parametrize("living_area", ["abc", 0, -20])
+def test_encode_property_rejects_invalid_living_area(living_area):
+    with pytest.raises(ValueError):
+        encode_property(**{**APARTMENT, "living_area": living_area})